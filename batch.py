@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatch
+import traceback
+import prettytable
+from vuln_agent.core.runner import *
+from vuln_agent.helpers import *
+from vuln_agent.models import CACHE_MODES
+from vuln_agent.workdir import WORKDIR_METHODS
+
+ROOT_DIR = Path.cwd().absolute()
+
+def select_projects(dataset, patterns, project_list=None):
+    """
+    Returns the sorted list of project slugs in the dataset matching any of the glob patterns,
+    plus the projects listed (one per line) in project_list.
+    """
+    project_sources = ROOT_DIR / 'data' / dataset / 'project-sources'
+    if not project_sources.exists():
+        raise ValueError(f"{project_sources} does not exist")
+    available = sorted(p.name for p in project_sources.iterdir() if p.is_dir())
+    selected = []
+    if patterns:
+        selected += [name for name in available if any(fnmatch(name, pattern) for pattern in patterns)]
+    if project_list:
+        with open(project_list, 'r') as f:
+            listed = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        for name in listed:
+            if name not in available:
+                prYellow(f"Project {name} does not exist in {project_sources}, skipping.")
+            elif name not in selected:
+                selected.append(name)
+    return selected
+
+def new_summary(project):
+    return {
+        'project': project,
+        'status': 'pending',
+        'log_folder': None,
+        'results': [],
+        'cost': 0.0,
+        'time': 0.0,
+        'wall_time': 0.0,
+        'error': "",
+    }
+
+def start_batch_project(args_dict, project, log_root, summary):
+    """
+    Prepares the project workdir and log folder. Returns (args, project_workdir, log_folder),
+    or None if the project was skipped.
+    """
+    args = argparse.Namespace(**args_dict)
+    args.project = project
+    try:
+        project_workdir = prepare_workdir(args.dataset, project, get_workdir_suffix(args.no_flow, args.no_branch),
+                                          args.workdir_method, args.resume)
+    except FileExistsError as e:
+        summary['status'] = 'skipped'
+        summary['error'] = str(e)
+        return None
+    log_folder = create_log_folder(project, log_root)
+    summary['log_folder'] = str(log_folder)
+    return args, project_workdir, log_folder
+
+def finish_batch_project(engine, summary, start_time):
+    if engine is not None:
+        summary['results'] = engine.logger.get_results()
+        summary['cost'], summary['time'] = engine.logger.get_cost_and_time()
+    summary['wall_time'] = time.time() - start_time
+    return summary
+
+def run_batch_project(args_dict, project, log_root):
+    """
+    Worker entry point. Runs a single project and returns its summary.
+    """
+    summary = new_summary(project)
+    start_time = time.time()
+    started = start_batch_project(args_dict, project, log_root, summary)
+    if started is None:
+        return summary
+    engine = None
+    try:
+        engine = run_project(*started)
+        summary['status'] = 'finished'
+    except Exception as e:
+        summary['status'] = 'error'
+        summary['error'] = f"{e}\n{traceback.format_exc()}"
+    return finish_batch_project(engine, summary, start_time)
+
+async def arun_batch_project(args_dict, project, log_root, semaphore):
+    """
+    Async counterpart of run_batch_project(), used with --async.
+    The semaphore bounds how many projects are in flight on the event loop.
+    """
+    async with semaphore:
+        summary = new_summary(project)
+        start_time = time.time()
+        started = await asyncio.to_thread(start_batch_project, args_dict, project, log_root, summary)
+        if started is None:
+            return summary
+        engine = None
+        try:
+            engine = await arun_project(*started)
+            summary['status'] = 'finished'
+        except Exception as e:
+            summary['status'] = 'error'
+            summary['error'] = f"{e}\n{traceback.format_exc()}"
+        return finish_batch_project(engine, summary, start_time)
+
+def record_summary(summary, summaries, total, summary_file):
+    """
+    Appends a finished project's summary to the summary file and prints its status.
+    Only ever called from the parent process / event loop, so there is a single writer.
+    """
+    project = summary['project']
+    summaries.append(summary)
+    with open(summary_file, 'a') as f:
+        f.write(json.dumps(summary) + "\n")
+    if summary['status'] == 'finished':
+        prGreen(f"[{len(summaries)}/{total}] {project} finished: {summary['results']}")
+    elif summary['status'] == 'skipped':
+        prYellow(f"[{len(summaries)}/{total}] {project} skipped: {summary['error']}")
+    else:
+        prRed(f"[{len(summaries)}/{total}] {project} failed: {truncate(summary['error'], 200)}")
+
+def run_batch_pool(args_dict, projects, jobs, log_root, summary_file):
+    summaries = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_batch_project, args_dict, project, log_root): project for project in projects}
+        for future in as_completed(futures):
+            project = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                # The worker process itself died
+                summary = new_summary(project)
+                summary['status'] = 'error'
+                summary['error'] = str(e)
+            record_summary(summary, summaries, len(projects), summary_file)
+    return summaries
+
+async def arun_batch(args_dict, projects, jobs, log_root, summary_file):
+    summaries = []
+    semaphore = asyncio.Semaphore(jobs)
+    tasks = [asyncio.create_task(arun_batch_project(args_dict, project, log_root, semaphore)) for project in projects]
+    for task in asyncio.as_completed(tasks):
+        record_summary(await task, summaries, len(projects), summary_file)
+    return summaries
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Vuln Agent - run several projects concurrently')
+    parser.add_argument('--dataset',    type=str,     default='cwe-bench-java', help='Dataset to use')
+    parser.add_argument('--projects',   nargs='+',    type=str,     default=[],  help='Project names or glob patterns')
+    parser.add_argument('--project_list', type=str,   default=None,             help='File with one project name per line')
+    parser.add_argument('--jobs',       type=int,     default=4,                help='Number of projects to run concurrently')
+    parser.add_argument('--async',      action='store_true', dest='use_async',   help='Run all projects on one asyncio event loop instead of a process pool')
+    parser.add_argument('--model',      type=str,     default='claude37',       help='Model to use')
+    parser.add_argument('--budget',     type=float,   default=5.0,              help='Budget in dollars (per project)')
+    parser.add_argument('--timeout',    type=int,     default=2400,             help='Time budget in seconds (per project)')
+    parser.add_argument('--use_patch',  action='store_true',                    help='Use patch file if available')
+    parser.add_argument('--seed_paths', action='store_true',                    help='Give flow reasoning the call paths to the methods changed by the fix')
+    parser.add_argument('--no_flow',   action='store_true',                    help='Disable flow analysis')
+    parser.add_argument('--no_branch', action='store_true',                    help='Disable branch analysis')
+    parser.add_argument('--verbose',    action='store_true',                    help='Enable verbose output')
+    parser.add_argument('--llm_cache',  type=str,     default='off', choices=CACHE_MODES, help='On-disk LLM response cache mode')
+    parser.add_argument('--llm_cache_dir', type=str,  default='.llm_cache',    help='Directory of the LLM response cache')
+    parser.add_argument('--artifact_cache', type=str, default='off', choices=CACHE_MODES, help='Reuse stored flow and branch reasoning outputs (e.g. across ablation variants)')
+    parser.add_argument('--artifact_cache_dir', type=str, default='.artifact_cache', help='Directory of the stage artifact store')
+    parser.add_argument('--output_compression', type=str, default=None, choices=['gzip', 'zstd'], help='Rotate output.txt and compress full segments')
+    parser.add_argument('--warm_build', action='store_true',                    help='Run tests in a long-lived container instead of rebuilding the image')
+    parser.add_argument('--image_budget', type=float, default=50.0,             help='Size budget (GiB) of project docker images kept across runs')
+    parser.add_argument('--workdir_method', type=str, default='auto', choices=WORKDIR_METHODS, help='How to create the per-run project workdir')
+    parser.add_argument('--candidates', type=int,     default=1,                help='Number of test generation candidates to run concurrently (the first one that validates wins)')
+    parser.add_argument('--resume',     action='store_true',                    help='Resume an interrupted run from its last completed stage')
+    args = parser.parse_args()
+
+    if not args.projects and not args.project_list:
+        parser.error("Specify --projects and/or --project_list")
+
+    projects = select_projects(args.dataset, args.projects, args.project_list)
+    if not projects:
+        prRed("No projects selected.")
+        exit(1)
+
+    # Create the shared java-env/resources copies once, before the workers race for them
+    prepare_shared_workdir(args.dataset, get_workdir_suffix(args.no_flow, args.no_branch))
+
+    log_root = ROOT_DIR / "logs"
+    log_root.mkdir(parents=True, exist_ok=True)
+    timestr = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    summary_file = log_root / f"batch_summary_{timestr}.jsonl"
+
+    args_dict = vars(args).copy()
+    for key in ['projects', 'project_list', 'jobs', 'use_async']:
+        args_dict.pop(key)
+
+    mode = "concurrent tasks" if args.use_async else "workers"
+    prCyan(f"Running {len(projects)} projects with {args.jobs} {mode}. Summary: {summary_file}")
+    start_time = time.time()
+    if args.use_async:
+        summaries = asyncio.run(arun_batch(args_dict, projects, args.jobs, log_root, summary_file))
+    else:
+        summaries = run_batch_pool(args_dict, projects, args.jobs, log_root, summary_file)
+    elapsed_time = time.time() - start_time
+
+    table = prettytable.PrettyTable()
+    table.field_names = ["Project", "Status", "Last Result", "Cost (USD)", "Time (s)", "Wall Time (s)"]
+    for summary in sorted(summaries, key=lambda s: s['project']):
+        last_result = summary['results'][-1] if summary['results'] else ""
+        table.add_row([summary['project'], summary['status'], last_result,
+                       f"${summary['cost']:.4f}", f"{summary['time']:.1f}", f"{summary['wall_time']:.1f}"])
+    print(table)
+    total_cost = sum(summary['cost'] for summary in summaries)
+    prCyan(f"Total cost: ${total_cost:.4f}. Elapsed wall-clock time: {elapsed_time:.1f}s")
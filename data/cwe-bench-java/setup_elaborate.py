@@ -15,6 +15,11 @@ import signal
 import sys
 import re
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from vuln_agent.build.base_images import base_image_tag, ensure_base_image
+from vuln_agent.build.image_gc import label_flags, run_id
+from vuln_agent.helpers import RunException
+
 def run_docker_build_with_timeout(build_cmd, timeout_secs):
     # Start the process in a new process group
     process = subprocess.Popen(
@@ -292,19 +297,12 @@ for project_slug in selected_slugs:
         match = re.search(r'java-env/([^/]+)', line)
         if match:
             java_env_subfolders.add(match.group(1))
-    copy_instructions = ["COPY ./java-env/{} $WORKSPACE_BASE/java-env/{}".format(subfolder, subfolder) for subfolder in java_env_subfolders]
-    copy_instructions = '\n'.join(copy_instructions)
+    base_image = base_image_tag(java_env_subfolders)
 
     envvar_lines = envvar_script.splitlines()
     envvar_lines = '\n'.join([line.replace("export", "ENV") for line in envvar_lines if line.strip()])
 
-    dockerfile = f'''FROM ubuntu:22.04
-ENV DEBIAN_FRONTEND=noninteractive
-RUN apt -y update
-RUN apt install -y curl unzip wget git build-essential
-RUN mkdir -p /java-env
-ENV WORKSPACE_BASE="/"
-{copy_instructions}
+    dockerfile = f'''FROM {base_image}
 {envvar_lines}
 ENV PATH=$PATH:$JAVA_HOME/bin
 COPY ./project-sources/{project_slug} /project
@@ -326,19 +324,12 @@ RUN {build_script}
         match = re.search(r'java-env/([^/]+)', line)
         if match:
             java_env_subfolders.add(match.group(1))
-    new_copy_instructions = ["COPY ./java-env/{} $WORKSPACE_BASE/java-env/{}".format(subfolder, subfolder) for subfolder in java_env_subfolders]
-    new_copy_instructions = '\n'.join(new_copy_instructions)
+    new_base_image = base_image_tag(java_env_subfolders)
 
     new_envvar_lines = new_envvar_script.splitlines()
     new_envvar_lines = '\n'.join([line.replace("export", "ENV") for line in new_envvar_lines if line.strip()])
 
-    new_dockerfile = f'''FROM ubuntu:22.04
-ENV DEBIAN_FRONTEND=noninteractive
-RUN apt -y update
-RUN apt install -y curl unzip wget git build-essential
-RUN mkdir -p /java-env
-ENV WORKSPACE_BASE="/"
-{new_copy_instructions}
+    new_dockerfile = f'''FROM {new_base_image}
 {new_envvar_lines}
 ENV PATH=$PATH:$JAVA_HOME/bin
 COPY ./project-sources/{project_slug} /project
@@ -370,10 +361,22 @@ RUN {new_build_script}
         diff_file.write(dockerfile_diff)
     print(f"Build diff for {project_slug} written to {diff_file_path}")
 
-    subprocess.run("docker rmi -f vulnerability-test && docker image prune -f", shell=True)
+    # Only remove the images earlier projects of this script left dangling when vulnerability-test
+    # was re-tagged; images and layers of concurrent runs stay cached
+    subprocess.run(f"docker image prune -f --filter dangling=true --filter label=vuln_agent.run={run_id()}", shell=True)
+
+    # Build the shared base images (apt packages and java-env) if they are missing
+    try:
+        ensure_base_image(base_image, "./workdir")
+        ensure_base_image(new_base_image, "./workdir")
+    except RunException as e:
+        print(f"Failed to build base image for {project_slug}: {e}. Skipping...")
+        shutil.rmtree(project_dir)
+        append_text(log_file, f"{project_slug},failed to build base image\n", encoding='utf-8')
+        continue
 
     # Build the Docker image
-    build_command = f"docker build -f {dockerfile_path} -t vulnerability-test ./workdir"
+    build_command = f"docker build -f {dockerfile_path} {label_flags(project_slug)} -t vulnerability-test ./workdir"
     print(f"Building Docker image for {project_slug}...")
     return_code, stdout, stderr = run_docker_build_with_timeout(build_command.split(' '), 600)
     if return_code == -1:
@@ -77,14 +77,9 @@ for item in data:
     subprocess.run(["git", "checkout", parent_commit], cwd=folder_name)
     
     dockerfile = """
-FROM ubuntu:latest
-
-ENV DEBIAN_FRONTEND=noninteractive
-
-# Update package lists and install build-essential (which includes gcc, g++, make)
-RUN apt-get -y update && \
-    apt-get install -y build-essential curl unzip wget && \
-    rm -rf /var/lib/apt/lists/*
+# Shared base image with build-essential (gcc, g++, make), curl, unzip and wget installed.
+# Built by `python -m vuln_agent.build.base_images`, or on demand by the first project build.
+FROM vuln-base:primevul
 
 # Copy the project files into the container
 COPY . /project
@@ -1,4 +1,8 @@
 from vuln_agent.helpers import *
+from vuln_agent.build import build_image, begin_run, end_run
+from vuln_agent.workdir import provision_workdir
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import re
 import prettytable
 import json
 
@@ -47,33 +51,105 @@ class Evaluation:
             # For PrimeVul, we assume method info is not needed or handled differently
             return None
 
-    def evaluate(self, instrumentation=False):
+    def eval_dir(self, state):
         """
-        Evaluate the test case generated by the agent.
+        Returns the directory the `state` ('vuln' or 'fix') tree is materialized in. It sits next to
+        project-sources/, so the docker build context is the same as for the workdir.
         """
-        self.logger.log_status("Evaluating test case...")
+        return Path(self.workdir).absolute().parent.parent / "eval-sources" / f"{self.project_name}_{state}_{os.getpid()}"
 
-        context_root = "../.." if self.dataset == 'cwe-bench-java' else "."
-
-        commit_info = self.get_commit_info()
-        if not commit_info:
-            return {"status": "Failed", "error": "No commit info found."}
+    def point_copy_at(self, tree):
+        """
+        Makes the Dockerfile of a materialized tree copy that tree instead of the project workdir.
+        """
+        if self.dataset != 'cwe-bench-java':
+            return # PrimeVul builds with the project directory itself as context
+        dockerfile = tree / "Dockerfile.vuln"
+        text = dockerfile.read_text()
+        text = re.sub(rf"(?<=\s)\./project-sources/{re.escape(self.project_name)}(?=[/\s])",
+                      f"./eval-sources/{tree.name}", text)
+        dockerfile.write_text(text)
 
-        os.chdir(self.workdir)
+    def materialize(self, state, commit):
+        """
+        Creates a copy of the workdir (with the generated test) checked out at `commit`.
+        The fixed state also gets .build_diff.patch applied.
+        Returns (tree, error result or None).
+        """
+        tree = self.eval_dir(state)
+        if tree.exists():
+            shutil.rmtree(tree)
+        provision_workdir(self.workdir, tree)
+        self.trees.append(tree)
         try:
-            run(f"git checkout {commit_info['vulnerable_commit']}",
-                timeout=200, logger=self.logger)
+            run(f"git checkout {commit}", timeout=200, logger=self.logger, cwd=tree)
         except RunException as e:
             self.logger.log_failure(f"Checkout failed: {truncate_reverse(str(e), 10000)}")
-            return {"status": "Failed", "error": f"Checkout failed: {truncate_reverse(str(e), 10000)}"}
+            if state == 'vuln':
+                return tree, {"status": "Failed", "error": f"Checkout failed: {truncate_reverse(str(e), 10000)}"}
+            # Carry the changes over the checkout. `git stash create` makes the stash commit without
+            # storing it in refs/stash, which the tree may share with the workdir and the other trees.
+            # The tree is thrown away, so a failed apply needs no cleanup.
+            try:
+                stash = run("git stash create", timeout=200, logger=self.logger, cwd=tree).strip()
+                if not stash:
+                    raise RunException("No local changes to carry over the checkout")
+                run(f"git reset --hard && git checkout {commit} && git stash apply {stash}",
+                    timeout=200, logger=self.logger, cwd=tree)
+            except RunException as e2:
+                self.logger.log_failure(f"Stash apply failed: {truncate_reverse(str(e2), 10000)}")
+                return tree, {"status": "Incorrect",
+                              "error": ("An existing file was modified, that is preventing Git checkout.\n"
+                                        f"{truncate_reverse(str(e), 10000)}")}
+        if state == 'fix' and (tree / ".build_diff.patch").exists():
+            try:
+                run("git apply --allow-empty --whitespace=fix .build_diff.patch", logger=self.logger, cwd=tree)
+            except RunException as e:
+                self.logger.log_failure(f"Applying diff failed: {truncate_reverse(str(e), 10000)}")
+                return tree, {"status": "Failed", "error": f"Applying diff failed: {truncate_reverse(str(e), 10000)}"}
+        self.point_copy_at(tree)
+        return tree, None
 
+    def remove_trees(self):
+        for tree in self.trees:
+            shutil.rmtree(tree, ignore_errors=True)
+        self.trees = []
         try:
-            run(f"docker build -f ./Dockerfile.vuln -t {self.project_name.lower()}_vuln {context_root}",
-                timeout=600,
-                logger=self.logger)
+            run("git worktree prune", logger=self.logger, cwd=self.workdir)
+        except RunException:
+            pass
+
+    def build_and_run(self, tree, state, instrumentation_flag):
+        """
+        Builds and runs the image of a materialized tree.
+        Returns (build error or None, run succeeded, output).
+        """
+        tag = f"{self.project_name.lower()}_eval_{state}_{os.getpid()}" # Unique per worker process
+        try:
+            build_image(self.dataset, tree, tag, logger=self.logger, timeout=600, project=self.project_name)
         except RunException as e:
             self.logger.log_failure(f"Build failed: {truncate_reverse(str(e), 10000)}")
-            return {"status": "Incorrect", "error": f"Build failed: {truncate_reverse(str(e), 10000)}"}
+            return str(e), False, ""
+        try:
+            stdout = run(f"docker run --rm {instrumentation_flag} {tag}",
+                timeout=200,
+                logger=self.logger,
+                cwd=tree)
+            return None, True, stdout
+        except RunException as e:
+            return None, False, str(e)
+
+    def evaluate(self, instrumentation=False):
+        """
+        Evaluate the test case generated by the agent.
+        The vulnerable and fixed states are materialized in two separate trees, whose images
+        are built and run concurrently; the workdir itself is left untouched.
+        """
+        self.logger.log_status("Evaluating test case...")
+
+        commit_info = self.get_commit_info()
+        if not commit_info:
+            return {"status": "Failed", "error": "No commit info found."}
 
         if instrumentation:
             method_info = self.get_method_info()
@@ -87,133 +163,115 @@ class Evaluation:
         else:
             instrumentation_flag = ""
             reached_vuln_method = None
-        os.chdir(self.workdir)
-        failed = False
+
+        self.trees = []
         try:
-            stdout = run(f"docker run --rm {instrumentation_flag} {self.project_name.lower()}_vuln",
-                timeout=200,
-                logger=self.logger)
-            if instrumentation:
-                if "[INSTRUMENTATION]" in stdout:
-                    self.logger.log_success(f"Test reached the vulnerable method")
-                    reached_vuln_method = True
-                else:
-                    self.logger.log_failure(f"Test did not reach the vulnerable method") 
-        except RunException as e:
-            self.logger.log_success(f"Test failed in vulnerable state")
-            failed = True
-            if instrumentation:
-                if "[INSTRUMENTATION]" in str(e):
-                    self.logger.log_success(f"Test reached the vulnerable method")
-                    reached_vuln_method = True
-                else:
-                    self.logger.log_failure(f"Test did not reach the vulnerable method")
-                    return {"status": "Incorrect",
-                            "error": f"Test did not reach the vulnerable method.\n{truncate_reverse(str(e), 10000)}",
-                            "reached_vuln_method": reached_vuln_method}
-        
-        if not failed:
+            vuln_tree, vuln_error = self.materialize('vuln', commit_info['vulnerable_commit'])
+            if vuln_error:
+                return vuln_error
+            fix_tree, fix_error = self.materialize('fix', commit_info['fix_commit'])
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                vuln_future = executor.submit(self.build_and_run, vuln_tree, 'vuln', instrumentation_flag)
+                fix_future = executor.submit(self.build_and_run, fix_tree, 'fix', instrumentation_flag) if not fix_error else None
+                vuln_build_error, vuln_passed, vuln_output = vuln_future.result()
+                fix_result = fix_future.result() if fix_future else None
+        finally:
+            self.remove_trees()
+
+        if vuln_build_error is not None:
+            return {"status": "Incorrect", "error": f"Build failed: {truncate_reverse(vuln_build_error, 10000)}"}
+
+        if instrumentation:
+            if "[INSTRUMENTATION]" in vuln_output:
+                self.logger.log_success(f"Test reached the vulnerable method")
+                reached_vuln_method = True
+            else:
+                self.logger.log_failure(f"Test did not reach the vulnerable method")
+        if vuln_passed:
             self.logger.log_failure("Test passed in vulnerable state")
             return {"status": "Incorrect",
                     "error": ("Test passed in vulnerable state instead of failing.\n"
-                              f"STDOUT:\n\n{truncate_reverse(stdout, 10000)}"),
+                              f"STDOUT:\n\n{truncate_reverse(vuln_output, 10000)}"),
+                    "reached_vuln_method": reached_vuln_method}
+        self.logger.log_success(f"Test failed in vulnerable state")
+        if instrumentation and not reached_vuln_method:
+            return {"status": "Incorrect",
+                    "error": f"Test did not reach the vulnerable method.\n{truncate_reverse(vuln_output, 10000)}",
                     "reached_vuln_method": reached_vuln_method}
-        
-        os.chdir(self.workdir)
-        try:
-            run(f"git checkout {commit_info['fix_commit']}", logger=self.logger)
-        except RunException as e:
-            self.logger.log_failure(f"Checkout failed: {truncate_reverse(str(e), 10000)}")
-            try:
-                run(f"git stash && git checkout {commit_info['fix_commit']} && git stash pop", logger=self.logger)
-            except RunException as e2:
-                self.logger.log_failure(f"Stash pop failed: {truncate_reverse(str(e2), 10000)}")
-                run(f"git reset --merge && git checkout {commit_info['vulnerable_commit']}", logger=self.logger)
-                return {"status": "Incorrect",
-                        "error": ("An existing file was modified, that is preventing Git checkout.\n"
-                                   f"{truncate_reverse(str(e), 10000)}"),
-                        "reached_vuln_method": reached_vuln_method}
-    
-        os.chdir(self.workdir)
-        if Path(".build_diff.patch").exists():
-            try:
-                run("git apply --allow-empty --whitespace=fix .build_diff.patch", logger=self.logger)
-            except RunException as e:
-                self.logger.log_failure(f"Applying diff failed: {truncate_reverse(str(e), 10000)}")
-                run(f"git checkout {commit_info['vulnerable_commit']}", logger=self.logger)
-                return {"status": "Failed", "error": f"Applying diff failed: {truncate_reverse(str(e), 10000)}",
-                        "reached_vuln_method": reached_vuln_method}
-        
-        os.chdir(self.workdir)
-        succeeded = True
-        error_msg = ""
-        try:
-            run(f"docker build -f ./Dockerfile.vuln -t {self.project_name.lower()}_vuln {context_root}",
-                timeout=600,
-                logger=self.logger)
-        except RunException as e:
-            self.logger.log_failure(f"Build failed: {truncate_reverse(str(e), 10000)}")
-            error_msg = ("Build failed in the fixed state. This probably means that "
-                          "a class or method that the test depends on was removed or renamed.\n"
-                          "The test should avoid a dependency on this class or method. Error log:\n"
-                          f"{truncate_reverse(str(e), 10000)}")
-            succeeded = False
-
-        os.chdir(self.workdir)
-        if succeeded:
-            try:
-                stdout = run(f"docker run --rm {instrumentation_flag} {self.project_name.lower()}_vuln",
-                    timeout=200,
-                    logger=self.logger)
-                if instrumentation:
-                    if "[INSTRUMENTATION]" in stdout:
-                        self.logger.log_success(f"Test reached the vulnerable method")
-                        reached_vuln_method = True
-                    else:
-                        self.logger.log_failure(f"Test did not reach the vulnerable method")
-            except RunException as e:
-                self.logger.log_failure(f"Test failed in fixed state.\n{truncate_reverse(str(e), 10000)}")
-                error_msg = f"Test failed in fixed state.\n{truncate_reverse(str(e), 10000)}" 
-                succeeded = False
-                if instrumentation:
-                    if "[INSTRUMENTATION]" in str(e):
-                        self.logger.log_success(f"Test reached the vulnerable method")
-                        reached_vuln_method = True
-                    else:
-                        self.logger.log_failure(f"Test did not reach the vulnerable method")
-
-        os.chdir(self.workdir)
-        try:
-            run(f"git checkout {commit_info['vulnerable_commit']}", logger=self.logger)
-        except RunException as e:
-            self.logger.log_failure(f"Checkout failed: {truncate_reverse(str(e), 10000)}")
-            try:
-                run(f"git stash && git checkout {commit_info['vulnerable_commit']} && git stash pop", logger=self.logger)
-            except RunException as e2:
-                self.logger.log_failure(f"Revert failed: {truncate_reverse(str(e2), 10000)}")
-                run(f"git reset --merge && git checkout {commit_info['vulnerable_commit']}", logger=self.logger)
-                return {"status": "Incorrect",
-                        "error": (f"Revert failed: {truncate_reverse(str(e), 10000)}"),
-                        "reached_vuln_method": reached_vuln_method}
-
-        os.chdir(self.workdir)
-        if Path(".build_diff.patch").exists():
-            try:
-                run("git apply --allow-empty --whitespace=fix -R .build_diff.patch",
-                    timeout=200,
-                    logger=self.logger)
-            except RunException as e:
-                self.logger.log_failure(f"Reversing build diff failed: {truncate_reverse(str(e), 10000)}")
-                return {"status": "Failed",
-                        "error": f"Reversing build diff failed: {truncate_reverse(str(e), 10000)}",
-                        "reached_vuln_method": reached_vuln_method}
 
-        if not succeeded:
-            return {"status": "Incorrect", "error": error_msg, "reached_vuln_method": reached_vuln_method}
+        if fix_error:
+            fix_error["reached_vuln_method"] = reached_vuln_method
+            return fix_error
+
+        fix_build_error, fix_passed, fix_output = fix_result
+        if fix_build_error is not None:
+            return {"status": "Incorrect",
+                    "error": ("Build failed in the fixed state. This probably means that "
+                              "a class or method that the test depends on was removed or renamed.\n"
+                              "The test should avoid a dependency on this class or method. Error log:\n"
+                              f"{truncate_reverse(fix_build_error, 10000)}"),
+                    "reached_vuln_method": reached_vuln_method}
+        if instrumentation and "[INSTRUMENTATION]" in fix_output:
+            reached_vuln_method = True
+        if not fix_passed:
+            self.logger.log_failure(f"Test failed in fixed state.\n{truncate_reverse(fix_output, 10000)}")
+            return {"status": "Incorrect",
+                    "error": f"Test failed in fixed state.\n{truncate_reverse(fix_output, 10000)}",
+                    "reached_vuln_method": reached_vuln_method}
 
         return {"status": "Correct", "reached_vuln_method": reached_vuln_method}
 
 
+def evaluate_project(dataset, slug_name, workdir):
+    """
+    Evaluates one project workdir and returns its result row. Runs in a worker process with --jobs.
+    """
+    print(f"Evaluating project: {slug_name}")
+    logger = DummyLogger()
+    evaluation = Evaluation(dataset=dataset,
+                            project_name=slug_name,
+                            workdir=workdir,
+                            logger=logger)
+    begin_run(slug_name)
+    try:
+        if dataset == 'cwe-bench-java':
+            result = evaluation.evaluate(instrumentation=True)
+        elif dataset == 'primevul':
+            result = evaluation.evaluate(instrumentation=True) # Added instrumentation for primevul also now.
+    finally:
+        end_run(slug_name)
+    return {
+        "project_name": slug_name,
+        "status": result["status"],
+        "message": result.get("error", ""),
+        "reached_vuln_method": result.get("reached_vuln_method", None),
+    }
+
+def load_results(result_file):
+    """
+    Returns the results by project. The file is append-only while evaluating, so the last line of a project wins.
+    """
+    results = {}
+    with open(result_file, 'r') as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result['project_name']] = result
+    return results
+
+def append_result(result_file, result):
+    with open(result_file, 'a') as f:
+        f.write(json.dumps(result) + "\n")
+
+def print_result(result, done, total):
+    if result["status"] == "Failed":
+        prRed(f"[{done}/{total}] {result['project_name']}: evaluation failed:\n{truncate(result['message'], 50)}")
+    elif result["status"] == "Incorrect":
+        prRed(f"[{done}/{total}] {result['project_name']}: evaluation incorrect:\n{truncate(result['message'], 50)}")
+    else:
+        prGreen(f"[{done}/{total}] {result['project_name']}: evaluation passed successfully.")
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Vuln Agent - generating vulnerability test cases')
@@ -222,6 +280,7 @@ if __name__ == '__main__':
     parser.add_argument('--openhands',  action='store_true', help='Evaluate OpenHands')
     parser.add_argument('--no_flow', action='store_true', help='Results without flow analysis')
     parser.add_argument('--no_branch', action='store_true', help='Results without branch analysis')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of projects to evaluate concurrently')
     args = parser.parse_args()
 
     cwd = Path.cwd().absolute()
@@ -275,54 +334,52 @@ if __name__ == '__main__':
         with open(result_file, 'w') as f:
             f.write("")
 
+    # Loaded once; only this process writes the file, appending one line per pending/finished project
+    all_results = load_results(result_file)
+    pending = []
     for slug in selected_slugs:
-        os.chdir(cwd)
-        with open(result_file, 'r') as f:
-            existing_results = [json.loads(line) for line in f.readlines()]
-        if slug.name in [result['project_name'] for result in existing_results]:
+        if slug.name in all_results:
             prYellow(f"Skipping {slug.name} as it has already been evaluated.")
             continue
-        else:
-            this_result = {
-                "project_name": slug.name,
-                "status": "Pending",
-                "message": "",
-                "reached_vuln_method": None
-            }
-            with open(result_file, 'a') as f:
-                f.write(json.dumps(this_result) + "\n")
-        print(f"Evaluating project: {slug.name}")
-        workdir = slug.absolute()
-
-        logger = DummyLogger()
-        evaluation = Evaluation(dataset=args.dataset,
-                                project_name=slug.name,
-                                workdir=workdir,
-                                logger=logger)
-        if args.dataset == 'cwe-bench-java':
-            result = evaluation.evaluate(instrumentation=True)
-        elif args.dataset == 'primevul':
-            result = evaluation.evaluate(instrumentation=True) # Added instrumentation for primevul also now.
-        if result["status"] == "Failed":
-            prRed(f"Evaluation failed:\n{truncate(result['error'], 50)}")
-        elif result["status"] == "Incorrect":
-            prRed(f"Evaluation incorrect:\n{truncate(result['error'], 50)}")
-        else:
-            prGreen("Evaluation passed successfully.")
-        this_result = {
-            "project_name": slug.name,
-            "status": result["status"],
-            "message": result.get("error", ""),
-            "reached_vuln_method": result.get("reached_vuln_method", None),
-        }
-        results.append(this_result)
-        with open(result_file, 'r') as f:
-            existing_results = [json.loads(line) for line in f.readlines()]
-        existing_results = [res for res in existing_results if res['project_name'] != slug.name]
-        existing_results.append(this_result)
-        with open(result_file, 'w') as f:
-            for res in existing_results:
-                f.write(json.dumps(res) + "\n")
+        pending.append(slug)
+
+    def record(result):
+        all_results[result['project_name']] = result
+        results.append(result)
+        append_result(result_file, result)
+        print_result(result, len(results), len(pending))
+
+    def start(slug):
+        # Marks the project as in progress, so that a crashed evaluation is not retried blindly
+        append_result(result_file, {"project_name": slug.name, "status": "Pending", "message": "", "reached_vuln_method": None})
+
+    if args.jobs <= 1:
+        for slug in pending:
+            start(slug)
+            record(evaluate_project(args.dataset, slug.name, slug.absolute()))
+    else:
+        remaining = list(reversed(pending))
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {}
+            while remaining or futures:
+                # Only submit as many projects as there are workers, so Pending means started
+                while remaining and len(futures) < args.jobs:
+                    slug = remaining.pop()
+                    start(slug)
+                    futures[executor.submit(evaluate_project, args.dataset, slug.name, slug.absolute())] = slug
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    slug = futures.pop(future)
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        # The worker process itself died
+                        record({"project_name": slug.name, "status": "Failed", "message": str(e), "reached_vuln_method": None})
+
+    # Compact the file to one line per project
+    with open(result_file, 'w') as f:
+        for result in all_results.values():
+            f.write(json.dumps(result) + "\n")
 
     table = prettytable.PrettyTable()
     table.field_names = ["Project", "Status", "Message", "Reached Vulnerable Method"]
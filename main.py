@@ -1,5 +1,7 @@
-from vuln_agent.core.engine import AgentEngine
+from vuln_agent.core.runner import *
 from vuln_agent.helpers import *
+from vuln_agent.models import CACHE_MODES
+from vuln_agent.workdir import WORKDIR_METHODS
 
 if __name__ == '__main__':
 
@@ -10,57 +12,32 @@ if __name__ == '__main__':
     parser.add_argument('--budget',     type=float,   default=5.0,              help='Budget in dollars')
     parser.add_argument('--timeout',    type=int,     default=2400,             help='Time budget in seconds')
     parser.add_argument('--use_patch',  action='store_true',                    help='Use patch file if available')
+    parser.add_argument('--seed_paths', action='store_true',                    help='Give flow reasoning the call paths to the methods changed by the fix')
     parser.add_argument('--no_flow',   action='store_true',                    help='Disable flow analysis')
     parser.add_argument('--no_branch', action='store_true',                    help='Disable branch analysis')
     parser.add_argument('--verbose',    action='store_true',                    help='Enable verbose output')
+    parser.add_argument('--llm_cache',  type=str,     default='off', choices=CACHE_MODES, help='On-disk LLM response cache mode')
+    parser.add_argument('--llm_cache_dir', type=str,  default='.llm_cache',    help='Directory of the LLM response cache')
+    parser.add_argument('--artifact_cache', type=str, default='off', choices=CACHE_MODES, help='Reuse stored flow and branch reasoning outputs (e.g. across ablation variants)')
+    parser.add_argument('--artifact_cache_dir', type=str, default='.artifact_cache', help='Directory of the stage artifact store')
+    parser.add_argument('--output_compression', type=str, default=None, choices=['gzip', 'zstd'], help='Rotate output.txt and compress full segments')
+    parser.add_argument('--warm_build', action='store_true',                    help='Run tests in a long-lived container instead of rebuilding the image')
+    parser.add_argument('--image_budget', type=float, default=50.0,             help='Size budget (GiB) of project docker images kept across runs')
+    parser.add_argument('--workdir_method', type=str, default='auto', choices=WORKDIR_METHODS, help='How to create the per-run project workdir')
+    parser.add_argument('--candidates', type=int,     default=1,                help='Number of test generation candidates to run concurrently (the first one that validates wins)')
+    parser.add_argument('--resume',     action='store_true',                    help='Resume an interrupted run from its last completed stage')
     args = parser.parse_args()
 
-    workdir_suffix = "_no_flow" if args.no_flow else ""
-    workdir_suffix += "_no_branch" if args.no_branch else ""
+    workdir_suffix = get_workdir_suffix(args.no_flow, args.no_branch)
 
-    if args.dataset == 'cwe-bench-java' or args.dataset == 'primevul':
-        project_dir = Path('data') / args.dataset / 'project-sources' / args.project
-        workdir = Path('data') / args.dataset / f'workdir{workdir_suffix}'
-        if not workdir.exists():
-            workdir.mkdir(parents=True, exist_ok=True)
-        if args.dataset == 'cwe-bench-java':
-            java_env_dir = workdir / 'java-env'
-            if not java_env_dir.exists():
-                shutil.copytree('data/cwe-bench-java/java-env', java_env_dir)
-            resources_dir = workdir / 'resources'
-            if not resources_dir.exists():
-                shutil.copytree('data/cwe-bench-java/resources', resources_dir)
-        project_workdir = workdir / 'project-sources' / args.project
-        if project_workdir.exists():
-            print(f"Error: project workdir {project_workdir} already exists. Please remove it first.")
-            exit(1)
-        if not project_dir.exists():
-            raise ValueError(f"Project {args.project} does not exist in {project_dir}")
-        shutil.copytree(project_dir, project_workdir)
-        project_workdir = Path(project_workdir).absolute()
-        if not project_workdir.exists():
-            raise ValueError(f"{project_workdir} does not exist after copying from {project_dir}")
-    else:
-        raise ValueError(f"Unknown dataset: {args.dataset}")
-    
-    timestr = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_folder = Path("logs") / f"{args.project}_{timestr}"
-    if not log_folder.exists():
-        log_folder.mkdir(parents=True, exist_ok=True)
+    try:
+        project_workdir = prepare_workdir(args.dataset, args.project, workdir_suffix, args.workdir_method, args.resume)
+    except FileExistsError as e:
+        print(e)
+        exit(1)
 
-    logger = Logger(log_folder.absolute(), args, verbose=args.verbose)
+    log_folder = create_log_folder(args.project)
 
-    engine = AgentEngine(dataset=args.dataset,
-                        project=args.project,
-                        model=args.model,
-                        workdir=project_workdir,
-                        logger=logger,
-                        budget=args.budget,
-                        timeout=args.timeout,
-                        use_patch=args.use_patch,
-                        no_flow=args.no_flow,
-                        no_branch=args.no_branch)
+    engine = run_project(args, project_workdir, log_folder)
 
-    engine.run()
- 
-    engine.print_results()
\ No newline at end of file
+    engine.print_results()
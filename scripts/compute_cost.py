@@ -2,6 +2,33 @@ import json
 from pathlib import Path
 import prettytable
 
+def load_log(folder):
+    """
+    Loads log.json, or rebuilds it from events.jsonl if the run did not shut down cleanly.
+    """
+    log_file = folder / "log.json"
+    if log_file.exists():
+        with open(log_file, 'r') as f:
+            return json.load(f)
+
+    events_file = folder / "events.jsonl"
+    if not events_file.exists():
+        raise ValueError(f"Neither {log_file} nor {events_file} exists")
+    log_data = {'actions': [], 'results': []}
+    with open(events_file, 'r') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                break # Truncated last line of an interrupted run
+            if event['kind'] == 'start':
+                log_data.update(event['data'])
+            elif event['kind'] == 'action':
+                log_data['actions'].append(event['data'])
+            elif event['kind'] == 'result':
+                log_data['results'].append(event['data'])
+    return log_data
+
 if __name__ == '__main__':
 
     results = {}
@@ -9,13 +36,7 @@ if __name__ == '__main__':
 
     for folder in Path("logs").iterdir():
         if folder.is_dir():
-            log_file = folder / "log.json"
-
-            if not log_file.exists():
-                raise ValueError(f"Log file {log_file} does not exist")
-
-            with open(log_file, 'r') as f:
-                log_data = json.load(f)
+            log_data = load_log(folder)
 
             total_cost = 0.0
             llm_time = 0.0
@@ -3,11 +3,16 @@ import os
 import shutil
 from pathlib import Path
 import subprocess
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from vuln_agent.workdir import provision_workdir, WORKDIR_METHODS
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Recreate the work directory.")
     parser.add_argument("--diffdir", type=str, help="Directory containing diffs for each project")
     parser.add_argument("--dataset", type=str, default="dataset", help="cwe-bench-java or primevul")
+    parser.add_argument("--method", type=str, default="auto", choices=WORKDIR_METHODS, help="How to create each project workdir")
     args = parser.parse_args()
 
     diff_path = Path(args.diffdir).absolute()
@@ -18,10 +23,10 @@ if __name__ == "__main__":
     if args.dataset == 'cwe-bench-java':
         java_env_dir = workdir / 'java-env'
         if not java_env_dir.exists():
-            shutil.copytree('data/cwe-bench-java/java-env', java_env_dir)
+            provision_workdir('data/cwe-bench-java/java-env', java_env_dir)
         resources_dir = workdir / 'resources'
         if not resources_dir.exists():
-            shutil.copytree('data/cwe-bench-java/resources', resources_dir)
+            provision_workdir('data/cwe-bench-java/resources', resources_dir)
 
     all_patches = list(diff_path.glob('*.patch'))
     for i, diff_file in enumerate(all_patches):
@@ -33,8 +38,8 @@ if __name__ == "__main__":
         if project_workdir.exists():
             print(f"Error: project workdir {project_workdir} already exists. Please remove it first.")
             exit(1)
-        shutil.copytree(project_dir, project_workdir)
-        print(f"Copied {diff_file.stem} to {project_workdir}")
+        method = provision_workdir(project_dir, project_workdir, args.method)
+        print(f"Provisioned {diff_file.stem} at {project_workdir} ({method})")
 
         # Remove existing files
         (project_workdir / "Dockerfile.vuln").unlink(missing_ok=True)
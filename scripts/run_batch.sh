@@ -0,0 +1,33 @@
+mkdir -p logs
+
+# Usage ./run_batch.sh <dataset> <model_name> <jobs> <project-glob> [<project-glob> ...]
+DOCKER_SOCKET=$(docker context inspect | grep '"Host"' | head -n1 | sed -E 's/.*"Host": *"unix:\/\/([^"]+)".*/\1/')
+
+dataset=$1
+model=$2
+jobs=$3
+shift 3
+patterns=""
+for pattern in "$@"; do
+    patterns="$patterns '$pattern'"
+done
+
+# In a Rootless Docker setup, use `-u 0:0`
+# UID:GID on the host is mapped to 0:0 on the container
+# See https://forums.docker.com/t/why-is-rootless-docker-still-running-as-root-inside-container/134985
+if docker info -f "{{println .SecurityOptions}}" | grep -q rootless; then
+    echo "Docker running in rootless mode"
+    user_flag="-u 0:0"
+else
+    user_flag=""
+fi
+docker run --rm -it \
+    $user_flag \
+    -v $PWD/vuln_agent:/app/vuln_agent \
+    -v $PWD/main.py:/app/main.py \
+    -v $PWD/batch.py:/app/batch.py \
+    -v $PWD/logs:/app/logs \
+    -v $PWD/data:/app/data \
+    -v $DOCKER_SOCKET:/var/run/docker.sock \
+    vuln_agent:latest \
+    /bin/bash -c "python batch.py --dataset $dataset --model $model --jobs $jobs --projects $patterns"
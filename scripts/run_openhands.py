@@ -6,6 +6,10 @@ import subprocess
 import datetime
 import shutil
 import signal
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from vuln_agent.workdir import provision_workdir
 
 def get_issue_details_java(project_name, root_dir='.'):
     advisory_path = Path(root_dir) / "data" / "cwe-bench-java" / "advisory" / f"{project_name}.json"
@@ -51,10 +55,10 @@ if __name__ == '__main__':
         workdir = Path('data', 'cwe-bench-java', 'openhands_workdir')
         java_env_dir = workdir / 'java-env'
         if not java_env_dir.exists():
-            shutil.copytree('data/cwe-bench-java/java-env', java_env_dir)
+            provision_workdir('data/cwe-bench-java/java-env', java_env_dir)
         resources_dir = workdir / 'resources'
         if not resources_dir.exists():
-            shutil.copytree('data/cwe-bench-java/resources', resources_dir)
+            provision_workdir('data/cwe-bench-java/resources', resources_dir)
 
         original_project_dir = Path('data', 'cwe-bench-java', 'project-sources', args.project)
         working_project_dir = Path('data', 'cwe-bench-java', 'openhands_workdir', 'project-sources', args.project)
@@ -63,7 +67,9 @@ if __name__ == '__main__':
             exit(1)
         if not original_project_dir.exists():
             raise ValueError(f"Original project directory {original_project_dir} does not exist.")
-        shutil.copytree(original_project_dir, working_project_dir)
+        # Not a git worktree: the sandbox mounts the workdir elsewhere, where its .git file would not resolve.
+        # 'copy' still shares blocks with the source on filesystems with reflink support.
+        provision_workdir(original_project_dir, working_project_dir, 'copy')
         relative_project_path = Path('project-sources', args.project)
         
     elif args.dataset == 'primevul':
@@ -74,7 +80,9 @@ if __name__ == '__main__':
             exit(1)
         if not original_project_dir.exists():
             raise ValueError(f"Original project directory {original_project_dir} does not exist.")
-        shutil.copytree(original_project_dir, working_project_dir)
+        # Not a git worktree: the sandbox mounts the workdir elsewhere, where its .git file would not resolve.
+        # 'copy' still shares blocks with the source on filesystems with reflink support.
+        provision_workdir(original_project_dir, working_project_dir, 'copy')
         workdir = Path('data', 'primevul', 'openhands_workdir', 'project-sources', args.project)
         relative_project_path = Path('.')
     else:
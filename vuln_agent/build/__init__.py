@@ -0,0 +1,24 @@
+from vuln_agent.build.context import build_image, get_context_root, DOCKERFILE_MARKER
+from vuln_agent.build.base_images import base_image_tag, base_image_of, ensure_base_image, rewrite_header
+from vuln_agent.build.image_gc import begin_run, end_run, collect, DEFAULT_BUDGET as DEFAULT_IMAGE_BUDGET
+from vuln_agent.build.build_records import context_hash
+from vuln_agent.build.warm import WarmContainer, WarmBuildUnsupported, get_warm_container, close_warm_container
+
+__all__ = [
+    "build_image",
+    "get_context_root",
+    "DOCKERFILE_MARKER",
+    "base_image_tag",
+    "base_image_of",
+    "ensure_base_image",
+    "rewrite_header",
+    "begin_run",
+    "end_run",
+    "collect",
+    "DEFAULT_IMAGE_BUDGET",
+    "context_hash",
+    "WarmContainer",
+    "WarmBuildUnsupported",
+    "get_warm_container",
+    "close_warm_container",
+]
@@ -0,0 +1,175 @@
+from vuln_agent.helpers import *
+import csv
+import re
+import tempfile
+
+DOCKERFILE_MARKER = "# Do not modify anything above this line"
+
+BASE_IMAGE_REPO = "vuln-base"
+PRIMEVUL_BASE_IMAGE = f"{BASE_IMAGE_REPO}:primevul"
+CWE_BENCH_JAVA_ROOT = Path(__file__).resolve().parents[2] / "data" / "cwe-bench-java"
+
+# The layers every generated cwe-bench-java Dockerfile used to repeat before its java-env COPYs
+JAVA_BASE_LINES = [
+    'FROM ubuntu:22.04',
+    'ENV DEBIAN_FRONTEND=noninteractive',
+    'RUN apt -y update',
+    'RUN apt install -y curl unzip wget git build-essential',
+    'RUN mkdir -p /java-env',
+    'ENV WORKSPACE_BASE="/"',
+]
+
+PRIMEVUL_BASE_DOCKERFILE = """FROM ubuntu:latest
+ENV DEBIAN_FRONTEND=noninteractive
+RUN apt-get -y update && \\
+    apt-get install -y build-essential curl unzip wget && \\
+    rm -rf /var/lib/apt/lists/*
+"""
+
+JAVA_ENV_COPY = re.compile(r'^COPY\s+\./java-env/([^/\s]+)\s')
+
+def base_image_tag(java_env_dirs):
+    """
+    Returns the base image tag for a set of java-env folders (a JDK and optionally Maven or Gradle),
+    e.g. vuln-base:apache-maven-3.5.0__jdk1.8.0_202.
+    """
+    return f"{BASE_IMAGE_REPO}:{'__'.join(sorted(set(java_env_dirs)))}"
+
+def java_env_dirs(tag):
+    return tag.split(':', 1)[1].split('__')
+
+def base_dockerfile(tag):
+    """
+    Returns the Dockerfile of a base image. Java base images are built from the cwe-bench-java
+    dataset directory, which holds java-env/.
+    """
+    if tag == PRIMEVUL_BASE_IMAGE:
+        return PRIMEVUL_BASE_DOCKERFILE
+    copies = [f"COPY ./java-env/{d} $WORKSPACE_BASE/java-env/{d}" for d in java_env_dirs(tag)]
+    return "\n".join(JAVA_BASE_LINES + copies) + "\n"
+
+def base_image_of(dockerfile_text):
+    """
+    Returns the base image a Dockerfile starts FROM, if it is one of ours.
+    """
+    for line in dockerfile_text.splitlines():
+        parts = line.split()
+        if parts and parts[0].upper() == 'FROM':
+            if len(parts) > 1 and parts[1].startswith(f"{BASE_IMAGE_REPO}:"):
+                return parts[1]
+            return None
+    return None
+
+def image_exists(tag):
+    try:
+        run(f"docker image inspect {tag}", timeout=60)
+    except RunException:
+        return False
+    return True
+
+def build_base_image(tag, context_dir=CWE_BENCH_JAVA_ROOT, logger=None, timeout=1800):
+    """
+    Builds a base image. Only the java-env folders it copies are sent to the daemon.
+    Raises RunException if the build fails.
+    """
+    with tempfile.TemporaryDirectory(dir='/tmp') as tmpdir:
+        dockerfile = Path(tmpdir) / "Dockerfile"
+        dockerfile.write_text(base_dockerfile(tag))
+        if tag == PRIMEVUL_BASE_IMAGE:
+            context_dir = tmpdir # Nothing to copy
+        else:
+            ignore = ["*"] + [f"!java-env/{d}" for d in java_env_dirs(tag)]
+            (Path(tmpdir) / "Dockerfile.dockerignore").write_text("\n".join(ignore) + "\n")
+        return run(f"DOCKER_BUILDKIT=1 docker build -f {dockerfile} -t {tag} .",
+                   timeout=timeout, logger=logger, cwd=context_dir)
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+def ensure_base_image(tag, context_dir=CWE_BENCH_JAVA_ROOT, logger=None):
+    """
+    Builds the base image if it is missing (e.g. on a freshly pruned host).
+    Concurrent callers wait for a single build.
+    """
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(tag, threading.Lock())
+    with lock:
+        if image_exists(tag):
+            return
+        if logger:
+            logger.log_status(f"Base image {tag} not found, building it...")
+        build_base_image(tag, context_dir, logger=logger)
+
+def rewrite_header(dockerfile_text):
+    """
+    Replaces the apt and java-env layers above the marker of a cwe-bench-java Dockerfile
+    with a FROM of the matching base image. Dockerfiles that do not have the generated
+    header (or were already generated in the FROM form) are returned unchanged.
+
+    This is applied at build time (see context.build_image), so the dataset Dockerfiles,
+    which the agent reads and edits, keep their original header.
+    """
+    lines = dockerfile_text.splitlines()
+    marker = next((i for i, line in enumerate(lines) if line.strip() == DOCKERFILE_MARKER), None)
+    if marker is None:
+        return dockerfile_text
+    header = lines[:marker]
+    if [line.strip() for line in header[:len(JAVA_BASE_LINES)]] != JAVA_BASE_LINES:
+        return dockerfile_text
+    rest = header[len(JAVA_BASE_LINES):]
+    dirs = [JAVA_ENV_COPY.match(line).group(1) for line in rest if JAVA_ENV_COPY.match(line)]
+    if not dirs:
+        return dockerfile_text
+    rest = [line for line in rest if not JAVA_ENV_COPY.match(line)]
+    new_lines = [f"FROM {base_image_tag(dirs)}"] + rest + lines[marker:]
+    return "\n".join(new_lines) + ("\n" if dockerfile_text.endswith("\n") else "")
+
+def tags_from_build_info(build_info_path=CWE_BENCH_JAVA_ROOT / "data" / "build_info.csv"):
+    """
+    Returns the base image tags for every (JDK, Maven/Gradle) combination in build_info.csv.
+    """
+    scripts_dir = CWE_BENCH_JAVA_ROOT / "scripts"
+    jdk_versions = json.loads((scripts_dir / "jdk_version.json").read_text())
+    mvn_versions = json.loads((scripts_dir / "mvn_version.json").read_text())
+    gradle_versions = json.loads((scripts_dir / "gradle_version.json").read_text())
+
+    tags = set()
+    with open(build_info_path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['status'] != 'success' or row['jdk_version'] not in jdk_versions:
+                continue
+            dirs = [jdk_versions[row['jdk_version']]['dir']]
+            if row['mvn_version'] in mvn_versions:
+                dirs.append(mvn_versions[row['mvn_version']]['dir'])
+            elif row['gradle_version'] in gradle_versions:
+                dirs.append(gradle_versions[row['gradle_version']]['dir'])
+            tags.add(base_image_tag(dirs))
+    return sorted(tags)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared base images of the project Dockerfiles.")
+    parser.add_argument("--context", type=str, default=str(CWE_BENCH_JAVA_ROOT),
+                        help="Directory containing java-env/ (default: data/cwe-bench-java)")
+    parser.add_argument("--tags", nargs="+", type=str, default=None,
+                        help="Only build these base images")
+    parser.add_argument("--no-build", action="store_true", help="Only list the base images, do not build them")
+    args = parser.parse_args()
+
+    tags = set(args.tags or tags_from_build_info() + [PRIMEVUL_BASE_IMAGE])
+    if args.no_build:
+        print("\n".join(sorted(tags)))
+        return
+
+    for tag in sorted(tags):
+        if image_exists(tag):
+            prGreen(f"{tag} already exists")
+            continue
+        print(f"Building {tag}...")
+        try:
+            build_base_image(tag, args.context)
+            prGreen(f"Built {tag}")
+        except RunException as e:
+            prRed(f"Failed to build {tag}: {truncate_reverse(str(e), 2000)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from vuln_agent.helpers import *
+import hashlib
+import re
+
+MAX_RECORDS = 8 # Per project
+RECORDS_DIR = ".build_records"
+
+# The project's own COPY source differs between the workdir and the evaluation trees
+PROJECT_COPY_SOURCE = re.compile(r"\./(project-sources|eval-sources)/[^\s/]+")
+
+_file_digests = {} # (path, size, mtime_ns) -> sha256 of the contents
+_file_digests_lock = threading.Lock()
+
+def git_output(args, cwd):
+    return subprocess.run(["git"] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+
+def is_record(path):
+    return path.split('/', 1)[0] == RECORDS_DIR
+
+def is_project_source(source):
+    """
+    Returns whether a build context path (as returned by context.copy_sources) is the project's own tree.
+    """
+    return PROJECT_COPY_SOURCE.match(f"./{source}") is not None
+
+def image_id(tag):
+    try:
+        return run(f"docker image inspect --format '{{{{.Id}}}}' {tag}", timeout=60).strip()
+    except RunException:
+        return None
+
+def file_digest(path, stat):
+    """
+    Returns the sha256 of a file's contents, cached per process by path, size and mtime.
+    """
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        cached = _file_digests.get(key)
+    if cached is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        cached = digest.hexdigest()
+        with _file_digests_lock:
+            _file_digests[key] = cached
+    return cached
+
+def sources_hash(sources):
+    """
+    Returns a hash of the contents of the given files and directories (symlinks are not followed).
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        source = Path(source)
+        paths = [source]
+        if source.is_dir() and not source.is_symlink():
+            paths = [Path(dirpath) / name for dirpath, dirnames, filenames in os.walk(source)
+                     for name in sorted(filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))])]
+        for path in paths:
+            try:
+                stat = os.lstat(path)
+                content = os.readlink(path) if os.path.islink(path) else file_digest(path, stat)
+                entry = f"{path}\0{stat.st_mode}\0{content}\0"
+            except OSError:
+                entry = f"{path}\0missing\0"
+            digest.update(entry.encode())
+    return digest.hexdigest()
+
+def context_hash(workdir, dockerfile_text, external_sources=(), base_image=None):
+    """
+    Returns a content hash of what a build of `dockerfile_text` copies from the project workdir
+    and from `external_sources` (the COPY sources outside it, e.g. the agent jar), or None if it
+    cannot be computed (e.g. the workdir is not a git repository, or `base_image` is missing).
+
+    The hash covers the Dockerfile (with the project's COPY source normalized), the ID of the
+    base image it starts FROM, the contents of the external sources, the index
+    (`git ls-files -s`), the contents of modified and untracked files, and the size and mtime
+    of ignored files. Dockerfile.vuln itself is left out, since only its normalized text matters,
+    and so are build records, which must not invalidate the hash they are keyed by.
+    """
+    workdir = Path(workdir)
+    digest = hashlib.sha256()
+    digest.update(PROJECT_COPY_SOURCE.sub("./<project>", dockerfile_text).encode())
+    if base_image is not None:
+        base_image_id = image_id(base_image)
+        if base_image_id is None:
+            return None
+        digest.update(f"\0{base_image_id}\0".encode())
+    digest.update(sources_hash(external_sources).encode())
+    try:
+        digest.update(git_output(["ls-files", "-s", "-z"], workdir))
+        status = git_output(["status", "--porcelain", "-z", "--untracked-files=all", "--no-renames"], workdir)
+        ignored = git_output(["ls-files", "--others", "--ignored", "--exclude-standard", "--directory", "-z"], workdir)
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+    changed = sorted({entry[3:] for entry in status.decode('utf-8', errors='surrogateescape').split('\0') if len(entry) > 3})
+    changed = [path for path in changed if path != "Dockerfile.vuln" and not is_record(path)]
+    present = [path for path in changed if (workdir / path).is_file()]
+    blob_of = {}
+    if present:
+        try:
+            hashes = subprocess.run(["git", "hash-object", "--no-filters", "--stdin-paths"], cwd=workdir,
+                                    input="\n".join(present).encode('utf-8', errors='surrogateescape') + b"\n",
+                                    stdout=subprocess.PIPE, check=True).stdout.split()
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        blob_of = dict(zip(present, hashes))
+    for path in changed:
+        digest.update(f"{path}\0".encode() + blob_of.get(path, b"deleted") + b"\0")
+
+    for entry in sorted(ignored.decode('utf-8', errors='surrogateescape').split('\0')):
+        if not entry or is_record(entry):
+            continue
+        full_path = workdir / entry
+        paths = [full_path]
+        if full_path.is_dir() and not full_path.is_symlink():
+            paths = [Path(dirpath) / name for dirpath, _, filenames in os.walk(full_path) for name in sorted(filenames)]
+        for path in paths:
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(path, workdir)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+def records_path(records_dir, project):
+    return Path(records_dir) / f"{project}.json"
+
+def load_records(records_dir, project):
+    try:
+        return json.loads(records_path(records_dir, project).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def lookup_image(records_dir, project, digest):
+    """
+    Returns the ID of an image built from the same build context, if it still exists.
+    """
+    record = load_records(records_dir, project).get(digest)
+    if record is None:
+        return None
+    try:
+        run(f"docker image inspect {record['image_id']}", timeout=60)
+    except RunException:
+        return None # Removed since (e.g. by the image GC)
+    return record['image_id']
+
+def record_build(records_dir, project, digest, tag):
+    """
+    Records the ID of the image just built as `tag` for the build context hash.
+    """
+    built_id = image_id(tag)
+    if built_id is None:
+        return
+    records = load_records(records_dir, project)
+    records.pop(digest, None)
+    records[digest] = {"image_id": built_id, "tag": tag, "time": time.time()}
+    records = dict(list(records.items())[-MAX_RECORDS:])
+    path = records_path(records_dir, project)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(records, indent=2))
+    os.replace(tmp_path, path)
@@ -0,0 +1,141 @@
+from vuln_agent.helpers import *
+import shlex
+import tempfile
+from vuln_agent.build.base_images import DOCKERFILE_MARKER, base_image_of, ensure_base_image, rewrite_header
+from vuln_agent.build.image_gc import label_flags, record_image
+from vuln_agent.build.build_records import RECORDS_DIR, context_hash, lookup_image, record_build, is_project_source
+
+def parse_instructions(lines):
+    """
+    Splits Dockerfile lines into (instruction, arguments) pairs, joining line continuations
+    and dropping comments and blank lines.
+    """
+    instructions = []
+    current = ""
+    for line in lines:
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith('#')):
+            continue
+        if stripped.endswith('\\'):
+            current += stripped[:-1] + " "
+            continue
+        current += stripped
+        parts = current.split(None, 1)
+        instructions.append((parts[0].upper(), parts[1] if len(parts) > 1 else ""))
+        current = ""
+    if current:
+        parts = current.split(None, 1)
+        instructions.append((parts[0].upper(), parts[1] if len(parts) > 1 else ""))
+    return instructions
+
+def get_context_root(dataset):
+    """
+    Returns the docker build context of a project, relative to its workdir.
+    """
+    return "../.." if dataset == 'cwe-bench-java' else "."
+
+def copy_sources(dockerfile_text):
+    """
+    Returns the context paths referenced by the COPY/ADD instructions of a Dockerfile,
+    or None if one of them cannot be restricted (e.g. it copies the whole context).
+    """
+    sources = []
+    for instruction, arguments in parse_instructions(dockerfile_text.splitlines()):
+        if instruction not in ['COPY', 'ADD']:
+            continue
+        if arguments.startswith('['):
+            try:
+                parts = json.loads(arguments)
+            except json.JSONDecodeError:
+                return None
+        else:
+            parts = shlex.split(arguments)
+        if any(part.startswith('--from') for part in parts):
+            continue # Copies from another image, not from the context
+        parts = [part for part in parts if not part.startswith('--')]
+        for source in parts[:-1]:
+            if '://' in source:
+                continue
+            source = os.path.normpath(source)
+            if source == '.' or source.startswith('..') or '$' in source:
+                return None
+            sources.append(source.lstrip('/'))
+    return sources
+
+def dockerignore_for(sources):
+    """
+    Returns a .dockerignore that excludes everything but the given context paths.
+    """
+    return "\n".join(["*"] + [f"!{source}" for source in sources]) + "\n"
+
+def build_image(dataset, workdir, tag, logger=None, timeout=600, dockerfile_text=None, project=None, reuse=True):
+    """
+    Builds the project's Dockerfile.vuln (or `dockerfile_text`) as `tag`, and returns the build output.
+    Raises RunException if the build fails.
+
+    For cwe-bench-java the context is the whole dataset workdir (../..), but the build only
+    needs the java-env subfolders, the agent jar and this project. The Dockerfile is copied
+    to a temporary directory together with a Dockerfile-specific ignore file
+    (<Dockerfile>.dockerignore, read by BuildKit) that whitelists its COPY sources, so only
+    those are sent to the daemon.
+
+    The apt and java-env layers of a cwe-bench-java Dockerfile are replaced with a FROM of the
+    shared base image for its JDK and build tool (see base_images.rewrite_header). If the
+    Dockerfile starts FROM one of the shared base images and it is missing, the base image
+    is built first. The image is labelled with `project` (the workdir name by default) and
+    this run, for the image garbage collector.
+
+    Each build is recorded under <dataset workdir>/.build_records with a hash of its build
+    context: the project tree, the COPY sources outside it (the agent jar) and the base image.
+    With `reuse`, an image built from an identical context (e.g. by the Run tool just before
+    Validation) is tagged as `tag` instead of being rebuilt.
+    """
+    context_root = get_context_root(dataset)
+    project = project or Path(workdir).name
+    from_file = dockerfile_text is None
+    if from_file:
+        dockerfile_text = (Path(workdir) / "Dockerfile.vuln").read_text()
+    if dataset == 'cwe-bench-java':
+        dockerfile_text = rewrite_header(dockerfile_text)
+    base_image = base_image_of(dockerfile_text)
+    if base_image is not None:
+        ensure_base_image(base_image, Path(workdir) / context_root, logger=logger)
+    sources = copy_sources(dockerfile_text) if dataset == 'cwe-bench-java' else None
+
+    records_dir = Path(workdir).absolute().parent.parent / RECORDS_DIR # Never inside the project repository
+    digest = None
+    if reuse and (sources is not None or dataset != 'cwe-bench-java'):
+        context_dir = os.path.normpath(Path(workdir).absolute() / context_root) # The same for the evaluation trees
+        external = [os.path.join(context_dir, source) for source in sources or [] if not is_project_source(source)]
+        digest = context_hash(workdir, dockerfile_text, external, base_image)
+    if digest is not None:
+        image_id = lookup_image(records_dir, project, digest)
+        if image_id is not None:
+            try:
+                run(f"docker tag {image_id} {tag}", timeout=60, logger=logger)
+                if logger:
+                    logger.log_status(f"Build context unchanged, reusing image {image_id[:19]} as {tag}.")
+                record_image(tag, project)
+                return f"Reused image {image_id} (build context unchanged)"
+            except RunException:
+                pass
+
+    if from_file and dataset != 'cwe-bench-java':
+        output = run(f"docker build -f ./Dockerfile.vuln {label_flags(project)} -t {tag} {context_root}",
+                     timeout=timeout, logger=logger, cwd=workdir)
+        record_image(tag, project)
+        if digest is not None:
+            record_build(records_dir, project, digest, tag)
+        return output
+
+    with tempfile.TemporaryDirectory(dir='/tmp') as tmpdir:
+        dockerfile = Path(tmpdir) / "Dockerfile"
+        dockerfile.write_text(dockerfile_text)
+        if sources is not None:
+            (Path(tmpdir) / "Dockerfile.dockerignore").write_text(dockerignore_for(sources))
+        output = run(f"DOCKER_BUILDKIT=1 docker build -f {dockerfile} {label_flags(project)} -t {tag} {context_root}",
+                     timeout=timeout, logger=logger, cwd=workdir)
+    record_image(tag, project)
+    if digest is not None:
+        record_build(records_dir, project, digest, tag)
+    return output
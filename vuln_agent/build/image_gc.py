@@ -0,0 +1,173 @@
+from vuln_agent.helpers import *
+import fcntl
+import uuid
+from contextlib import contextmanager
+
+PROJECT_LABEL = "vuln_agent.project"
+RUN_LABEL = "vuln_agent.run"
+
+STATE_PATH = Path(os.environ.get("VULN_AGENT_IMAGE_STATE", Path.home() / ".cache" / "vuln_agent" / "images.json"))
+DEFAULT_BUDGET = 50 * 1024**3 # Bytes of project images kept across runs
+
+_run_ids = {} # pid -> run id
+
+def run_id():
+    """
+    Returns the id of this process's run; every image built through build_image is labelled with it.
+    It is keyed on the pid rather than created at import, so that worker processes forked by
+    batch.py and evaluate.py --jobs each get their own id and only prune their own dangling images.
+    """
+    pid = os.getpid()
+    return _run_ids.get(pid) or _run_ids.setdefault(pid, uuid.uuid4().hex[:12])
+
+def image_labels(project):
+    return {PROJECT_LABEL: project, RUN_LABEL: run_id()}
+
+def label_flags(project):
+    return " ".join(f"--label {key}={value}" for key, value in image_labels(project).items())
+
+@contextmanager
+def locked_state():
+    """
+    Yields the shared GC state, holding an exclusive lock on it across processes.
+    The state records the active runs (project, pid) and when each project image was last used.
+    """
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(STATE_PATH.with_suffix('.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                state = json.loads(STATE_PATH.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = {}
+            state.setdefault("runs", {})
+            state.setdefault("images", {})
+            yield state
+            tmp_path = STATE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_text(json.dumps(state, indent=2))
+            os.replace(tmp_path, STATE_PATH)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def active_projects(state):
+    """
+    Drops runs whose process has died and returns the projects of the remaining ones.
+    """
+    state["runs"] = {key: info for key, info in state["runs"].items() if pid_alive(info["pid"])}
+    return {info["project"] for info in state["runs"].values()}
+
+def begin_run(project):
+    """
+    Registers a run of `project`, so that concurrent collections keep its images.
+    """
+    with locked_state() as state:
+        state["runs"][f"{run_id()}:{project}"] = {"project": project, "pid": os.getpid(), "started": time.time()}
+
+def record_image(tag, project):
+    """
+    Marks an image as just used (called after every successful build).
+    """
+    with locked_state() as state:
+        state["images"][tag] = {"project": project, "last_used": time.time()}
+
+def list_project_images():
+    """
+    Returns (id, tags, project, run, size in bytes, created) for every labelled image.
+    """
+    try:
+        ids = run(f"docker image ls -q --no-trunc --filter label={PROJECT_LABEL}", timeout=60).split()
+    except RunException:
+        return []
+    if not ids:
+        return []
+    fmt = ('{{json .Id}} {{json .RepoTags}} {{json (index .Config.Labels "' + PROJECT_LABEL + '")}}'
+           ' {{json (index .Config.Labels "' + RUN_LABEL + '")}} {{.Size}} {{json .Created}}')
+    try:
+        output = run(f"docker image inspect --format '{fmt}' {' '.join(sorted(set(ids)))}", timeout=120)
+    except RunException:
+        return []
+    images = []
+    for line in output.splitlines():
+        image_id, tags, project, run_id, size, created = line.split(' ')
+        images.append((json.loads(image_id), json.loads(tags) or [], json.loads(project),
+                       json.loads(run_id), int(size), json.loads(created)))
+    return images
+
+def remove_image(image, logger=None):
+    """
+    Removes an image. Images still used by a container are left alone.
+    """
+    try:
+        run(f"docker rmi {image}", timeout=300, logger=logger)
+        return True
+    except RunException:
+        return False
+
+def collect(project=None, budget=DEFAULT_BUDGET, logger=None):
+    """
+    Removes the dangling images built by this run for `project` (superseded by later
+    rebuilds), then evicts the least recently used project images until the labelled
+    images fit in `budget` bytes. Images of projects with an active run, in this or
+    any other process, are never evicted. Unlabelled images and build cache are untouched,
+    so layers shared with other projects stay warm.
+    """
+    dangling_filter = f"--filter dangling=true --filter label={RUN_LABEL}={run_id()}"
+    if project is not None:
+        dangling_filter += f" --filter label={PROJECT_LABEL}={project}"
+    try:
+        run(f"docker image prune -f {dangling_filter}", timeout=300, logger=logger)
+    except RunException as e:
+        if logger:
+            logger.log_status(f"Pruning dangling images failed: {truncate_reverse(str(e), 1000)}")
+
+    with locked_state() as state:
+        active = active_projects(state)
+        last_used = {tag: info["last_used"] for tag, info in state["images"].items()}
+
+    images = list_project_images()
+    total = sum(size for _, _, _, _, size, _ in images)
+    if total <= budget:
+        return
+    # Least recently used first; images never recorded fall back to their creation time
+    def recency(image):
+        _, tags, _, _, _, created = image
+        used = [last_used[tag] for tag in tags if tag in last_used]
+        if used:
+            return max(used)
+        try:
+            return datetime.datetime.fromisoformat(created[:26].rstrip('Z')).timestamp()
+        except ValueError:
+            return 0
+    evicted = []
+    for image in sorted(images, key=recency):
+        if total <= budget:
+            break
+        image_id, tags, image_project, _, size, _ = image
+        if image_project in active:
+            continue
+        if remove_image(" ".join(tags) if tags else image_id, logger=logger):
+            total -= size
+            evicted += tags
+    if evicted:
+        with locked_state() as state:
+            for tag in evicted:
+                state["images"].pop(tag, None)
+        if logger:
+            logger.log_status(f"Evicted images: {', '.join(evicted)}")
+
+def end_run(project, budget=DEFAULT_BUDGET, logger=None):
+    """
+    Unregisters a run of `project` and collects images.
+    """
+    with locked_state() as state:
+        state["runs"].pop(f"{run_id()}:{project}", None)
+    collect(project, budget=budget, logger=logger)
@@ -0,0 +1,238 @@
+from vuln_agent.helpers import *
+import hashlib
+import re
+import shlex
+import tempfile
+from vuln_agent.build.context import DOCKERFILE_MARKER, parse_instructions, build_image
+
+# RUN steps that install dependencies. When they come before any other RUN below the marker,
+# they are baked into the warm image, so that only the project build and the test run are repeated.
+DEPENDENCY_RUN = re.compile(r"\b(apt|apt-get|yum|dnf|apk|pip|pip3|npm|gem|conda)\b.*\b(install|add)\b|\b(wget|curl)\b")
+
+class WarmBuildUnsupported(Exception):
+    pass
+
+def command_string(arguments):
+    """
+    Converts the arguments of RUN/CMD (shell or JSON exec form) to a shell command.
+    """
+    if arguments.startswith('['):
+        try:
+            return shlex.join(json.loads(arguments))
+        except (json.JSONDecodeError, TypeError):
+            pass
+    return arguments
+
+class WarmContainer:
+    """
+    Keeps one long-lived container per project for the TestGen Run tool.
+
+    Dockerfile.vuln is split into a setup part (everything above the marker, plus the
+    dependency-installing RUN steps that open the body) and an incremental part. The setup
+    part is built once into an image, and a container is started from it. Each run then
+    syncs the files changed since the last run into the container through a tar stream,
+    replays the incremental RUN/WORKDIR/ENV steps with docker exec, and runs the CMD.
+    The image and container are rebuilt when the setup part changes.
+    """
+
+    def __init__(self, dataset, project_name, workdir, logger):
+        if dataset != 'cwe-bench-java':
+            raise WarmBuildUnsupported(f"Warm builds are not supported for dataset {dataset}")
+        self.dataset = dataset
+        self.project_name = project_name
+        self.workdir = Path(workdir)
+        self.logger = logger
+        self.image = f"{project_name.lower()}_warm"
+        self.container = f"{project_name.lower()}_warm"
+        self.setup_hash = None
+        self.manifest = None # relative path -> (mtime_ns, size) as last synced into the container
+        self.project_dest = None
+
+    def split_dockerfile(self):
+        """
+        Returns (setup lines, incremental instructions).
+        """
+        lines = (self.workdir / "Dockerfile.vuln").read_text().splitlines()
+        marker = next((i for i, line in enumerate(lines) if line.strip() == DOCKERFILE_MARKER), None)
+        if marker is None:
+            raise WarmBuildUnsupported("Dockerfile.vuln has no marker line")
+        header, body = lines[:marker + 1], lines[marker + 1:]
+        body_instructions = parse_instructions(body)
+        for instruction, _ in body_instructions:
+            if instruction not in ['RUN', 'WORKDIR', 'ENV', 'CMD']:
+                raise WarmBuildUnsupported(f"Unsupported instruction {instruction} below the marker")
+        # The setup part extends up to the last dependency RUN that precedes every other RUN,
+        # so that changes to the project sources are always rebuilt
+        setup_count = 0
+        for i, (instruction, arguments) in enumerate(body_instructions):
+            if instruction == 'RUN':
+                if not DEPENDENCY_RUN.search(arguments):
+                    break
+                setup_count = i + 1
+        setup = header + [f"{instruction} {arguments}" for instruction, arguments in body_instructions[:setup_count]]
+        return setup, body_instructions[setup_count:]
+
+    def find_project_dest(self, setup):
+        """
+        Returns the container path the project directory is copied to.
+        """
+        source = f"./project-sources/{self.workdir.name}"
+        for instruction, arguments in parse_instructions(setup):
+            if instruction == 'COPY':
+                parts = arguments.split()
+                if len(parts) == 2 and parts[0].rstrip('/') in [source, source[2:]]:
+                    return parts[1]
+        raise WarmBuildUnsupported("Could not find the COPY instruction for the project directory")
+
+    def scan(self):
+        manifest = {}
+        for dirpath, dirnames, filenames in os.walk(self.workdir):
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    continue
+                manifest[os.path.relpath(path, self.workdir)] = (stat.st_mtime_ns, stat.st_size)
+        return manifest
+
+    def container_running(self):
+        try:
+            output = run(f"docker inspect -f '{{{{.State.Running}}}}' {self.container}", cwd=self.workdir)
+        except RunException:
+            return False
+        return output.strip() == "true"
+
+    def remove_container(self):
+        try:
+            run(f"docker rm -f {self.container}", cwd=self.workdir)
+        except RunException:
+            pass
+
+    def rebuild(self, setup, setup_hash):
+        """
+        Builds the setup image and starts a fresh container from it.
+        Raises RunException if the build fails.
+        """
+        self.logger.log_status("Building warm base image...")
+        self.remove_container()
+        self.manifest = None
+        manifest = self.scan() # The state of the project as copied into the image
+        build_image(self.dataset, self.workdir, self.image, logger=self.logger, timeout=300,
+                    dockerfile_text="\n".join(setup) + "\n")
+        run(f"docker run -d --name {self.container} --entrypoint sleep {self.image} infinity",
+            timeout=60, logger=self.logger, cwd=self.workdir)
+        self.setup_hash = setup_hash
+        self.manifest = manifest
+
+    def sync(self):
+        """
+        Copies files changed since the last sync into the container and deletes removed ones.
+        """
+        current = self.scan()
+        changed = [path for path, stat in current.items() if self.manifest.get(path) != stat]
+        removed = [path for path in self.manifest if path not in current]
+        with tempfile.NamedTemporaryFile('wb', dir='/tmp', delete=False) as f:
+            listfile = f.name
+        try:
+            if changed:
+                Path(listfile).write_bytes(b"\0".join(path.encode() for path in changed) + b"\0")
+                run(f"tar -cf - -C {shlex.quote(str(self.workdir))} --null -T {listfile}"
+                    f" | docker exec -i {self.container} tar -xf - -C {shlex.quote(self.project_dest)}",
+                    timeout=120, logger=self.logger, cwd=self.workdir)
+            if removed:
+                Path(listfile).write_bytes(b"\0".join(path.encode() for path in removed) + b"\0")
+                run(f"docker exec -i -w {shlex.quote(self.project_dest)} {self.container} xargs -0 rm -f -- < {listfile}",
+                    timeout=60, logger=self.logger, cwd=self.workdir)
+        finally:
+            os.unlink(listfile)
+        self.logger.log_status(f"Synced {len(changed)} changed and {len(removed)} removed files into the warm container.")
+        self.manifest = current
+
+    def scripts(self, instructions):
+        """
+        Returns (build script, run command) replaying the incremental instructions.
+        Each RUN runs in a subshell, so only WORKDIR and ENV carry over, as in a docker build.
+        """
+        prefix = []
+        build = ["set -e"]
+        cmd = None
+        for instruction, arguments in instructions:
+            if instruction == 'WORKDIR':
+                step = f"mkdir -p {arguments} && cd {arguments}"
+                prefix.append(step)
+                build.append(step)
+            elif instruction == 'ENV':
+                if '=' in arguments.split()[0]:
+                    step = f"export {arguments}"
+                else:
+                    key, value = arguments.split(None, 1)
+                    step = f"export {key}={shlex.quote(value)}"
+                prefix.append(step)
+                build.append(step)
+            elif instruction == 'RUN':
+                build.append(f"( {command_string(arguments)} )")
+            elif instruction == 'CMD':
+                cmd = command_string(arguments)
+        run_script = None
+        if cmd is not None:
+            run_script = "\n".join(prefix + [f"exec {cmd}"])
+        return "\n".join(build), run_script
+
+    def exec_script(self, script, timeout):
+        return run(f"docker exec {self.container} /bin/sh -c {shlex.quote(script)}",
+                   timeout=timeout, logger=self.logger, cwd=self.workdir)
+
+    def build(self):
+        """
+        Brings the container up to date with the workdir and replays the build steps.
+        Returns the run script. Raises RunException if any step fails.
+        """
+        setup, instructions = self.split_dockerfile()
+        setup_hash = hashlib.sha256("\n".join(setup).encode()).hexdigest()
+        if setup_hash != self.setup_hash or self.manifest is None or not self.container_running():
+            self.project_dest = self.find_project_dest(setup)
+            self.rebuild(setup, setup_hash)
+        else:
+            self.sync()
+        build_script, run_script = self.scripts(instructions)
+        self.exec_script(build_script, timeout=300)
+        return run_script
+
+    def run_test(self, run_script):
+        if run_script is None:
+            raise RunException("No CMD found in Dockerfile.vuln")
+        return self.exec_script(run_script, timeout=200)
+
+    def close(self):
+        self.remove_container()
+        self.manifest = None
+        self.setup_hash = None
+
+_containers = {}
+_containers_lock = threading.Lock()
+
+def get_warm_container(dataset, project_name, workdir, logger):
+    """
+    Returns the warm container for the workdir, creating it on first use.
+    Raises WarmBuildUnsupported for datasets without warm build support.
+    """
+    key = os.path.abspath(workdir)
+    with _containers_lock:
+        if key not in _containers:
+            _containers[key] = WarmContainer(dataset, project_name, workdir, logger)
+        return _containers[key]
+
+def close_warm_container(workdir):
+    with _containers_lock:
+        container = _containers.pop(os.path.abspath(workdir), None)
+    if container is not None:
+        container.close()
+
+@atexit.register
+def close_all_warm_containers():
+    with _containers_lock:
+        containers = list(_containers.values())
+        _containers.clear()
+    for container in containers:
+        container.close()
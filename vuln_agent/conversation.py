@@ -1,3 +1,5 @@
+import bisect
+import itertools
 import litellm
 from litellm import get_max_tokens, token_counter
 from vuln_agent.helpers import *
@@ -6,6 +8,8 @@ class Conversation:
     def __init__(self, model, logger, temperature=0.0, budget=5.0, timeout=3600):
         self.model = model
         self.messages = []
+        self.message_tokens = [] # Token count of each message, computed once when it is appended
+        self.total_tokens = 0
         self.max_tokens = get_max_tokens(str(self.model))
         self.threshold = int(0.20 * self.max_tokens)
         self.fraction_to_condense = 0.7
@@ -15,6 +19,17 @@ class Conversation:
         self.temperature = temperature
     
     def add_message(self, role, content):
+        if self.append_message(role, content):
+            self.condense()
+
+    async def aadd_message(self, role, content):
+        if self.append_message(role, content):
+            await self.acondense()
+
+    def append_message(self, role, content):
+        """
+        Checks the budget, appends the message and returns True if the conversation needs condensing.
+        """
         if role == "assistant":
             raise ValueError("Role 'assistant' is reserved for model responses.")
 
@@ -26,29 +41,57 @@ class Conversation:
             self.logger.log_failure(f"Exceeded timeout of {self.timeout} seconds. Current time: {time} seconds")
             raise RuntimeError(f"Exceeded timeout of {self.timeout} seconds. Current time: {time} seconds")
             
-        self.messages.append({"role": role, "content": content})
-        num_tokens = token_counter(model=str(self.model), messages=self.messages)
-        if num_tokens >= self.threshold:
-            self.condense()
+        self.push_message({"role": role, "content": content})
+        return self.total_tokens >= self.threshold
+
+    def load_messages(self, messages):
+        """
+        Replaces the conversation with previously saved messages (when resuming from a checkpoint).
+        """
+        self.messages = []
+        self.message_tokens = []
+        self.total_tokens = 0
+        for message in messages:
+            self.push_message(message)
+
+    def count_tokens(self, message):
+        return token_counter(model=str(self.model), messages=[message])
+
+    def push_message(self, message):
+        """
+        Appends a message and updates the running token total.
+        """
+        num_tokens = self.count_tokens(message)
+        self.messages.append(message)
+        self.message_tokens.append(num_tokens)
+        self.total_tokens += num_tokens
     
     def generate(self):
         response = self.model.gen(self.messages, top_k=1, temperature=self.temperature, cache=True)[0]
-        self.messages.append({"role": "assistant", "content": response})
+        self.push_message({"role": "assistant", "content": response})
         return response
 
-    def condense(self):
+    async def agenerate(self):
+        if hasattr(self.model, 'agen'):
+            response = await self.model.agen(self.messages, top_k=1, temperature=self.temperature, cache=True)
+        else:
+            response = await asyncio.to_thread(self.model.gen, self.messages, top_k=1, temperature=self.temperature, cache=True)
+        response = response[0]
+        self.push_message({"role": "assistant", "content": response})
+        return response
+
+    def split_for_condensation(self):
+        """
+        Returns (messages_to_condense, messages_to_retain).
+        """
         self.logger.log_status("Condensing conversation to reduce token count.")
-        total_tokens = token_counter(model=str(self.model), messages=self.messages)
-        self.logger.log_status(f"Current conversation length: {len(self.messages)} messages, {total_tokens} tokens.")
-        messages_to_condense = []
-        messages_to_retain = []
-        for i, message in enumerate(self.messages):
-            messages_to_condense.append(message)
-            if token_counter(model=str(self.model), messages=messages_to_condense) >= total_tokens * self.fraction_to_condense:
-                messages_to_condense.pop()  # Remove the last message to condense
-                messages_to_retain = self.messages[i:]
-                break
+        self.logger.log_status(f"Current conversation length: {len(self.messages)} messages, {self.total_tokens} tokens.")
+        # The first message whose prefix reaches the target fraction is the first one retained
+        prefix_tokens = list(itertools.accumulate(self.message_tokens))
+        split = bisect.bisect_left(prefix_tokens, self.total_tokens * self.fraction_to_condense)
+        return self.messages[:split], self.messages[split:]
 
+    def condensation_conversation(self, messages_to_condense):
         prompt = """You are maintaining a context-aware state summary for an interactive agent.
 You will be given a list of events corresponding to actions taken by the agent. Track:
 FILES READ:
@@ -76,8 +119,9 @@ PENDING:
             {"role": "system", "content": "You are an intelligent code assistant."},
             {"role": "user", "content": prompt}
         ]
-        condensation = self.model.gen(condensation_conversation, top_k=1, temperature=0, cache=False)[0]
+        return condensation_conversation
 
+    def apply_condensation(self, condensation, messages_to_retain):
         new_messages = [
             {
                 "role": "user",
@@ -91,7 +135,24 @@ PENDING:
         self.logger.log_output(condensation)
         # Keep the initial few exchanges unchanged
         assert self.messages[0]["role"] == "system" and self.messages[1]["role"] == "user"
+        retained_tokens = self.message_tokens[len(self.messages) - len(messages_to_retain):]
+        self.message_tokens = self.message_tokens[:2] + [self.count_tokens(m) for m in new_messages] + retained_tokens
         self.messages = self.messages[:2] + new_messages + messages_to_retain
+        self.total_tokens = sum(self.message_tokens)
         self.logger.log_status(f"Retained first 2 messages and last {len(messages_to_retain)} messages.")
-        new_tokens = token_counter(model=str(self.model), messages=self.messages)
-        self.logger.log_status(f"New conversation length: {len(self.messages)} messages, {new_tokens} tokens.")
\ No newline at end of file
+        self.logger.log_status(f"New conversation length: {len(self.messages)} messages, {self.total_tokens} tokens.")
+
+    def condense(self):
+        messages_to_condense, messages_to_retain = self.split_for_condensation()
+        condensation_conversation = self.condensation_conversation(messages_to_condense)
+        condensation = self.model.gen(condensation_conversation, top_k=1, temperature=0, cache=False)[0]
+        self.apply_condensation(condensation, messages_to_retain)
+
+    async def acondense(self):
+        messages_to_condense, messages_to_retain = self.split_for_condensation()
+        condensation_conversation = self.condensation_conversation(messages_to_condense)
+        if hasattr(self.model, 'agen'):
+            condensation = await self.model.agen(condensation_conversation, top_k=1, temperature=0, cache=False)
+        else:
+            condensation = await asyncio.to_thread(self.model.gen, condensation_conversation, top_k=1, temperature=0, cache=False)
+        self.apply_condensation(condensation[0], messages_to_retain)
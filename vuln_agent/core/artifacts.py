@@ -0,0 +1,66 @@
+from vuln_agent.helpers import *
+from vuln_agent.models import CACHE_MODES
+import hashlib
+import tempfile
+
+class ArtifactStore:
+    '''
+    On-disk store of the outputs of the reasoning stages (the flow, the branch sequence and
+    the conditions), so that the ablation variants and reruns of a project reuse them instead
+    of running the stage again. For instance, the flow of the full run is exactly the flow
+    the _no_branch variant starts from.
+
+    Each entry is a JSON file named by the sha256 of its key: the stage, dataset, project,
+    project sources (git tree hash), model, prompt version and the stage inputs. Only
+    successful stage outputs are stored.
+
+    mode: 'readwrite' - serve hits, store misses
+          'read'      - serve hits, never write
+          'record'    - always run the stage and (over)write the entry
+    '''
+
+    def __init__(self, store_dir, mode='readwrite'):
+        if mode not in CACHE_MODES or mode == 'off':
+            raise ValueError(f"Invalid artifact cache mode {mode}. Supported modes are: {CACHE_MODES[1:]}")
+        self.store_dir = Path(store_dir).absolute()
+        self.mode = mode
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(key_fields):
+        payload = json.dumps(key_fields, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key_fields):
+        return self.store_dir / key_fields['project'] / f"{key_fields['stage']}_{self.make_key(key_fields)}.json"
+
+    def get(self, key_fields):
+        if self.mode == 'record':
+            return None
+        try:
+            with open(self.path_for(key_fields), 'r') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry
+
+    def put(self, key_fields, value, source=None):
+        if self.mode == 'read':
+            return
+        path = self.path_for(key_fields)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({'key': key_fields, 'value': value, 'source': source, 'date': f"{datetime.datetime.now()}"}, indent=2)
+        # Write to a temporary file and rename it, so that concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+def sources_hash(workdir):
+    """
+    Returns the git tree hash of the project workdir's HEAD, or None if it is not a git repository.
+    """
+    try:
+        return run("git rev-parse HEAD^{tree}", cwd=workdir).strip()
+    except RunException:
+        return None
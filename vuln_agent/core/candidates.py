@@ -0,0 +1,148 @@
+from vuln_agent.helpers import *
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from vuln_agent.workdir import provision_workdir
+from vuln_agent.build import close_warm_container
+from vuln_agent.tools.trigram_index import drop_index
+from vuln_agent.tools.tree_snapshot import drop_snapshot
+from vuln_agent.tools.callgraph import drop_callgraph
+from vuln_agent.core.checkpoint import capture_workdir_diff
+
+class TrackingExecutor(ThreadPoolExecutor):
+    '''
+    Thread pool that keeps track of its unfinished futures. Cancelling the asyncio task that
+    awaits one does not stop the thread, so the futures are what has to be waited for.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.futures = set()
+        self.futures_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        with self.futures_lock:
+            self.futures.add(future)
+        future.add_done_callback(self.discard)
+        return future
+
+    def discard(self, future):
+        with self.futures_lock:
+            self.futures.discard(future)
+
+    def unfinished(self):
+        with self.futures_lock:
+            return [future for future in self.futures if not future.done()]
+
+class Candidate:
+    '''
+    A speculative test generation trajectory, run in its own copy of the project workdir:
+    <dataset workdir>/candidate-sources/<project>_cand<index>. It is built and run as the
+    image <project>_cand<index>_vuln, in the container <project>_cand<index>_run, so that
+    candidates do not overwrite each other's image or container.
+
+    Its blocking work (provisioning, tool calls, validation) runs on its own executor, so that
+    a cancelled candidate can be stopped before its workdir is deleted (see remove()).
+
+    For cwe-bench-java the Dockerfile copies ./project-sources/<project> from the dataset
+    workdir, so the copy's Dockerfile.vuln (and its backup, which the Reset tool restores)
+    is pointed at the candidate directory instead (point_copy_at), and pointed back in diff().
+    '''
+
+    def __init__(self, dataset, project, workdir, index):
+        self.dataset = dataset
+        self.project = project
+        self.index = index
+        self.source = Path(workdir)
+        self.workdir = self.source.parent.parent / "candidate-sources" / f"{project}_cand{index}"
+        self.image_tag = f"{self.workdir.name.lower()}_vuln"
+        self.container = f"{self.workdir.name.lower()}_run"
+        self.executor = TrackingExecutor(max_workers=1, thread_name_prefix=self.workdir.name)
+
+    def in_thread(self, fn, *args):
+        """
+        Returns an awaitable that runs fn(*args) on the candidate's executor.
+        """
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def copy_path(self, workdir):
+        return f"./{workdir.parent.name}/{workdir.name}"
+
+    def provision(self):
+        """
+        Copies the project workdir, which must be reset to the vulnerable commit.
+        A leftover copy (from a run that died) is replaced.
+        """
+        if self.workdir.exists():
+            shutil.rmtree(self.workdir)
+        provision_workdir(self.source, self.workdir)
+        if self.dataset == 'cwe-bench-java':
+            self.point_copy_at(self.source, self.workdir)
+
+    def point_copy_at(self, source, target):
+        """
+        Points the COPY of `source` in the copy's Dockerfiles (Dockerfile.vuln and the backup
+        the Reset tool restores) at `target`. Only the Dockerfiles are rewritten.
+        """
+        pattern = rf"(?<=\s){re.escape(self.copy_path(source))}(?=[/\s])"
+        for name in ["Dockerfile.vuln", ".Dockerfile.backup"]:
+            dockerfile = self.workdir / name
+            if dockerfile.exists():
+                dockerfile.write_text(re.sub(pattern, self.copy_path(target), dockerfile.read_text()))
+
+    def diff(self):
+        """
+        Returns (diff, added files) of the candidate against the vulnerable commit, as it
+        applies to the project workdir (see checkpoint.apply_workdir_diff). The Dockerfiles
+        are pointed back at the project workdir first, so the candidate is unusable afterwards.
+        """
+        if self.dataset == 'cwe-bench-java':
+            self.point_copy_at(self.workdir, self.source)
+        return capture_workdir_diff(self.workdir)
+
+    def rebase_messages(self, messages):
+        """
+        Returns the candidate's conversation with its paths rewritten to the project workdir's,
+        for the test generation module that takes over the adopted test.
+        """
+        text = json.dumps(messages)
+        for old, new in [(str(self.workdir), str(self.source)),
+                         (self.copy_path(self.workdir), self.copy_path(self.source))]:
+            text = text.replace(json.dumps(old)[1:-1], json.dumps(new)[1:-1])
+        return json.loads(text)
+
+    def stop(self):
+        """
+        Waits for the candidate's in-flight work to finish. A cancelled candidate may still be
+        running a tool call or a validation: its test container is killed (repeatedly, since
+        a build that is still running starts it afterwards), and a docker build runs to its end.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        while True:
+            running = self.executor.unfinished()
+            if not running:
+                break
+            try:
+                run(f"docker rm -f {self.container}", timeout=60)
+            except RunException:
+                pass # Not started (yet)
+            wait(running, timeout=5)
+
+    def remove(self):
+        """
+        Stops the candidate, and deletes its copy and its image.
+        """
+        self.stop()
+        try:
+            run(f"docker rmi -f {self.image_tag}", timeout=60)
+        except RunException:
+            pass # Never built
+        close_warm_container(self.workdir)
+        drop_index(self.workdir)
+        drop_snapshot(self.workdir)
+        drop_callgraph(self.workdir)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        try:
+            run("git worktree prune", cwd=self.source) # In case the copy was a git worktree
+        except RunException:
+            pass
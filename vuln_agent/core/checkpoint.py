@@ -0,0 +1,109 @@
+from vuln_agent.helpers import *
+import tempfile
+from vuln_agent.core.artifacts import sources_hash
+
+STAGES = ['flow', 'branch', 'test_gen', 'repair', 'done']
+
+def capture_workdir_diff(workdir):
+    """
+    Returns (diff, added files) of the workdir against HEAD (the vulnerable commit), including
+    untracked files such as the generated test and Dockerfile.vuln. Ignored files (build outputs)
+    are left out. A temporary copy of the workdir's index is used, so the index itself is
+    untouched, while `git add` still skips the files whose cached stat data is unchanged.
+    """
+    with tempfile.TemporaryDirectory(dir='/tmp') as tmpdir:
+        index = os.path.join(tmpdir, "index")
+        env = {**os.environ, "GIT_INDEX_FILE": index}
+        git = lambda *args: subprocess.run(["git", *args], cwd=workdir, env=env, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE, check=True).stdout
+        workdir_index = subprocess.run(["git", "rev-parse", "--git-path", "index"], cwd=workdir, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, check=True, text=True).stdout.strip()
+        try:
+            shutil.copyfile(Path(workdir) / workdir_index, index)
+        except FileNotFoundError:
+            git("read-tree", "HEAD")
+        git("add", "-A")
+        diff = git("diff", "--cached", "--binary", "HEAD")
+        added = git("diff", "--cached", "--name-only", "--diff-filter=A", "-z", "HEAD")
+    return diff, [path for path in added.decode('utf-8', errors='surrogateescape').split('\0') if path]
+
+def apply_workdir_diff(workdir, diff, added):
+    """
+    Applies a diff from capture_workdir_diff to a workdir that was just reset to the vulnerable commit.
+    Files the diff adds that survive the reset (Dockerfile.vuln, ...) are replaced by their version in the diff.
+    """
+    for path in added:
+        full_path = Path(workdir) / path
+        if full_path.exists() or full_path.is_symlink():
+            full_path.unlink()
+    if diff:
+        subprocess.run(["git", "apply", "--binary", "-"], cwd=workdir, input=diff,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+class Checkpoint:
+    '''
+    Stage-level checkpoint of an AgentEngine run, so that a run that died (budget, API outage,
+    reboot) can be resumed with --resume instead of paying for the completed stages again.
+
+    Stored next to the project workdirs, in <dataset workdir>/.checkpoints/<project>/:
+    checkpoint.json holds the last completed stage, the stage results (flow, branches,
+    conditions), the test generation conversation, the number of repairs done and the logger
+    totals; workdir.patch holds the workdir diff against the vulnerable commit.
+    '''
+
+    def __init__(self, workdir):
+        self.workdir = Path(workdir)
+        self.dir = self.workdir.parent.parent / ".checkpoints" / self.workdir.name
+        self.state_path = self.dir / "checkpoint.json"
+        self.patch_path = self.dir / "workdir.patch"
+
+    def save(self, stage, state, logger):
+        """
+        Records that `stage` completed, with the results so far in `state`.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Invalid stage {stage}. Supported stages are: {STAGES}")
+        self.dir.mkdir(parents=True, exist_ok=True)
+        try:
+            diff, added = capture_workdir_diff(self.workdir)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.log_failure(f"Could not capture the workdir diff for the checkpoint: {e}")
+            return
+        cost, elapsed_time = logger.get_cost_and_time()
+        checkpoint = {'stage': stage,
+                      'state': state,
+                      'added_files': added,
+                      'sources': sources_hash(self.workdir),
+                      'totals': {'cost': cost, 'time': elapsed_time},
+                      'log_folder': str(logger.output_dir),
+                      'date': f"{datetime.datetime.now()}"}
+        # The patch is written first; checkpoint.json is renamed into place last, so it never refers to a partial patch
+        tmp_patch = self.patch_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_patch.write_bytes(diff)
+        os.replace(tmp_patch, self.patch_path)
+        tmp_state = self.state_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_state.write_text(json.dumps(checkpoint, indent=2))
+        os.replace(tmp_state, self.state_path)
+        logger.log_status(f"Checkpointed stage {stage}.")
+
+    def load(self):
+        """
+        Returns the checkpoint, or None if there is none or it was taken on other project sources.
+        """
+        try:
+            checkpoint = json.loads(self.state_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if checkpoint['sources'] != sources_hash(self.workdir):
+            return None
+        return checkpoint
+
+    def restore_workdir(self, checkpoint):
+        """
+        Applies the checkpointed diff to a workdir that was just reset to the vulnerable commit.
+        """
+        apply_workdir_diff(self.workdir, self.patch_path.read_bytes(), checkpoint['added_files'])
+
+    def clear(self):
+        if self.dir.exists():
+            shutil.rmtree(self.dir)
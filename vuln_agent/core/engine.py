@@ -1,11 +1,21 @@
 from vuln_agent.helpers import *
 from vuln_agent.modules import *
-from vuln_agent.models import get_model_from_name
+from vuln_agent.models import get_model_from_name, ResponseCache
 from vuln_agent.conversation import Conversation
 from vuln_agent.prompts import *
+from vuln_agent.build import close_warm_container, begin_run, end_run, DEFAULT_IMAGE_BUDGET
+from vuln_agent.tools.trigram_index import refresh_index
+from vuln_agent.tools.tree_snapshot import invalidate_snapshot
+from vuln_agent.tools.callgraph import refresh_callgraph
+from vuln_agent.core.artifacts import ArtifactStore, sources_hash
+from vuln_agent.core.checkpoint import Checkpoint, apply_workdir_diff
+from vuln_agent.core.candidates import Candidate
 
 class AgentEngine:
 
+    MAX_REPAIRS = 5 # Validation feedback rounds given to test generation
+    CANDIDATE_TEMPERATURE = 0.7 # Test generation candidates are sampled hotter, so that they diverge
+
     def __init__(self,
                 dataset: str,
                 project: str,
@@ -15,27 +25,44 @@ class AgentEngine:
                 budget: float = 5.0,
                 timeout: int = 3600,
                 use_patch: bool = False,
+                seed_paths: bool = False,
+                resume: bool = False,
                 no_flow: bool = False,
-                no_branch: bool = False):
+                no_branch: bool = False,
+                llm_cache: str = 'off',
+                llm_cache_dir: str = '.llm_cache',
+                artifact_cache: str = 'off',
+                artifact_cache_dir: str = '.artifact_cache',
+                candidates: int = 1,
+                warm_build: bool = False,
+                image_budget: int = DEFAULT_IMAGE_BUDGET):
         
         self.dataset = dataset
         self.project = project
-        self.model = get_model_from_name(model, logger)
+        cache = ResponseCache(llm_cache_dir, mode=llm_cache) if llm_cache != 'off' else None
+        self.model = get_model_from_name(model, logger, cache=cache)
+        self.artifacts = ArtifactStore(artifact_cache_dir, mode=artifact_cache) if artifact_cache != 'off' else None
         self.workdir = Path(workdir)
         self.logger = logger
         self.budget = budget
         self.timeout = timeout
         self.use_patch = use_patch
+        self.seed_paths = seed_paths
+        self.resume = resume
+        self.checkpoint = Checkpoint(self.workdir)
         self.no_flow = no_flow
         self.no_branch = no_branch
+        self.candidates = candidates
+        self.warm_build = warm_build
+        self.image_budget = image_budget
         self.setup() # Sets up source_manager and target_manager
 
     def setup(self):
 
         assert Path(self.workdir).exists(), f"Code directory {self.workdir} does not exist"
-        os.chdir(self.workdir)
         self.logger.log_status("Working in directory: {}".format(self.workdir.absolute()))
-        run("docker rmi -f vulnerability-test && docker image prune -f", timeout=300, logger=self.logger)
+        # Images are no longer wiped here; close() collects this run's images instead
+        begin_run(self.project)
 
     def reset(self):
 
@@ -44,10 +71,10 @@ class AgentEngine:
             ".Dockerfile.backup",
             "Dockerfile.vuln",
         ]
-        os.chdir(self.workdir)
         try:
-            run("git stash", logger=self.logger)
-            result = run("git ls-files --others --exclude-standard", logger=self.logger)
+            # Discard the changes rather than stashing them: a worktree shares refs/stash with its source repository
+            run("git checkout -- .", logger=self.logger, cwd=self.workdir)
+            result = run("git ls-files --others --exclude-standard", logger=self.logger, cwd=self.workdir)
             created_files = result.strip().splitlines()
             created_files = [f for f in created_files if f.strip() not in files_to_preserve]
         except RunException as e:
@@ -62,104 +89,141 @@ class AgentEngine:
             if (self.workdir / "Dockerfile.vuln").exists():
                 Path(self.workdir / "Dockerfile.vuln").unlink()
             shutil.copy(dockerfile_backup, self.workdir / "Dockerfile.vuln")
-        
-        self.logger.log_status("Reset working directory to clean state.")
 
-    def run(self):
+        refresh_index(self.workdir)
+        invalidate_snapshot(self.workdir)
+        refresh_callgraph(self.workdir)
+        self.logger.log_status("Reset working directory to clean state.")
 
-        self.reset()
-        conversation = Conversation(self.model, self.logger, temperature=0.3, budget=self.budget, timeout=self.timeout)
+    def new_conversation(self, temperature=0.3):
+        conversation = Conversation(self.model, self.logger, temperature=temperature, budget=self.budget, timeout=self.timeout)
         conversation.add_message("system", SYS_PROMPT)
+        return conversation
 
+    def make_flow_reasoning(self):
+        return FlowReasoning(self.model,
+                            self.dataset,
+                            self.project,
+                            self.workdir,
+                            self.logger,
+                            init_conversation=self.new_conversation(),
+                            use_patch=self.use_patch,
+                            max_turns=100,
+                            seed_paths=self.seed_paths)
 
-        if not self.no_flow:
-            flow_reasoning = FlowReasoning(self.model,
-                                        self.dataset,
-                                        self.project,
-                                        self.workdir,
-                                        self.logger,
-                                        init_conversation=conversation,
-                                        use_patch=self.use_patch,
-                                        max_turns=100)
-            flow = flow_reasoning.run()
-            if not flow:
-                self.logger.log_failure("Flow reasoning failed.")
-                self.logger.log_result({f"flow_reasoning": "failure"})
-                return
-            self.logger.log_result({f"flow_reasoning": "success"})
-        else:
-            self.logger.log_status("Flow reasoning is disabled, skipping flow analysis.")
-            flow = None
-
-        if not self.no_branch:
-            self.reset()
-            conversation = Conversation(self.model, self.logger, temperature=0.3, budget=self.budget, timeout=self.timeout)
-            conversation.add_message("system", SYS_PROMPT)
-
-            branch_reasoning = BranchReasoning(self.model,
-                                            self.dataset,
-                                            self.project,
-                                            self.workdir,
-                                            self.logger,
-                                            init_conversation=conversation,
-                                            max_turns=100)
-            branches, conditions = branch_reasoning.run(flow)
-            if not branches:
-                self.logger.log_failure("Branch reasoning failed.")
-                self.logger.log_result({f"branch_reasoning": "failure"})
-                return
-            self.logger.log_result({f"branch_reasoning": "success"})
-        else:
-            self.logger.log_status("Branch reasoning is disabled, skipping branch analysis.")
-            branches = None
-            conditions = None
-
-        self.reset()
-        conversation = Conversation(self.model, self.logger, temperature=0.3, budget=self.budget, timeout=self.timeout)
-        conversation.add_message("system", SYS_PROMPT)
+    def make_branch_reasoning(self):
+        return BranchReasoning(self.model,
+                            self.dataset,
+                            self.project,
+                            self.workdir,
+                            self.logger,
+                            init_conversation=self.new_conversation(),
+                            max_turns=100)
 
-        test_gen = TestGen(self.model,
+    def make_test_gen(self, flow, conditions, candidate=None):
+        if candidate is not None:
+            # Warm containers are named after the project, so candidates use full builds
+            return TestGen(self.model,
                         self.dataset,
                         self.project,
-                        self.workdir,
+                        candidate.workdir,
                         self.logger,
-                        init_conversation=conversation,
+                        init_conversation=self.new_conversation(temperature=self.CANDIDATE_TEMPERATURE),
                         flow=flow,
                         conditions=conditions,
-                        max_turns=100)
-        status = test_gen.run()
+                        max_turns=100,
+                        image_tag=candidate.image_tag,
+                        container=candidate.container,
+                        executor=candidate.executor)
+        return TestGen(self.model,
+                    self.dataset,
+                    self.project,
+                    self.workdir,
+                    self.logger,
+                    init_conversation=self.new_conversation(),
+                    flow=flow,
+                    conditions=conditions,
+                    max_turns=100,
+                    warm_build=self.warm_build)
+
+    def artifact_key(self, stage, inputs):
+        return {'stage': stage,
+                'dataset': self.dataset,
+                'project': self.project,
+                'sources': sources_hash(self.workdir),
+                'model': str(self.model),
+                'prompt_version': PROMPT_VERSION,
+                'inputs': inputs}
+
+    def load_artifact(self, stage, inputs):
+        """
+        Returns the stored output of `stage` for these inputs, if the artifact store has one.
+        """
+        if self.artifacts is None:
+            return None
+        entry = self.artifacts.get(self.artifact_key(stage, inputs))
+        if entry is None:
+            return None
+        self.logger.log_status(f"Reusing the {stage} output of {entry['source']} ({entry['date']}).")
+        self.logger.log_action({'type': 'artifact', 'stage': stage, 'source': entry['source']})
+        return entry['value']
+
+    def store_artifact(self, stage, inputs, value):
+        if self.artifacts is not None:
+            self.artifacts.put(self.artifact_key(stage, inputs), value, source=str(self.logger.output_dir))
+
+    def flow_inputs(self):
+        return {'use_patch': self.use_patch, 'seed_paths': self.seed_paths}
+
+    async def arun_flow_reasoning(self):
+        """
+        Returns the flow, from the artifact store or by running flow reasoning.
+        """
+        artifact = self.load_artifact('flow', self.flow_inputs())
+        if artifact is not None:
+            return artifact['flow']
+        flow = await self.make_flow_reasoning().arun()
+        if flow:
+            self.store_artifact('flow', self.flow_inputs(), {'flow': flow})
+        return flow
 
+    async def arun_branch_reasoning(self, flow):
+        """
+        Returns the branch sequence and conditions, from the artifact store or by running branch reasoning.
+        """
+        artifact = self.load_artifact('branch', {'flow': flow})
+        if artifact is not None:
+            return artifact['branches'], artifact['conditions']
+        branches, conditions = await self.make_branch_reasoning().arun(flow)
+        if branches:
+            self.store_artifact('branch', {'flow': flow}, {'branches': branches, 'conditions': conditions})
+        return branches, conditions
+
+    def check_flow(self, flow):
+        if not flow:
+            self.logger.log_failure("Flow reasoning failed.")
+            self.logger.log_result({f"flow_reasoning": "failure"})
+            return False
+        self.logger.log_result({f"flow_reasoning": "success"})
+        return True
+
+    def check_branches(self, branches):
+        if not branches:
+            self.logger.log_failure("Branch reasoning failed.")
+            self.logger.log_result({f"branch_reasoning": "failure"})
+            return False
+        self.logger.log_result({f"branch_reasoning": "success"})
+        return True
+
+    def check_test_gen(self, status):
         if status == "Failure":
             self.logger.log_failure("Test generation failed.")
             self.logger.log_result({f"test_gen": "failure"})
-            return
+            return False
         self.logger.log_result({f"test_gen": "success"})
+        return True
 
-        validation = Validation(self.dataset, self.project, self.workdir, self.logger)
-
-        for repair_attempt in range(5):
-            start_time = time.time()
-            start_time_str = f"{datetime.datetime.now()}"
-            feedback = validation.validate()
-            elapsed_time = time.time() - start_time
-            self.logger.log_action({
-                'type': 'validation',
-                'start_time': start_time_str,
-                'elapsed_time': elapsed_time,
-            })
-            if feedback['status'] == "Correct":
-                self.logger.log_success("Validation passed.")
-                self.logger.log_result({"validation": "success"})
-                return
-            elif feedback['status'] == "Incorrect":
-                self.logger.log_status("Giving feedback to test generation module...")
-                self.logger.log_result({"validation": "incorrect"})
-                test_gen.repair(feedback['error'])
-            elif feedback['status'] == "Failed":
-                self.logger.log_failure("Validation failed due to an internal error.")
-                self.logger.log_result({"validation": "failure"})
-                break
-        
+    def validate(self, validation):
         start_time = time.time()
         start_time_str = f"{datetime.datetime.now()}"
         feedback = validation.validate()
@@ -169,17 +233,250 @@ class AgentEngine:
             'start_time': start_time_str,
             'elapsed_time': elapsed_time,
         })
+        return feedback
+
+    def check_final_validation(self, feedback):
         if feedback['status'] == "Correct":
             self.logger.log_success("Validation passed.")
             self.logger.log_result({"validation": "success"})
-            return
         elif feedback['status'] == "Incorrect":
             self.logger.log_status("Validation incorrect...")
             self.logger.log_result({"validation": "incorrect"})
         elif feedback['status'] == "Failed":
             self.logger.log_failure("Validation failed due to an internal error.")
             self.logger.log_result({"validation": "failure"})
-                    
+
+    def resume_checkpoint(self):
+        """
+        Returns the checkpoint to resume from, restoring the logger totals, or None to start from scratch.
+        """
+        if not self.resume:
+            self.checkpoint.clear() # From an earlier run of this workdir
+            return None
+        checkpoint = self.checkpoint.load()
+        if checkpoint is None:
+            self.logger.log_status("No checkpoint to resume from, starting from scratch.")
+            return None
+        self.logger.log_status(f"Resuming after stage {checkpoint['stage']} of {checkpoint['log_folder']} ({checkpoint['date']}).")
+        if checkpoint['stage'] != 'done':
+            self.logger.restore_totals(checkpoint['totals']['cost'], checkpoint['totals']['time'])
+        return checkpoint
+
+    def save_checkpoint(self, stage, state, test_gen=None):
+        if test_gen is not None:
+            state['test_gen_messages'] = test_gen.get_conversation().messages
+        self.checkpoint.save(stage, state, self.logger)
+
+    def restore_test_gen(self, test_gen, checkpoint):
+        """
+        Restores the workdir and the test generation conversation of a checkpoint taken after test generation.
+        """
+        self.reset()
+        self.checkpoint.restore_workdir(checkpoint)
+        refresh_index(self.workdir)
+        invalidate_snapshot(self.workdir)
+        refresh_callgraph(self.workdir)
+        test_gen.get_conversation().load_messages(checkpoint['state']['test_gen_messages'])
+        self.logger.log_status("Restored the generated test from the checkpoint.")
+
+    def adopt_candidate(self, candidate):
+        """
+        Replaces the changes in the workdir with the test (and source edits) of a candidate.
+        """
+        diff, added = candidate.diff()
+        self.reset()
+        apply_workdir_diff(self.workdir, diff, added)
+        refresh_index(self.workdir)
+        invalidate_snapshot(self.workdir)
+        refresh_callgraph(self.workdir)
+        self.logger.log_status(f"Applied the test of candidate {candidate.index} to the working directory.")
+
+    async def arun_candidate(self, candidate, flow, conditions):
+        """
+        Runs test generation in a candidate's workdir and validates the test once.
+        Returns (test_gen, validation feedback); the feedback is None if test generation failed.
+        """
+        await candidate.in_thread(candidate.provision)
+        test_gen = self.make_test_gen(flow, conditions, candidate=candidate)
+        status = await test_gen.arun()
+        if status == "Failure":
+            self.logger.log_failure(f"Candidate {candidate.index}: test generation failed.")
+            return test_gen, None
+        validation = Validation(self.dataset, self.project, candidate.workdir, self.logger,
+                                image_tag=candidate.image_tag, container=candidate.container)
+        feedback = await candidate.in_thread(self.validate, validation)
+        self.logger.log_status(f"Candidate {candidate.index}: validation {feedback['status'].lower()}.")
+        return test_gen, feedback
+
+    async def arun_candidates(self, flow, conditions, state):
+        """
+        Speculative test generation: runs self.candidates test generation trajectories concurrently,
+        each in its own copy of the workdir and at CANDIDATE_TEMPERATURE, and validates each once.
+        The first candidate that validates wins and the others are cancelled; if none validates,
+        the first candidate that generated a test is chosen. The chosen test is applied to the
+        workdir and returned as the main test generation module, which is validated again in the
+        workdir and goes through the normal repair loop. Returns None if no candidate generated a test.
+
+        The candidates share the engine's logger, so the budget and timeout cap their combined
+        cost and (summed) time rather than each candidate's.
+        """
+        candidates = [Candidate(self.dataset, self.project, self.workdir, i) for i in range(self.candidates)]
+        self.logger.log_status(f"Running {len(candidates)} test generation candidates concurrently.")
+        tasks = {asyncio.create_task(self.arun_candidate(candidate, flow, conditions)): candidate
+                 for candidate in candidates}
+        pending = set(tasks)
+        finished = [] # (candidate, test_gen, feedback), in order of completion
+        winner = None
+        error = None
+        chosen = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate = tasks[task]
+                    if task.exception() is not None:
+                        self.logger.log_failure(f"Candidate {candidate.index} failed: {task.exception()}")
+                        error = error or task.exception()
+                        continue
+                    test_gen, feedback = task.result()
+                    if feedback is not None:
+                        finished.append((candidate, test_gen, feedback))
+                    if winner is None and feedback is not None and feedback['status'] == "Correct":
+                        winner = candidate
+            if pending:
+                self.logger.log_status(f"Candidate {winner.index} validated, cancelling {len(pending)} other candidate(s).")
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            try:
+                chosen = next((entry for entry in finished if entry[0] is winner), finished[0] if finished else None)
+                if chosen is not None:
+                    await asyncio.to_thread(self.adopt_candidate, chosen[0])
+            finally:
+                for candidate in candidates:
+                    await asyncio.to_thread(candidate.remove)
+
+        self.logger.log_action({'type': 'candidates',
+                                'candidates': len(candidates),
+                                'finished': [entry[0].index for entry in finished],
+                                'winner': winner.index if winner is not None else None})
+        if chosen is None:
+            if error is not None:
+                raise error # e.g. the budget ran out
+            self.check_test_gen("Failure")
+            return None
+        candidate, candidate_test_gen, _ = chosen
+        test_gen = self.make_test_gen(flow, conditions)
+        test_gen.get_conversation().load_messages(candidate.rebase_messages(candidate_test_gen.get_conversation().messages))
+        self.check_test_gen("Success")
+        state['candidate'] = candidate.index
+        state['repairs'] = 0
+        await asyncio.to_thread(self.save_checkpoint, 'test_gen', state, test_gen)
+        return test_gen
+
+    async def arun(self):
+        """
+        Runs the agent. Model calls are awaited so that several engines can share
+        one event loop; docker builds, validation, resets and checkpoints run on worker threads.
+        """
+
+        checkpoint = await asyncio.to_thread(self.resume_checkpoint)
+        if checkpoint is not None and checkpoint['stage'] == 'done':
+            self.logger.log_status("The checkpointed run had already completed.")
+            return
+        state = checkpoint['state'] if checkpoint else {}
+        await self.arun_stages(state, checkpoint)
+        await asyncio.to_thread(self.save_checkpoint, 'done', state)
+
+    async def arun_stages(self, state, checkpoint):
+        """
+        Runs the stages after the last one completed in `state`, checkpointing after each.
+        """
+
+        await asyncio.to_thread(self.reset)
+
+        if 'flow' in state:
+            flow = state['flow']
+            self.check_flow(flow)
+        elif not self.no_flow:
+            flow = await self.arun_flow_reasoning()
+            if not self.check_flow(flow):
+                return
+            state['flow'] = flow
+            await asyncio.to_thread(self.save_checkpoint, 'flow', state)
+        else:
+            self.logger.log_status("Flow reasoning is disabled, skipping flow analysis.")
+            flow = None
+
+        if 'branches' in state:
+            branches, conditions = state['branches'], state['conditions']
+            self.check_branches(branches)
+        elif not self.no_branch:
+            await asyncio.to_thread(self.reset)
+            branches, conditions = await self.arun_branch_reasoning(flow)
+            if not self.check_branches(branches):
+                return
+            state['branches'], state['conditions'] = branches, conditions
+            await asyncio.to_thread(self.save_checkpoint, 'branch', state)
+        else:
+            self.logger.log_status("Branch reasoning is disabled, skipping branch analysis.")
+            branches = None
+            conditions = None
+
+        if self.candidates > 1 and 'test_gen_messages' not in state:
+            await asyncio.to_thread(self.reset)
+            test_gen = await self.arun_candidates(flow, conditions, state)
+            if test_gen is None:
+                return
+        elif 'test_gen_messages' in state:
+            test_gen = self.make_test_gen(flow, conditions)
+            await asyncio.to_thread(self.restore_test_gen, test_gen, checkpoint)
+            self.check_test_gen("Success")
+        else:
+            test_gen = self.make_test_gen(flow, conditions)
+            await asyncio.to_thread(self.reset)
+            status = await test_gen.arun()
+            if not self.check_test_gen(status):
+                return
+            state['repairs'] = 0
+            await asyncio.to_thread(self.save_checkpoint, 'test_gen', state, test_gen)
+
+        validation = Validation(self.dataset, self.project, self.workdir, self.logger)
+
+        for repair_attempt in range(state['repairs'], self.MAX_REPAIRS):
+            feedback = await asyncio.to_thread(self.validate, validation)
+            if feedback['status'] == "Correct":
+                self.logger.log_success("Validation passed.")
+                self.logger.log_result({"validation": "success"})
+                return
+            elif feedback['status'] == "Incorrect":
+                self.logger.log_status("Giving feedback to test generation module...")
+                self.logger.log_result({"validation": "incorrect"})
+                await test_gen.arepair(feedback['error'])
+                state['repairs'] = repair_attempt + 1
+                await asyncio.to_thread(self.save_checkpoint, 'repair', state, test_gen)
+            elif feedback['status'] == "Failed":
+                self.logger.log_failure("Validation failed due to an internal error.")
+                self.logger.log_result({"validation": "failure"})
+                break
+
+        self.check_final_validation(await asyncio.to_thread(self.validate, validation))
+
+    def run(self):
+        """
+        Synchronous entry point: runs arun() on a new event loop.
+        """
+        asyncio.run(self.arun())
+
+    def close(self):
+        """
+        Releases per-run resources (the warm build container, if any) and garbage-collects
+        docker images down to the image budget.
+        """
+        close_warm_container(self.workdir)
+        end_run(self.project, budget=self.image_budget, logger=self.logger)
 
     def print_results(self):
         pass
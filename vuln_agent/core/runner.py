@@ -0,0 +1,108 @@
+from vuln_agent.helpers import *
+from vuln_agent.core.engine import AgentEngine
+from vuln_agent.build import DEFAULT_IMAGE_BUDGET
+from vuln_agent.workdir import provision_workdir
+
+def get_workdir_suffix(no_flow: bool, no_branch: bool) -> str:
+    workdir_suffix = "_no_flow" if no_flow else ""
+    workdir_suffix += "_no_branch" if no_branch else ""
+    return workdir_suffix
+
+def prepare_shared_workdir(dataset: str, workdir_suffix: str = "") -> Path:
+    """
+    Creates the dataset workdir and the resources shared by all its projects.
+    """
+    if dataset != 'cwe-bench-java' and dataset != 'primevul':
+        raise ValueError(f"Unknown dataset: {dataset}")
+    workdir = Path('data') / dataset / f'workdir{workdir_suffix}'
+    if not workdir.exists():
+        workdir.mkdir(parents=True, exist_ok=True)
+    if dataset == 'cwe-bench-java':
+        java_env_dir = workdir / 'java-env'
+        if not java_env_dir.exists():
+            provision_workdir('data/cwe-bench-java/java-env', java_env_dir)
+        resources_dir = workdir / 'resources'
+        if not resources_dir.exists():
+            provision_workdir('data/cwe-bench-java/resources', resources_dir)
+    return workdir
+
+def prepare_workdir(dataset: str, project: str, workdir_suffix: str = "", method: str = 'auto', resume: bool = False) -> Path:
+    """
+    Provisions a fresh per-run working directory from the project sources
+    (see vuln_agent.workdir.provision_workdir for the methods).
+    Returns the absolute path of the project workdir.
+    Raises FileExistsError if the project workdir already exists, unless `resume` is set,
+    in which case the existing workdir is returned (the engine restores it from its checkpoint).
+    """
+    if dataset == 'cwe-bench-java' or dataset == 'primevul':
+        project_dir = Path('data') / dataset / 'project-sources' / project
+        workdir = prepare_shared_workdir(dataset, workdir_suffix)
+        project_workdir = workdir / 'project-sources' / project
+        if project_workdir.exists() and resume:
+            return project_workdir.absolute()
+        if project_workdir.exists():
+            raise FileExistsError(f"Error: project workdir {project_workdir} already exists. Please remove it first.")
+        if not project_dir.exists():
+            raise ValueError(f"Project {project} does not exist in {project_dir}")
+        provision_workdir(project_dir, project_workdir, method)
+        project_workdir = Path(project_workdir).absolute()
+        if not project_workdir.exists():
+            raise ValueError(f"{project_workdir} does not exist after provisioning from {project_dir}")
+        return project_workdir
+    else:
+        raise ValueError(f"Unknown dataset: {dataset}")
+
+def create_log_folder(project: str, log_root: Path = Path("logs")) -> Path:
+    timestr = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_folder = Path(log_root) / f"{project}_{timestr}"
+    if not log_folder.exists():
+        log_folder.mkdir(parents=True, exist_ok=True)
+    return log_folder.absolute()
+
+def make_engine(args, project_workdir: Path, log_folder: Path) -> AgentEngine:
+    logger = Logger(log_folder, args, verbose=args.verbose, output_compression=getattr(args, 'output_compression', None))
+
+    return AgentEngine(dataset=args.dataset,
+                        project=args.project,
+                        model=args.model,
+                        workdir=project_workdir,
+                        logger=logger,
+                        budget=args.budget,
+                        timeout=args.timeout,
+                        use_patch=args.use_patch,
+                        seed_paths=getattr(args, 'seed_paths', False),
+                        resume=getattr(args, 'resume', False),
+                        no_flow=args.no_flow,
+                        no_branch=args.no_branch,
+                        llm_cache=getattr(args, 'llm_cache', 'off'),
+                        llm_cache_dir=getattr(args, 'llm_cache_dir', '.llm_cache'),
+                        artifact_cache=getattr(args, 'artifact_cache', 'off'),
+                        artifact_cache_dir=getattr(args, 'artifact_cache_dir', '.artifact_cache'),
+                        candidates=getattr(args, 'candidates', 1),
+                        warm_build=getattr(args, 'warm_build', False),
+                        image_budget=int(getattr(args, 'image_budget', DEFAULT_IMAGE_BUDGET / 1024**3) * 1024**3))
+
+def run_project(args, project_workdir: Path, log_folder: Path) -> AgentEngine:
+    """
+    Runs the agent on a single, already prepared project workdir.
+    `args` is the parsed command line namespace (see main.py); `args.project` selects the project.
+    """
+    engine = make_engine(args, project_workdir, log_folder)
+    try:
+        engine.run()
+    finally:
+        engine.close()
+        engine.logger.close()
+    return engine
+
+async def arun_project(args, project_workdir: Path, log_folder: Path) -> AgentEngine:
+    """
+    Async variant of run_project(). Engine setup talks to docker, so it is done on a worker thread.
+    """
+    engine = await asyncio.to_thread(make_engine, args, project_workdir, log_folder)
+    try:
+        await engine.arun()
+    finally:
+        await asyncio.to_thread(engine.close)
+        engine.logger.close()
+    return engine
@@ -13,6 +13,15 @@ import socket
 import pathlib
 import time
 import signal
+import asyncio
+import atexit
+import threading
+import queue
+import gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def prRed(skk): print("\033[91m {}\033[00m" .format(skk))
 def prGreen(skk): print("\033[92m {}\033[00m" .format(skk))
@@ -27,76 +36,194 @@ class CompileException(Exception):
 class RunException(Exception):
     pass
 
+class OutputWriter:
+    """
+    Appends text to a file from a background thread, through a persistent handle.
+    write() only enqueues; the queue is bounded so a slow disk applies back-pressure.
+    If `compression` is 'gzip' or 'zstd', the file is rotated once it exceeds `rotate_bytes`,
+    and each full segment is compressed to <stem>.<n><suffix>.gz / .zst next to it.
+    """
+
+    FLUSH_INTERVAL = 1.0 # Seconds
+
+    def __init__(self, path, compression=None, rotate_bytes=16 * 1024**2, max_queue=4096):
+        if compression not in [None, 'gzip', 'zstd']:
+            raise ValueError(f"Unknown output compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd output compression requires the zstandard package")
+        self.path = Path(path)
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.segment = 0
+        self.file = open(self.path, 'w')
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        if self.file is None:
+            return
+        self.queue.put(text)
+
+    def drain(self):
+        last_flush = time.time()
+        while True:
+            try:
+                text = self.queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                text = ""
+            if text is None:
+                break
+            self.file.write(text)
+            if self.queue.empty() or time.time() - last_flush >= self.FLUSH_INTERVAL:
+                self.file.flush()
+                last_flush = time.time()
+                if self.compression and self.file.tell() >= self.rotate_bytes:
+                    self.rotate()
+        self.file.flush()
+
+    def rotate(self):
+        """
+        Compresses the current segment and starts a fresh output file.
+        """
+        self.file.close()
+        self.segment += 1
+        suffix = '.gz' if self.compression == 'gzip' else '.zst'
+        segment_path = self.path.with_name(f"{self.path.stem}.{self.segment}{self.path.suffix}{suffix}")
+        with open(self.path, 'rb') as src:
+            if self.compression == 'gzip':
+                with gzip.open(segment_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                with open(segment_path, 'wb') as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+        self.file = open(self.path, 'w')
+
+    def close(self):
+        if self.file is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        self.file = None
+        atexit.unregister(self.close)
+
 class Logger:
 
-    def __init__(self, output_dir, args, verbose=False):
+    FSYNC_INTERVAL = 5.0 # Seconds between fsyncs of events.jsonl
+
+    def __init__(self, output_dir, args, verbose=False, output_compression=None):
         self.output_dir = Path(output_dir)
         self.args = args
         self.verbose = verbose
         if not self.output_dir.exists():
             self.output_dir.mkdir(parents=True, exist_ok=True)
         self.output_file = Path(self.output_dir)/'output.txt'
-        if self.output_file.exists():
-            self.output_file.unlink()
-        self.output_file.touch()
+        self.output = OutputWriter(self.output_file, compression=output_compression)
         self.log_file = Path(self.output_dir, 'log.json')
         self.log = {'date': f"{datetime.datetime.now()}",
                     'args': vars(args),
                     'actions': [],
                     'results': []}
-        with open(self.log_file, 'w') as f:
-            f.write(json.dumps(self.log, indent=4))
         self.total_cost = 0.0
         self.total_time = 0.0
-    
-    def log_action(self, action):
-        if 'cost' in action:
-            self.total_cost += action['cost']
-        if 'elapsed_time' in action:
-            self.total_time += action['elapsed_time']
-        action['accumulated_cost'] = self.total_cost
-        action['accumulated_time'] = self.total_time
-        self.log['actions'].append(action)
+        # Tool threads and concurrent test generation candidates log through the same logger
+        self.lock = threading.Lock()
+        # Actions and results are appended to events.jsonl as they happen;
+        # log.json is only written out by dump_log(), at the latest when the logger is closed.
+        self.events_file = Path(self.output_dir, 'events.jsonl')
+        self.events = open(self.events_file, 'w', buffering=64 * 1024)
+        self.last_fsync = time.time()
+        self.closed = False
+        self.write_event('start', {'date': self.log['date'], 'args': self.log['args']})
+        atexit.register(self.close)
+
+    def write_event(self, kind, data, sync=False):
+        self.events.write(json.dumps({'kind': kind, 'data': data}) + "\n")
+        if sync or time.time() - self.last_fsync >= self.FSYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        """
+        Flushes buffered events and fsyncs events.jsonl.
+        """
+        self.events.flush()
+        os.fsync(self.events.fileno())
+        self.last_fsync = time.time()
+
+    def dump_log(self):
+        """
+        Writes the full log (args, actions, results) to log.json.
+        """
         with open(self.log_file, 'w') as f:
             f.write(json.dumps(self.log, indent=4))
-    
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.sync()
+        self.events.close()
+        self.dump_log()
+        self.output.close()
+        atexit.unregister(self.close)
+
+    def log_action(self, action):
+        with self.lock:
+            if 'cost' in action:
+                self.total_cost += action['cost']
+            if 'elapsed_time' in action:
+                self.total_time += action['elapsed_time']
+            action['accumulated_cost'] = self.total_cost
+            action['accumulated_time'] = self.total_time
+            self.log['actions'].append(action)
+            self.write_event('action', action)
+
     def log_result(self, result):
-        self.log['results'].append(result)
-        with open(self.log_file, 'w') as f:
-            f.write(json.dumps(self.log, indent=4))
+        with self.lock:
+            self.log['results'].append(result)
+            self.write_event('result', result, sync=True)
     
     def log_status(self, output):
         prCyan(output)
-        with open(self.output_file, 'a') as f:
-            f.write(f"{output}\n")
+        self.output.write(f"{output}\n")
     
     def log_failure(self, output):
         prRed(output)
-        with open(self.output_file, 'a') as f:
-            f.write(f"{output}\n")
+        self.output.write(f"{output}\n")
     
     def log_success(self, output):
         prGreen(output)
-        with open(self.output_file, 'a') as f:
-            f.write(f"{output}\n")
+        self.output.write(f"{output}\n")
     
     def log_output(self, output):
         if self.verbose:
             prLightGray(output)
-        with open(self.output_file, 'a') as f:
-            f.write(f"{output}\n")
+        self.output.write(f"{output}\n")
 
     def get_results(self):
         return self.log['results']
     
     def get_cost_and_time(self):
         return self.total_cost, self.total_time
+
+    def restore_totals(self, cost, elapsed_time):
+        """
+        Adds the cost and time spent by a previous, interrupted run (when resuming from a checkpoint),
+        so that the budget and timeout cover both runs.
+        """
+        with self.lock:
+            self.total_cost += cost
+            self.total_time += elapsed_time
+            self.write_event('resume', {'restored_cost': cost, 'restored_time': elapsed_time}, sync=True)
         
 
 class DummyLogger(Logger):
     def __init__(self):
         self.output_file = None
         self.log_file = None
+        self.closed = True
         self.log = {'date': f"{datetime.datetime.now()}",
                     'args': {},
                     'actions': [],
@@ -126,6 +253,15 @@ class DummyLogger(Logger):
     def get_cost_and_time(self):
         return 0.0, 0.0
 
+    def restore_totals(self, cost, elapsed_time):
+        pass
+
+    def dump_log(self):
+        pass
+
+    def close(self):
+        pass
+
 def truncate(text: str, max_length: int, start_line: int = 1) -> str:
     if len(text) > max_length:
         trunc_text = text[:max_length]
@@ -150,7 +286,11 @@ def is_hidden_directory(path):
             return True
     return False
 
-def run(command, timeout=120, logger=None):
+def run(command, timeout=120, logger=None, cwd=None):
+    """
+    Runs a shell command in `cwd` (the current directory if None) and returns its decoded stdout.
+    Raises RunException on a non-zero exit code or timeout.
+    """
     if logger:
         logger.log_status(f"Running command: {command}")
 
@@ -158,6 +298,7 @@ def run(command, timeout=120, logger=None):
         proc = subprocess.Popen(
             command,
             shell=True,
+            cwd=cwd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             preexec_fn=os.setsid  # Start new process group (Unix only)
@@ -1,6 +1,7 @@
 from .openai import OpenAIGen, OpenAIEmbed
 from .google import GoogleGen
 from .claude import ClaudeGen
+from .cache import ResponseCache, CachedGen, CACHE_MODES
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,7 +10,16 @@ class ModelException(Exception):
     pass
 
 
-def get_model_from_name(name, logger):
+def get_model_from_name(name, logger, cache=None):
+    """
+    Returns the model for the given name, wrapped in a CachedGen if a ResponseCache is given.
+    """
+    model = _get_model_from_name(name, logger)
+    if cache is not None and name != "embedding":
+        model = CachedGen(model, cache, logger)
+    return model
+
+def _get_model_from_name(name, logger):
 
     if name == "gpt4":
         return OpenAIGen(model="gpt-4-0125-preview", logger=logger)
@@ -35,5 +45,8 @@ __all__ = [
     "ClaudeGen",
     "OpenAIEmbed",
     "ModelException",
+    "ResponseCache",
+    "CachedGen",
+    "CACHE_MODES",
     "get_model_from_name",
 ]
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+CACHE_MODES = ['off', 'readwrite', 'read', 'record']
+
+class ResponseCache:
+    '''
+    Content-addressed on-disk store of model responses.
+    Each entry is a JSON file named by the sha256 of (model, messages, temperature, top_k).
+    File mtimes double as LRU timestamps: hits touch the file, and the oldest
+    entries are evicted once the directory grows beyond max_bytes.
+
+    mode: 'readwrite' - serve hits, store misses
+          'read'      - serve hits, never write (misses still call the model)
+          'record'    - always call the model and (over)write the entry
+    '''
+
+    def __init__(self, cache_dir, mode='readwrite', max_bytes=2 * 1024**3):
+        if mode not in CACHE_MODES or mode == 'off':
+            raise ValueError(f"Invalid cache mode {mode}. Supported modes are: {CACHE_MODES[1:]}")
+        self.cache_dir = Path(cache_dir).absolute()
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = sum(size for _, _, size in self.scan())
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, messages, temperature, top_k):
+        payload = json.dumps({'model': str(model),
+                              'messages': messages,
+                              'temperature': temperature,
+                              'top_k': top_k}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def scan(self):
+        '''
+        Returns (path, mtime, size) for every entry in the cache.
+        '''
+        entries = []
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError: # Evicted by another process
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def get(self, key):
+        if self.mode == 'record':
+            return None
+        path = self.path_for(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            os.utime(path) # Mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry['responses']
+
+    def put(self, key, responses):
+        if self.mode == 'read':
+            return
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({'responses': responses, 'date': f"{datetime.now()}"})
+        # Write to a temporary file and rename it, so that concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+        Removes least recently used entries until the cache is below 90% of max_bytes.
+        '''
+        entries = sorted(self.scan(), key=lambda entry: entry[1])
+        self.size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+class CachedGen:
+    '''
+    Wraps a model (ClaudeGen, OpenAIGen, GoogleGen) so that gen() is served from a ResponseCache.
+    '''
+
+    def __init__(self, model, cache, logger):
+        self.model = model
+        self.cache = cache
+        self.logger = logger
+
+    def __str__(self):
+        return str(self.model)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def lookup(self, messages, temperature, top_k):
+        start_time = time.time()
+        start_time_str = f"{datetime.now()}"
+        key = ResponseCache.make_key(self.model, messages, temperature, top_k)
+        responses = self.cache.get(key)
+        if responses is not None:
+            self.cache.hits += 1
+        else:
+            self.cache.misses += 1
+        self.logger.log_action({'type': 'llm_cache',
+                                'event': 'hit' if responses is not None else 'miss',
+                                'key': key,
+                                'cache_hits': self.cache.hits,
+                                'cache_misses': self.cache.misses,
+                                'start_time': start_time_str,
+                                'elapsed_time': time.time() - start_time})
+        return key, responses
+
+    def gen(self, messages, temperature=0, top_k=1, **kwargs):
+        key, responses = self.lookup(messages, temperature, top_k)
+        if responses is None:
+            responses = self.model.gen(messages, temperature=temperature, top_k=top_k, **kwargs)
+            self.cache.put(key, responses)
+        return responses
+
+    async def agen(self, messages, temperature=0, top_k=1, **kwargs):
+        key, responses = self.lookup(messages, temperature, top_k)
+        if responses is None:
+            if hasattr(self.model, 'agen'):
+                responses = await self.model.agen(messages, temperature=temperature, top_k=top_k, **kwargs)
+            else:
+                responses = await asyncio.to_thread(self.model.gen, messages, temperature=temperature, top_k=top_k, **kwargs)
+            self.cache.put(key, responses)
+        return responses
@@ -1,12 +1,15 @@
 import time
+import asyncio
 from datetime import datetime
 import os
 import requests
 import litellm
-from litellm import completion, completion_cost
+from litellm import completion, acompletion, completion_cost
 
 class ClaudeGen:
 
+    MAX_CACHE_BREAKPOINTS = 4 # Anthropic allows prompt caching for up to 4 message blocks only
+
     def __init__(self, model, logger):
 
         self.api_key=os.environ['ANTHROPIC_API_KEY']
@@ -34,18 +37,8 @@ class ClaudeGen:
         if top_k != 1 and temperature == 0:
             self.logger.log_failure("Top k sampling requires a non-zero temperature")
             raise ModelException("Top k sampling requires a non-zero temperature")
-        
-        if cache:
-            cached_messages = [{
-                    'role': message['role'],
-                    'content': [{
-                        'type': 'text',
-                        'text': message['content'],
-                        'cache_control': {'type': 'ephemeral'}
-                    }]
-                } for message in messages[:4]] + messages[4:]
-                 # Anthropic allows prompt caching for up to 4 message blocks only
-            messages = cached_messages
+
+        messages = self.prepare_messages(messages, cache)
 
         start_time = time.time()
         start_time_str = f"{datetime.now()}"
@@ -61,20 +54,96 @@ class ClaudeGen:
                     max_tokens=64000,
                 )
                 break
-            except (litellm.BadRequestError, litellm.AuthenticationError,
-                    litellm.NotFoundError, litellm.UnprocessableEntityError) as e:
-                self.loadr.log_failure(f"Error in litellm: {e}")
-                raise ModelException(f"Error in litellm: {e}")
-            except (litellm.Timeout, litellm.RateLimitError, litellm.InternalServerError, litellm.APIConnectionError):
-                retry_count += 1
-                if retry_count > 5:
-                    self.logger.log_failure("Max retries exceeded for Claude API")
-                    raise ModelException("Max retries exceeded for Claude API")
+            except Exception as e:
+                retry_count = self.handle_error(e, retry_count)
                 time.sleep(2 ** retry_count)
+
+        return self.process_response(response, start_time, start_time_str)
+
+    async def agen(self, messages, temperature=0, top_k=1, cache=False):
+        '''
+        Async variant of gen(), using litellm.acompletion.
+        Retries back off with asyncio.sleep, so other coroutines keep running while this one waits.
+        '''
+
+        from .. import ModelException
+
+        if top_k != 1 and temperature == 0:
+            self.logger.log_failure("Top k sampling requires a non-zero temperature")
+            raise ModelException("Top k sampling requires a non-zero temperature")
+
+        messages = self.prepare_messages(messages, cache)
+
+        start_time = time.time()
+        start_time_str = f"{datetime.now()}"
+        retry_count = 0
+        while True:
+            try:
+                response = await acompletion(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    top_k=top_k,
+                    api_key=self.api_key,
+                    max_tokens=64000,
+                )
+                break
             except Exception as e:
-                self.logger.log_failure(f"Unexpected error: {e}")
-                raise ModelException(f"Unexpected error: {e}")
+                retry_count = self.handle_error(e, retry_count)
+                await asyncio.sleep(2 ** retry_count)
+
+        return self.process_response(response, start_time, start_time_str)
+
+    def cache_breakpoints(self, messages):
+        """
+        Picks the messages that carry a cache breakpoint: the system prompt, the task prompt,
+        and the last two user turns. The breakpoint on the latest turn writes the cache entry
+        that the next call reads through the breakpoint on the turn before it, so the cached
+        prefix moves forward as the conversation grows.
+        """
+        breakpoints = [i for i in range(min(2, len(messages)))]
+        user_turns = [i for i, message in enumerate(messages) if message['role'] == 'user']
+        for i in user_turns[-2:]:
+            if i not in breakpoints:
+                breakpoints.append(i)
+        return breakpoints[-self.MAX_CACHE_BREAKPOINTS:]
 
+    def prepare_messages(self, messages, cache):
+        if cache:
+            breakpoints = self.cache_breakpoints(messages)
+            messages = [{
+                    'role': message['role'],
+                    'content': [{
+                        'type': 'text',
+                        'text': message['content'],
+                        'cache_control': {'type': 'ephemeral'}
+                    }]
+                } if i in breakpoints else message for i, message in enumerate(messages)]
+        return messages
+
+    def handle_error(self, e, retry_count):
+        '''
+        Raises ModelException for non-retryable errors, or once retries are exhausted.
+        Returns the updated retry count otherwise.
+        '''
+
+        from .. import ModelException
+
+        if isinstance(e, (litellm.BadRequestError, litellm.AuthenticationError,
+                          litellm.NotFoundError, litellm.UnprocessableEntityError)):
+            self.logger.log_failure(f"Error in litellm: {e}")
+            raise ModelException(f"Error in litellm: {e}")
+        elif isinstance(e, (litellm.Timeout, litellm.RateLimitError, litellm.InternalServerError, litellm.APIConnectionError)):
+            retry_count += 1
+            if retry_count > 5:
+                self.logger.log_failure("Max retries exceeded for Claude API")
+                raise ModelException("Max retries exceeded for Claude API")
+            return retry_count
+        else:
+            self.logger.log_failure(f"Unexpected error: {e}")
+            raise ModelException(f"Unexpected error: {e}")
+
+    def process_response(self, response, start_time, start_time_str):
         elapsed_time = time.time() - start_time
         if 'prompt_tokens_details' in response['usage']:
             cached_tokens = response['usage']['prompt_tokens_details'].cached_tokens
@@ -82,14 +151,16 @@ class ClaudeGen:
             cached_tokens = 0
 
         cost = completion_cost(completion_response=response, model=self.model)
+        input_tokens = response['usage']['prompt_tokens']
+        cache_hit_ratio = (cached_tokens or 0) / input_tokens if input_tokens else 0.0
 
         self.logger.log_action({'type': 'llm_call',
-                                'input_tokens': response['usage']['prompt_tokens'],
+                                'input_tokens': input_tokens,
                                 'cached_tokens': cached_tokens,
+                                'cache_hit_ratio': cache_hit_ratio,
                                 'output_tokens': response['usage']['completion_tokens'],
                                 'cost': cost,
                                 'start_time': start_time_str,
                                 'elapsed_time': elapsed_time})
 
         return [response['choices'][i]['message']['content'] for i in range(len(response['choices']))]
-
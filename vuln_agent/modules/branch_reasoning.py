@@ -13,7 +13,7 @@ class BranchReasoning:
         self.max_turns = max_turns
         self.conversation = init_conversation
 
-        self.tools = [tool_class(self.logger) for tool_class in [ListDir, Read, Grep, Find]]
+        self.tools = [tool_class(self.logger, self.workdir) for tool_class in [ListDir, Read, Grep, Find, Callers, Callees, Definition, PathsTo]]
         self.tool_manager = Tooling(self.logger)
         for tool in self.tools:
             self.tool_manager.register_tool(tool)
@@ -56,16 +56,15 @@ class BranchReasoning:
         else:
             raise ValueError(f"Unsupported dataset {self.dataset}. Supported datasets are: ['cwe-bench-java', 'primevul']")
     
-    def run(self, flow):
+    def build_prompt(self, flow):
         """
-        Run the branch reasoning module.
+        Retrieves the issue details and constructs the branch reasoning prompt.
+        Returns None if the issue details are unavailable.
         """
-        self.logger.log_status("Running branch reasoning module...")
-
         cwe_ids, issue_desc, issue_summary = self.get_issue_details()
         if not issue_desc:
             self.logger.log_failure("Failed to retrieve issue details.")
-            return None, None
+            return
 
         # Construct the prompt
         prompt = construct_issue_desc_prompt(issue_desc, issue_summary, diff=None)
@@ -85,39 +84,10 @@ class BranchReasoning:
             ' You can use multiple intermediate steps and tool invocations, but when you are finished,'
             ' your final response should contain the sequence in the above format, within the tags <SEQUENCE> and </SEQUENCE>.\n'
         )
-        prompt += construct_tool_prompt(self.tools)
-
-        # self.conversation.add_message("system", "You are an intelligent code assistant.")
-        self.conversation.add_message("user", prompt)
-        self.logger.log_output(prompt)
-
-        for turn in range(self.max_turns):
-            response = self.conversation.generate()
-            self.logger.log_output(response)
-            if self.tool_manager.has_tool_invocation(response):
-                self.logger.log_status("Tool invocation detected.")
-                tool_output = self.tool_manager.invoke_tool(response)
-                self.logger.log_output(tool_output)
-                if tool_output['status'] == "Success":
-                    self.conversation.add_message("user", tool_output['output'])
-                    self.logger.log_status(tool_output['output'])
-                else:
-                    self.conversation.add_message("user", f"Tool invocation failed: {tool_output['output']}")
-                    self.logger.log_status(f"Tool invocation failed: {tool_output['output']}")
-            else:
-                break
-
-        if self.conversation.messages[-1]['role'] != "assistant":
-            self.logger.log_failure("Branch reasoning failed to produce a valid response.")
-            return None, None
-
-        branch_response = self.conversation.messages[-1]['content']
-        if "<SEQUENCE>" not in branch_response or "</SEQUENCE>" not in branch_response:
-            self.logger.log_failure("Branch reasoning failed to produce a valid branch response.")
-            return None, None
-        branch_response = branch_response.split("<SEQUENCE>")[1].split("</SEQUENCE>")[0]
-        branch_response = branch_response.strip()
+        prompt += construct_tool_prompt(self.tools, self.workdir)
+        return prompt
 
+    def build_conditions_prompt(self):
         prompt  = ("Based on the above branch conditions that you generated, infer a set of conditions"
                    " that the external input must satisfy in order to reach the vulnerability.\n"
                    "Your final answer should be in the following format:\n"
@@ -126,36 +96,88 @@ class BranchReasoning:
                    "2. Condition 2\n"
                    "...\n"
                    "</CONDITIONS>\n")
+        return prompt
 
-        self.conversation.add_message("user", prompt)
-        self.logger.log_output(prompt)
+    def tool_feedback(self, tool_output):
+        """
+        Logs the tool output and returns the messages to send back to the model.
+        """
+        self.logger.log_output(tool_output)
+        if tool_output['status'] == "Success":
+            message = tool_output['output']
+        else:
+            message = f"Tool invocation failed: {tool_output['output']}"
+        self.logger.log_status(message)
+        return [message]
+
+    async def atool_loop(self):
         for turn in range(self.max_turns):
-            response = self.conversation.generate()
+            response = await self.conversation.agenerate()
             self.logger.log_output(response)
             if self.tool_manager.has_tool_invocation(response):
                 self.logger.log_status("Tool invocation detected.")
-                tool_output = self.tool_manager.invoke_tool(response)
-                self.logger.log_output(tool_output)
-                if tool_output['status'] == "Success":
-                    self.conversation.add_message("user", tool_output['output'])
-                    self.logger.log_status(tool_output['output'])
-                else:
-                    self.conversation.add_message("user", f"Tool invocation failed: {tool_output['output']}")
-                    self.logger.log_status(f"Tool invocation failed: {tool_output['output']}")
+                tool_output = await self.tool_manager.ainvoke_tool(response)
+                for message in self.tool_feedback(tool_output):
+                    await self.conversation.aadd_message("user", message)
             else:
                 break
 
+    def extract_sequence(self):
+        if self.conversation.messages[-1]['role'] != "assistant":
+            self.logger.log_failure("Branch reasoning failed to produce a valid response.")
+            return
+
+        branch_response = self.conversation.messages[-1]['content']
+        if "<SEQUENCE>" not in branch_response or "</SEQUENCE>" not in branch_response:
+            self.logger.log_failure("Branch reasoning failed to produce a valid branch response.")
+            return
+        branch_response = branch_response.split("<SEQUENCE>")[1].split("</SEQUENCE>")[0]
+        return branch_response.strip()
+
+    def extract_conditions(self):
         if self.conversation.messages[-1]['role'] != "assistant":
             self.logger.log_failure("Branch reasoning failed to produce valid conditions.")
-            return None, None
+            return
 
         conditions = self.conversation.messages[-1]['content']
         if "<CONDITIONS>" not in conditions or "</CONDITIONS>" not in conditions:
             self.logger.log_failure("Branch reasoning failed to produce valid conditions.")
-            return None, None
+            return
         conditions = conditions.split("<CONDITIONS>")[1].split("</CONDITIONS>")[0]
-        conditions = conditions.strip()
+        return conditions.strip()
+
+    async def arun(self, flow):
+        """
+        Run the branch reasoning module. Model calls and tool invocations are awaited.
+        """
+        self.logger.log_status("Running branch reasoning module...")
+
+        prompt = self.build_prompt(flow)
+        if not prompt:
+            return None, None
+
+        await self.conversation.aadd_message("user", prompt)
+        self.logger.log_output(prompt)
+        await self.atool_loop()
+
+        branch_response = self.extract_sequence()
+        if not branch_response:
+            return None, None
+
+        prompt = self.build_conditions_prompt()
+        await self.conversation.aadd_message("user", prompt)
+        self.logger.log_output(prompt)
+        await self.atool_loop()
+
+        conditions = self.extract_conditions()
+        if not conditions:
+            return None, None
 
         self.logger.log_success("Branch reasoning module completed.")
         return branch_response, conditions
 
+    def run(self, flow):
+        """
+        Synchronous entry point: runs arun() on a new event loop.
+        """
+        return asyncio.run(self.arun(flow))
@@ -2,9 +2,11 @@ from vuln_agent.prompts import *
 from vuln_agent.tools import *
 from vuln_agent.helpers import *
 from vuln_agent.conversation import *
+from vuln_agent.tools.callgraph import get_callgraph
+import ast
 
 class FlowReasoning:
-    def __init__(self, model, dataset, project_name, workdir, logger, init_conversation, use_patch=False, max_turns=50):
+    def __init__(self, model, dataset, project_name, workdir, logger, init_conversation, use_patch=False, max_turns=50, seed_paths=False):
         self.model = model
         self.dataset = dataset
         self.project_name = project_name
@@ -13,8 +15,9 @@ class FlowReasoning:
         self.max_turns = max_turns
         self.conversation = init_conversation
         self.use_patch = use_patch
+        self.seed_paths = seed_paths
 
-        self.tools = [tool_class(self.logger) for tool_class in [ListDir, Read, Grep, Find]]
+        self.tools = [tool_class(self.logger, self.workdir) for tool_class in [ListDir, Read, Grep, Find, Callers, Callees, Definition, PathsTo]]
         self.tool_manager = Tooling(self.logger)
         for tool in self.tools:
             self.tool_manager.register_tool(tool)
@@ -69,12 +72,45 @@ class FlowReasoning:
             return None
         return diff_data
     
-    def run(self):
+    def get_vulnerable_methods(self):
         """
-        Run the flow reasoning module.
+        Returns the methods changed by the fix: Class.method from .method_info.csv for cwe-bench-java,
+        the `vulnerable_funcs` names for PrimeVul.
         """
-        self.logger.log_status("Running flow reasoning module...")
+        if self.dataset == 'cwe-bench-java':
+            method_info_path = Path(self.workdir) / f"../../../data/processed/{self.project_name}/.method_info.csv"
+            if not method_info_path.exists():
+                self.logger.log_failure(f"Method info file {method_info_path} does not exist.")
+                return []
+            lines = method_info_path.read_text().strip().splitlines()
+            return [line.strip().replace(',', '.') for line in lines if line.strip()]
+        info_path = Path(self.workdir) / "../../../processed_info.json"
+        if not info_path.exists():
+            return []
+        with open(info_path, 'r') as f:
+            project_info = json.load(f).get(self.project_name, {})
+        funcs = project_info.get('vulnerable_funcs', [])
+        if isinstance(funcs, str):
+            funcs = ast.literal_eval(funcs)
+        return [func['name'] for func in funcs]
+
+    def get_call_paths(self):
+        """
+        Returns the call paths to the vulnerable methods from the static call graph, formatted for the prompt.
+        """
+        graph = get_callgraph(self.workdir)
+        output = ""
+        for method in self.get_vulnerable_methods():
+            for node in graph.lookup(method):
+                for path in graph.paths_to(node, max_paths=3):
+                    output += f"{graph.format_path(path)}\n\n"
+        return output
 
+    def build_prompt(self):
+        """
+        Retrieves the issue details and constructs the flow reasoning prompt.
+        Returns None if the issue details or diff are unavailable.
+        """
         cwe_ids, issue_desc, issue_summary = self.get_issue_details()
         if not issue_desc:
             self.logger.log_failure("Failed to retrieve issue details.")
@@ -90,7 +126,13 @@ class FlowReasoning:
 
         # Construct the prompt
         prompt = construct_issue_desc_prompt(issue_desc, issue_summary, diff)
-        prompt += construct_tool_prompt(self.tools)
+        if self.seed_paths:
+            call_paths = self.get_call_paths()
+            if call_paths:
+                prompt += construct_call_paths_prompt(call_paths)
+            else:
+                self.logger.log_status("No call paths to the vulnerable methods found.")
+        prompt += construct_tool_prompt(self.tools, self.workdir)
         prompt += (
             "Could you generate a sequence of program points to reach the vulnerable point (sink), "
             "starting from an external input (source)? This corresponds to a vulnerable “flow” through the program."
@@ -103,27 +145,21 @@ class FlowReasoning:
             ' You can use multiple intermediate steps and tool invocations, but when you are finished,'
             ' your final response should contain the flow in the above format, within the tags <FLOW> and </FLOW>.\n'
         )
+        return prompt
 
-        self.conversation.add_message("user", prompt)
-
-        self.logger.log_output(prompt)
+    def tool_feedback(self, tool_output):
+        """
+        Logs the tool output and returns the messages to send back to the model.
+        """
+        self.logger.log_output(tool_output)
+        if tool_output['status'] == "Success":
+            message = tool_output['output']
+        else:
+            message = f"Tool invocation failed: {tool_output['output']}"
+        self.logger.log_status(message)
+        return [message]
 
-        for turn in range(self.max_turns):
-            response = self.conversation.generate()
-            self.logger.log_output(response)
-            if self.tool_manager.has_tool_invocation(response):
-                self.logger.log_status("Tool invocation detected.")
-                tool_output = self.tool_manager.invoke_tool(response)
-                self.logger.log_output(tool_output)
-                if tool_output['status'] == "Success":
-                    self.conversation.add_message("user", tool_output['output'])
-                    self.logger.log_status(tool_output['output'])
-                else:
-                    self.conversation.add_message("user", f"Tool invocation failed: {tool_output['output']}")
-                    self.logger.log_status(f"Tool invocation failed: {tool_output['output']}")
-            else:
-                break
-        
+    def extract_flow(self):
         if self.conversation.messages[-1]['role'] != "assistant":
             self.logger.log_failure("Flow reasoning failed to produce a valid response.")
             return
@@ -137,3 +173,35 @@ class FlowReasoning:
         self.logger.log_success("Flow reasoning module completed.")
         return flow_response
 
+    async def arun(self):
+        """
+        Run the flow reasoning module. Model calls and tool invocations are awaited.
+        """
+        self.logger.log_status("Running flow reasoning module...")
+
+        prompt = self.build_prompt()
+        if not prompt:
+            return
+
+        await self.conversation.aadd_message("user", prompt)
+
+        self.logger.log_output(prompt)
+
+        for turn in range(self.max_turns):
+            response = await self.conversation.agenerate()
+            self.logger.log_output(response)
+            if self.tool_manager.has_tool_invocation(response):
+                self.logger.log_status("Tool invocation detected.")
+                tool_output = await self.tool_manager.ainvoke_tool(response)
+                for message in self.tool_feedback(tool_output):
+                    await self.conversation.aadd_message("user", message)
+            else:
+                break
+
+        return self.extract_flow()
+
+    def run(self):
+        """
+        Synchronous entry point: runs arun() on a new event loop.
+        """
+        return asyncio.run(self.arun())
@@ -1,19 +1,28 @@
 from vuln_agent.prompts import *
 from vuln_agent.tools import *
 from vuln_agent.helpers import *
+from vuln_agent.tools.trigram_index import refresh_index
+from vuln_agent.tools.tree_snapshot import invalidate_snapshot
+from vuln_agent.tools.callgraph import refresh_callgraph
 from vuln_agent.conversation import Conversation
+from vuln_agent.build import get_warm_container, WarmBuildUnsupported, build_image
 
 class Run(Tool):
 
-    def __init__(self, dataset, project_name, workdir, logger):
+    def __init__(self, dataset, project_name, workdir, logger, warm_build=False, image_tag=None, container=None):
         """
         Initializes the Run tool.
-        This tool builds and runs the docker image for the project.
+        This tool builds and runs the docker image for the project, tagged `image_tag` (<project>_vuln by default),
+        in a container named `container` if given.
+        With warm_build, the test is built and run in a long-lived container instead (see vuln_agent/build/warm.py).
         """
         self.dataset = dataset
         self.project_name = project_name
         self.workdir = workdir
         self.logger = logger
+        self.warm_build = warm_build
+        self.image_tag = image_tag or f"{project_name.lower()}_vuln"
+        self.container = container
 
     def get_name(self):
         return "run"
@@ -41,23 +50,36 @@ Lastly, remember that your test should actually run the vulnerable code in the p
 - It should NOT read the source code to check for the presence of a vulnerability.
 - It should NOT \"simulate\" the vulnerability by running some separate code that does not use the project.
 """
-        os.chdir(self.workdir)
-        context_root = "../.." if self.dataset == 'cwe-bench-java' else "."
         # Check if there are other keys in the param_dict
         for key in param_dict.keys():
             if key not in ["name"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        if self.warm_build:
+            try:
+                warm_container = get_warm_container(self.dataset, self.project_name, self.workdir, self.logger)
+                run_script = warm_container.build()
+            except WarmBuildUnsupported as e:
+                self.logger.log_status(f"{e}, falling back to a full docker build.")
+            except RunException as e:
+                return {"status": "Success", "output": f"Build failed: {truncate_reverse(str(e), 10000)}\n{CAUTION_MSG}"}
+            else:
+                self.logger.log_status("Warm container updated successfully.")
+                try:
+                    stdout = warm_container.run_test(run_script)
+                    return {"status": "Success", "output": f"Run succeeded. STDOUT:\n{truncate_reverse(stdout, 10000)}\n{CAUTION_MSG}"}
+                except RunException as e:
+                    return {"status": "Success", "output": f"Run exited with non-zero code.\n{truncate_reverse(str(e), 10000)}\n{CAUTION_MSG}"}
         try:
-            run(f"docker build -f ./Dockerfile.vuln -t {self.project_name.lower()}_vuln {context_root}",
-                timeout=300,
-                logger=self.logger)
+            build_image(self.dataset, self.workdir, self.image_tag,
+                logger=self.logger, timeout=300, project=self.project_name)
         except RunException as e:
             return {"status": "Success", "output": f"Build failed: {truncate_reverse(str(e), 10000)}\n{CAUTION_MSG}"}
         self.logger.log_status("Docker image built successfully.")
         try:
-            stdout = run(f"docker run --rm {self.project_name.lower()}_vuln",
+            stdout = run(f"docker run --rm {f'--name {self.container} ' if self.container else ''}{self.image_tag}",
                 timeout=200,
-                logger=self.logger)
+                logger=self.logger,
+                cwd=self.workdir)
             return {"status": "Success", "output": f"Run succeeded. STDOUT:\n{truncate_reverse(stdout, 10000)}\n{CAUTION_MSG}"}
         except RunException as e:
             return {"status": "Success", "output": f"Run exited with non-zero code.\n{truncate_reverse(str(e), 10000)}\n{CAUTION_MSG}"}
@@ -95,10 +117,10 @@ class Reset(Tool):
             if key not in ["name"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
 
-        os.chdir(self.workdir)
         try:
-            run("git stash", logger=self.logger)
-            result = run("git ls-files --others --exclude-standard", logger=self.logger)
+            # Discard the changes rather than stashing them: a worktree shares refs/stash with its source repository
+            run("git checkout -- .", logger=self.logger, cwd=self.workdir)
+            result = run("git ls-files --others --exclude-standard", logger=self.logger, cwd=self.workdir)
             created_files = result.strip().splitlines()
             created_files = [f for f in created_files if f.strip() not in files_to_preserve]
         except RunException as e:
@@ -113,12 +135,16 @@ class Reset(Tool):
             if (self.workdir / "Dockerfile.vuln").exists():
                 Path(self.workdir / "Dockerfile.vuln").unlink()
             shutil.copy(dockerfile_backup, self.workdir / "Dockerfile.vuln")
-            
+
+        refresh_index(self.workdir)
+        invalidate_snapshot(self.workdir)
+        refresh_callgraph(self.workdir)
         return {"status": "Success", "output": "Working directory reset successfully."}
 
 
 class TestGen:
-    def __init__(self, model, dataset, project_name, workdir, logger, init_conversation, flow, conditions, max_turns=50):
+    def __init__(self, model, dataset, project_name, workdir, logger, init_conversation, flow, conditions, max_turns=50, warm_build=False, image_tag=None,
+                 container=None, executor=None):
         self.model = model
         self.dataset = dataset
         self.project_name = project_name
@@ -129,9 +155,10 @@ class TestGen:
         self.flow = flow
         self.conditions = conditions
 
-        self.tools = [tool_class(self.logger) for tool_class in [ListDir, Read, Grep, Find, Write, Mkdir]]
-        self.tools += [Run(dataset, project_name, workdir, logger), Reset(workdir, logger)]
-        self.tool_manager = Tooling(self.logger)
+        self.tools = [tool_class(self.logger, self.workdir) for tool_class in [ListDir, Read, Grep, Find, Write, Mkdir]]
+        self.tools += [Run(dataset, project_name, workdir, logger, warm_build=warm_build, image_tag=image_tag, container=container),
+                       Reset(workdir, logger)]
+        self.tool_manager = Tooling(self.logger, executor=executor)
         for tool in self.tools:
             self.tool_manager.register_tool(tool)
 
@@ -173,12 +200,10 @@ class TestGen:
         else:
             raise ValueError(f"Unsupported dataset {self.dataset}. Supported datasets are: ['cwe-bench-java', 'primevul']")
     
-    def run(self):
+    def build_prompt(self):
         """
-        Run the test generation module.
+        Constructs the test generation prompt. Returns None if the issue details are unavailable.
         """
-        self.logger.log_status("Running test generation module...")
-
         cwe_ids, issue_desc, issue_summary = self.get_issue_details()
         if not issue_desc:
             self.logger.log_failure("Failed to retrieve issue details.")
@@ -235,39 +260,63 @@ to ensure that the test FAILS if the vulnerability exists, and PASSES if it does
 To re-emphasize, this test should NOT be based on reading the source code, but rather on the actual behavior of the program when it is run.
 If I fix the vulnerability in the project, the test should PASS.
 """
-        prompt += construct_tool_prompt(self.tools)
+        prompt += construct_tool_prompt(self.tools, self.workdir)
         prompt += ("If you successfully generate the test case and confirm that it satisfies all the above conditions, "
                    "respond <DONE>.")
 
-        # self.conversation.add_message("system", "You are an intelligent code assistant.")
-        self.conversation.add_message("user", prompt)
-        self.logger.log_output(prompt)
+        return prompt
 
+    def build_repair_prompt(self, feedback):
+        prompt = (
+            "The test you generated had the following error:\n"
+            f"{feedback}\n"
+            "Please fix the test case. Carefully analyze this output for errors or messages that can help you debug your test. "
+            "Reason step-by-step about what might have gone wrong, and how you can fix it.\n"
+            "You can use the <TOOL>...</TOOL> format to invoke tools, and you can also add new files.\n"
+            "When you have generated, run and checked your test again, respond with a message containing the string \"<DONE>\".\n"
+            "Remember that the test should actually run the vulnerable code in the project, "
+            "- It should NOT read the source code to check for the presence of a vulnerability.\n"
+            "- It should NOT \"simulate\" the vulnerability by running some separate code that does not use the project.\n"
+        )
+        return prompt
+
+    def tool_feedback(self, tool_output):
+        """
+        Logs the tool output and returns the messages to send back to the model.
+        """
+        self.logger.log_output(tool_output)
+        if tool_output['status'] == "Success":
+            messages = [tool_output['output']]
+            if "File written successfully" in tool_output['output']:
+                messages.append("If you have finished generating your test, use the Run tool to check it.")
+        else:
+            messages = [f"Tool invocation failed: {tool_output['output']}"]
+        for message in messages:
+            self.logger.log_status(message)
+        return messages
+
+    def continue_message(self):
+        return ("Your output doesn't contain a <TOOL>...</TOOL> invocation."
+                " If you have generated, run and checked your test, respond <DONE>.")
+
+    async def atool_loop(self, done_message):
         for turn in range(self.max_turns):
-            response = self.conversation.generate()
+            response = await self.conversation.agenerate()
             self.logger.log_output(response)
             if self.tool_manager.has_tool_invocation(response):
                 self.logger.log_status("Tool invocation detected.")
-                tool_output = self.tool_manager.invoke_tool(response)
-                self.logger.log_output(tool_output)
-                if tool_output['status'] == "Success":
-                    self.conversation.add_message("user", tool_output['output'])
-                    self.logger.log_status(tool_output['output'])
-                    if "File written successfully" in tool_output['output']:
-                        self.conversation.add_message("user", "If you have finished generating your test, use the Run tool to check it.")
-                        self.logger.log_status("If you have finished generating your test, use the Run tool to check it.")
-                else:
-                    self.conversation.add_message("user", f"Tool invocation failed: {tool_output['output']}")
-                    self.logger.log_status(f"Tool invocation failed: {tool_output['output']}")
+                tool_output = await self.tool_manager.ainvoke_tool(response)
+                for message in self.tool_feedback(tool_output):
+                    await self.conversation.aadd_message("user", message)
             elif "<DONE>" in response:
-                self.logger.log_status("Test generation completed.")
+                self.logger.log_status(done_message)
                 break
             else:
-                continue_message = ("Your output doesn't contain a <TOOL>...</TOOL> invocation."
-                                    " If you have generated, run and checked your test, respond <DONE>.")
-                self.conversation.add_message("user", continue_message)
+                continue_message = self.continue_message()
+                await self.conversation.aadd_message("user", continue_message)
                 self.logger.log_status(continue_message)
 
+    def extract_result(self):
         if self.conversation.messages[-1]['role'] != "assistant":
             self.logger.log_failure("Test generation failed to produce a valid response.")
             return "Failure"
@@ -279,57 +328,49 @@ If I fix the vulnerability in the project, the test should PASS.
             self.logger.log_failure("Test generation failed to produce a valid test case.")
             return "Failure"
 
+    def finish_repair(self):
+        if self.conversation.messages[-1]['role'] != "assistant":
+            self.logger.log_failure("Repair failed to produce a valid response.")
+            return
+        self.logger.log_success("Repair completed.")
+
+    async def arun(self):
+        """
+        Run the test generation module. Model calls and tool invocations are awaited.
+        """
+        self.logger.log_status("Running test generation module...")
 
-    def repair(self, feedback):
+        prompt = self.build_prompt()
+        if not prompt:
+            return
+
+        await self.conversation.aadd_message("user", prompt)
+        self.logger.log_output(prompt)
+        await self.atool_loop("Test generation completed.")
+        return self.extract_result()
+
+    async def arepair(self, feedback):
         """
         Repair the test case based on feedback.
         """
         if len(self.conversation.messages) == 0:
             self.logger.log_failure("No conversation history to repair.")
             return
-        
-        prompt = (
-            "The test you generated had the following error:\n"
-            f"{feedback}\n"
-            "Please fix the test case. Carefully analyze this output for errors or messages that can help you debug your test. "
-            "Reason step-by-step about what might have gone wrong, and how you can fix it.\n"
-            "You can use the <TOOL>...</TOOL> format to invoke tools, and you can also add new files.\n"
-            "When you have generated, run and checked your test again, respond with a message containing the string \"<DONE>\".\n"
-            "Remember that the test should actually run the vulnerable code in the project, "
-            "- It should NOT read the source code to check for the presence of a vulnerability.\n"
-            "- It should NOT \"simulate\" the vulnerability by running some separate code that does not use the project.\n"
-        )
 
-        self.conversation.add_message("user", prompt)
+        prompt = self.build_repair_prompt(feedback)
+        await self.conversation.aadd_message("user", prompt)
         self.logger.log_output(prompt)
+        await self.atool_loop("Repair completed.")
+        self.finish_repair()
 
-        for turn in range(self.max_turns):
-            response = self.conversation.generate()
-            self.logger.log_output(response)
-            if self.tool_manager.has_tool_invocation(response):
-                self.logger.log_status("Tool invocation detected.")
-                tool_output = self.tool_manager.invoke_tool(response)
-                self.logger.log_output(tool_output)
-                if tool_output['status'] == "Success":
-                    self.conversation.add_message("user", tool_output['output'])
-                    self.logger.log_status(tool_output['output'])
-                    if "File written successfully" in tool_output['output']:
-                        self.conversation.add_message("user", "If you have finished generating your test, use the Run tool to check it.")
-                        self.logger.log_status("If you have finished generating your test, use the Run tool to check it.")
-                else:
-                    self.conversation.add_message("user", f"Tool invocation failed: {tool_output['output']}")
-                    self.logger.log_status(f"Tool invocation failed: {tool_output['output']}")
-            elif "<DONE>" in response:
-                self.logger.log_status("Repair completed.")
-                break
-            else:
-                continue_message = ("Your output doesn't contain a <TOOL>...</TOOL> invocation."
-                                    " If you have generated, run and checked your test, respond <DONE>.")
-                self.conversation.add_message("user", continue_message)
-                self.logger.log_status(continue_message)
+    def run(self):
+        """
+        Synchronous entry point: runs arun() on a new event loop.
+        """
+        return asyncio.run(self.arun())
 
-        if self.conversation.messages[-1]['role'] != "assistant":
-            self.logger.log_failure("Repair failed to produce a valid response.")
-            return
-        self.logger.log_success("Repair completed.")
-        return
\ No newline at end of file
+    def repair(self, feedback):
+        """
+        Synchronous entry point: runs arepair() on a new event loop.
+        """
+        return asyncio.run(self.arepair(feedback))
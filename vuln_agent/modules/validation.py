@@ -1,11 +1,17 @@
 from vuln_agent.helpers import *
+from vuln_agent.build import build_image
+from vuln_agent.tools.trigram_index import refresh_index
+from vuln_agent.tools.tree_snapshot import invalidate_snapshot
+from vuln_agent.tools.callgraph import refresh_callgraph
 
 class Validation:
-    def __init__(self, dataset, project_name, workdir, logger):
+    def __init__(self, dataset, project_name, workdir, logger, image_tag=None, container=None):
         self.dataset = dataset
         self.project_name = project_name
         self.workdir = workdir
         self.logger = logger
+        self.image_tag = image_tag or f"{project_name.lower()}_vuln"
+        self.container = container
 
     def get_commit_info(self):
         if self.dataset == 'cwe-bench-java':
@@ -43,30 +49,29 @@ class Validation:
         if not commit_info:
             return {"status": "Failed", "error": "No commit info found."}
 
-        context_root = "../.." if self.dataset == 'cwe-bench-java' else "."
-
-        os.chdir(self.workdir)
         try:
             run(f"git checkout {commit_info['vulnerable_commit']}",
-                timeout=200, logger=self.logger)
+                timeout=200, logger=self.logger, cwd=self.workdir)
         except RunException as e:
             self.logger.log_failure(f"Checkout failed: {truncate_reverse(str(e), 10000)}")
             return {"status": "Failed", "error": f"Checkout failed: {truncate_reverse(str(e), 10000)}"}
+        refresh_index(self.workdir)
+        invalidate_snapshot(self.workdir)
+        refresh_callgraph(self.workdir)
 
         try:
-            run(f"docker build -f ./Dockerfile.vuln -t {self.project_name.lower()}_vuln {context_root}",
-                timeout=600,
-                logger=self.logger)
+            build_image(self.dataset, self.workdir, self.image_tag,
+                logger=self.logger, timeout=600, project=self.project_name)
         except RunException as e:
             self.logger.log_failure(f"Build failed: {truncate_reverse(str(e), 10000)}")
             return {"status": "Incorrect", "error": f"Build failed: {truncate_reverse(str(e), 10000)}"}
 
-        os.chdir(self.workdir)
         failed = False
         try:
-            stdout = run(f"docker run --rm {self.project_name.lower()}_vuln",
+            stdout = run(f"docker run --rm {f'--name {self.container} ' if self.container else ''}{self.image_tag}",
                 timeout=200,
-                logger=self.logger)
+                logger=self.logger,
+                cwd=self.workdir)
         except RunException as e:
             self.logger.log_success(f"Test failed in vulnerable state")
             failed = True
@@ -6,6 +6,8 @@ from pathlib import Path
 This file constructs the prompts used by the agent
 """
 
+PROMPT_VERSION = 1 # Bump when a prompt changes, so that stored stage artifacts are not reused
+
 SYS_PROMPT = """You are a helpful AI assistant that can interact with a computer to solve tasks.
 
 <ROLE>
@@ -42,11 +44,12 @@ Your code will never be read by humans, so focus on correctness, not style.
 </TROUBLESHOOTING>
 """
 
-def construct_tool_prompt(tools: List[Tool]) -> str:
+def construct_tool_prompt(tools: List[Tool], workdir: str = None) -> str:
     """
     Constructs the tool prompt for the agent.
     Args:
         tools (List[Tool]): List of tools to be used by the agent.
+        workdir (str): Directory the agent works in. Defaults to the current directory.
     Returns:
         str: Formatted string containing the tool prompt.
     """
@@ -56,8 +59,10 @@ def construct_tool_prompt(tools: List[Tool]) -> str:
         tool_prompt += f"  Usage:\n{tool.get_usage()}\n"
     tool_prompt += "\n"
     tool_prompt += "If you emit output in one of the above formats, you will get the output of the corresponding tool as a reply.\n"
-    tool_prompt += "Note that each tool invocation must be in a separate reply! You can only invoke one tool per turn.\n"
-    tool_prompt += f"The current working directory is {Path.cwd()}\n"
+    tool_prompt += ("You can invoke several tools in one reply by emitting several <TOOL>...</TOOL> blocks, e.g. to read or search "
+                    "multiple files at once. They are executed in order and their outputs are returned together in the next reply.\n")
+    tool_prompt += "Only batch invocations that do not depend on each other's output.\n"
+    tool_prompt += f"The current working directory is {Path(workdir) if workdir else Path.cwd()}\n"
 
     return tool_prompt
 
@@ -81,6 +86,19 @@ def construct_issue_desc_prompt(issue_desc: str, issue_summary: str, diff: str)
         )
     return prompt
 
+def construct_call_paths_prompt(call_paths: str) -> str:
+    """
+    Constructs the prompt listing call paths to the vulnerable methods, from the static call graph.
+    """
+    return (
+        "A static call graph of the project gives the following call paths to the methods changed by the fix. "
+        "The call graph resolves calls by name, so the paths may be incomplete or include calls that cannot happen; "
+        "check them against the code.\n"
+        "```\n"
+        f"{call_paths}"
+        "```\n"
+    )
+
 def construct_docker_instructions(dataset: str, workdir: str) -> str:
     if dataset == 'cwe-bench-java':
         docker_instructions = f"""
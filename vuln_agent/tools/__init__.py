@@ -1,9 +1,12 @@
 from vuln_agent.helpers import *
+from concurrent.futures import ThreadPoolExecutor
 
 class Tool:
     """
     Base class for all tools in the vuln_agent module.
     """
+    # Read-only tools do not change the workdir, so several of them can run concurrently
+    read_only = False
 
     def get_name(self):
         """
@@ -29,22 +32,40 @@ class Tool:
         """
         raise NotImplementedError("Subclasses should implement this method.")
 
+    def resolve_path(self, path: str) -> str:
+        """
+        Resolves a (possibly relative) path from the LLM against the tool's working directory.
+        """
+        workdir = getattr(self, 'workdir', None)
+        if workdir is None or os.path.isabs(path):
+            return path
+        return os.path.join(workdir, path)
+
 from vuln_agent.tools.read import Read
 from vuln_agent.tools.write import Write
 from vuln_agent.tools.listdir import ListDir
 from vuln_agent.tools.grep import Grep
 from vuln_agent.tools.find import Find
 from vuln_agent.tools.mkdir import Mkdir
+from vuln_agent.tools.callers import Callers
+from vuln_agent.tools.callees import Callees
+from vuln_agent.tools.definition import Definition
+from vuln_agent.tools.paths_to import PathsTo
 
 class Tooling:
 
-    def __init__(self, logger):
+    MAX_TOOLS_PER_TURN = 10 # Tool invocations executed from a single reply
+    MAX_TOOL_THREADS = 4
+
+    def __init__(self, logger, executor=None):
         """
         Initializes the Tooling class.
         This class is responsible for managing tools and their invocations.
+        ainvoke_tool runs tools on `executor` (the event loop's default executor if None).
         """
         self.tool_name_mapping = {}
         self.logger = logger
+        self.executor = executor
 
     def register_tool(self, tool: Tool):
         """
@@ -59,7 +80,7 @@ class Tooling:
 
     def has_tool_invocation(self, llm_output: str) -> bool:
         """
-        Checks if the LLM output contains a tool invocation.
+        Checks if the LLM output contains at least one tool invocation.
         Args:
             llm_output (str): The LLM output to check.
         Returns:
@@ -67,47 +88,133 @@ class Tooling:
         """
         return "<TOOL>" in llm_output and "</TOOL>" in llm_output
 
-    def invoke_tool(self, llm_output: str) -> dict[str, str]:
+    def parse_invocations(self, llm_output: str) -> list[str]:
+        """
+        Returns the contents of every <TOOL>...</TOOL> block in the LLM output, in order.
+        """
+        invocations = []
+        pos = 0
+        while True:
+            start = llm_output.find("<TOOL>", pos)
+            if start == -1:
+                break
+            end = llm_output.find("</TOOL>", start)
+            if end == -1:
+                break
+            invocations.append(llm_output[start + len("<TOOL>"):end].strip())
+            pos = end + len("</TOOL>")
+        return invocations
+
+    def prepare_invocation(self, tool_invocation: str):
         """
-        Invokes the tool with the given LLM output.
-        Args:
-            llm_output (str): The LLM output to check.
-        Returns:
-            dict[str, str]: The tool invocation output.
+        Parses a single tool invocation.
+        Returns (tool, parsed invocation, None), or (None, None, failure result) if it is invalid.
         """
-        # Get the part between <TOOL> and </TOOL>
-        start = llm_output.index("<TOOL>") + len("<TOOL>")
-        end = llm_output.index("</TOOL>")
-        tool_invocation = llm_output[start:end].strip()
         # Parse the tool invocation as JSON
         try:
-            import json
             parsed_output = json.loads(tool_invocation)
         except json.JSONDecodeError:
-            return {"status": "Failure", "output": "Invalid JSON"}
+            return None, None, {"status": "Failure", "output": "Invalid JSON"}
+        if not isinstance(parsed_output, dict):
+            return None, None, {"status": "Failure", "output": "Invalid JSON"}
 
         # Get the tool name
         tool_name = parsed_output.get("name")
         if not tool_name:
-            return {"status": "Failure", "output": "Missing 'name' field"}
-        
+            return None, None, {"status": "Failure", "output": "Missing 'name' field"}
+
         # Get the tool class from the mapping
         tool = self.tool_name_mapping.get(tool_name)
 
         if not tool:
-            return {"status": "Failure", "output": f"Unknown tool: {tool_name}"}
-        # Execute the tool with the parsed output
+            return None, None, {"status": "Failure", "output": f"Unknown tool: {tool_name}"}
+        return tool, parsed_output, None
+
+    def execute_timed(self, tool: Tool, parsed_output: dict):
+        """
+        Executes a tool and returns (result, start time string, elapsed time).
+        """
         start_time = time.time()
         start_time_str = f"{datetime.datetime.now()}"
-        result = tool.execute(parsed_output)
-        elapsed_time = time.time() - start_time
-        self.logger.log_action({
-            'type': 'tool_call',
-            'tool_name': tool_name,
-            'start_time': start_time_str,
-            'elapsed_time': elapsed_time,
-        })
-        return result
+        try:
+            result = tool.execute(parsed_output)
+        except Exception as e:
+            result = {"status": "Failure", "output": f"Tool raised an exception: {truncate_reverse(str(e), 1000)}"}
+        return result, start_time_str, time.time() - start_time
+
+    def invoke_tool(self, llm_output: str) -> dict[str, str]:
+        """
+        Invokes the tools with the given LLM output.
+        A reply may contain several <TOOL> blocks. Consecutive read-only invocations are
+        executed concurrently on a thread pool; any other tool (e.g. write) runs on its own,
+        after everything before it, so that the calls take effect in the order they were made.
+        Args:
+            llm_output (str): The LLM output to check.
+        Returns:
+            dict[str, str]: The tool invocation output. With several invocations, the outputs
+                            are returned in order as one message, and the status is Success.
+        """
+        invocations = self.parse_invocations(llm_output)
+        if not invocations:
+            return {"status": "Failure", "output": "No tool invocation found"}
+        skipped = invocations[self.MAX_TOOLS_PER_TURN:]
+        invocations = invocations[:self.MAX_TOOLS_PER_TURN]
+
+        prepared = [self.prepare_invocation(invocation) for invocation in invocations]
+        results = [failure for _, _, failure in prepared]
+
+        # Group consecutive runnable invocations: read-only ones together, the others alone
+        groups = []
+        for i, (tool, _, failure) in enumerate(prepared):
+            if failure is not None:
+                continue
+            if tool.read_only and groups and groups[-1][0] and groups[-1][1][-1] == i - 1:
+                groups[-1][1].append(i)
+            else:
+                groups.append((tool.read_only, [i]))
+
+        for _, indices in groups:
+            group_start = time.time()
+            if len(indices) == 1:
+                timed = [self.execute_timed(*prepared[indices[0]][:2])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(len(indices), self.MAX_TOOL_THREADS)) as executor:
+                    timed = list(executor.map(lambda i: self.execute_timed(*prepared[i][:2]), indices))
+            group_time = time.time() - group_start
+            # Logged from this thread, splitting the wall-clock time of the group between its calls
+            for i, (result, start_time_str, elapsed_time) in zip(indices, timed):
+                action = {
+                    'type': 'tool_call',
+                    'tool_name': prepared[i][1]["name"],
+                    'start_time': start_time_str,
+                    'elapsed_time': group_time / len(indices) if len(indices) > 1 else elapsed_time,
+                }
+                if len(indices) > 1:
+                    action['tool_time'] = elapsed_time
+                    action['concurrent'] = len(indices)
+                self.logger.log_action(action)
+                results[i] = result
+
+        if len(results) == 1 and not skipped:
+            return results[0]
+        sections = []
+        for i, (result, (_, parsed_output, _)) in enumerate(zip(results, prepared)):
+            name = parsed_output["name"] if parsed_output else "invalid"
+            if result["status"] == "Success":
+                sections.append(f"[Tool {i + 1}: {name}]\n{result['output']}")
+            else:
+                sections.append(f"[Tool {i + 1}: {name}]\nTool invocation failed: {result['output']}")
+        if skipped:
+            sections.append(f"Only the first {self.MAX_TOOLS_PER_TURN} tool invocations of a reply are executed; "
+                            f"{len(skipped)} more were ignored.")
+        return {"status": "Success", "output": "\n\n".join(sections)}
+
+    async def ainvoke_tool(self, llm_output: str) -> dict[str, str]:
+        """
+        Async variant of invoke_tool. Tools block on I/O and subprocesses,
+        so they are run on a worker thread to keep the event loop free.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.invoke_tool, llm_output)
 
 __all__ = [
     "Tool",
@@ -118,4 +225,8 @@ __all__ = [
     "Find",
     "Tooling",
     "Mkdir",
+    "Callers",
+    "Callees",
+    "Definition",
+    "PathsTo",
 ]
\ No newline at end of file
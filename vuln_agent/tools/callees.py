@@ -0,0 +1,51 @@
+from vuln_agent.tools import Tool
+from vuln_agent.helpers import *
+from vuln_agent.tools.callgraph import get_callgraph
+
+class Callees(Tool):
+    """
+    Tool to list the methods or functions of the project that a given one calls, from the static call graph.
+    """
+    read_only = True
+    def get_name(self):
+        return "callees"
+
+    def get_description(self):
+        return ("Lists the methods or functions of the project called by a given method or function, with their definitions. "
+                "Library calls are not included.")
+
+    def get_usage(self):
+        return ('<TOOL>\n'
+                '{"name": "callees",\n'
+                ' "symbol": "ClassName.methodName"\n}\n'
+                '</TOOL>\n'
+                'The symbol can be ClassName.methodName, a C function name, or just a method name.\n')
+
+    def __init__(self, logger: Logger, workdir: str = None):
+        self.logger = logger
+        self.workdir = workdir
+        self.graph = get_callgraph(workdir or os.getcwd())
+
+    def execute(self, param_dict: str):
+        """
+        Executes the tool with the given LLM output.
+        """
+        symbol = param_dict.get("symbol")
+        if not symbol:
+            return {"status": "Failure", "output": "Missing 'symbol' field"}
+        # Check if there are other keys in the param_dict
+        for key in param_dict.keys():
+            if key not in ["name", "symbol"]:
+                return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        nodes = self.graph.lookup(symbol)
+        if not nodes:
+            return {"status": "Failure", "output": f"No method or function named {symbol} found"}
+        output = ""
+        for node in nodes:
+            callees = self.graph.callees(node)
+            output += f"Called by {node} ({self.graph.location(node)}):\n"
+            if not callees:
+                output += "  None found\n"
+            for callee in callees:
+                output += f"  {callee} ({self.graph.location(callee)})\n"
+        return {"status": "Success", "output": truncate(output, 3000)}
@@ -0,0 +1,52 @@
+from vuln_agent.tools import Tool
+from vuln_agent.helpers import *
+from vuln_agent.tools.callgraph import get_callgraph
+
+class Callers(Tool):
+    """
+    Tool to list the methods or functions that call a given one, from the static call graph.
+    """
+    read_only = True
+    def get_name(self):
+        return "callers"
+
+    def get_description(self):
+        return ("Lists the methods or functions that call a given method or function, with the call sites. "
+                "The call graph is computed statically and resolves calls by name, so it may be incomplete or over-approximate.")
+
+    def get_usage(self):
+        return ('<TOOL>\n'
+                '{"name": "callers",\n'
+                ' "symbol": "ClassName.methodName"\n}\n'
+                '</TOOL>\n'
+                'The symbol can be ClassName.methodName, a C function name, or just a method name.\n')
+
+    def __init__(self, logger: Logger, workdir: str = None):
+        self.logger = logger
+        self.workdir = workdir
+        self.graph = get_callgraph(workdir or os.getcwd())
+
+    def execute(self, param_dict: str):
+        """
+        Executes the tool with the given LLM output.
+        """
+        symbol = param_dict.get("symbol")
+        if not symbol:
+            return {"status": "Failure", "output": "Missing 'symbol' field"}
+        # Check if there are other keys in the param_dict
+        for key in param_dict.keys():
+            if key not in ["name", "symbol"]:
+                return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        nodes = self.graph.lookup(symbol)
+        if not nodes:
+            return {"status": "Failure", "output": f"No method or function named {symbol} found"}
+        output = ""
+        for node in nodes:
+            callers = self.graph.callers(node)
+            output += f"Callers of {node} ({self.graph.location(node)}):\n"
+            if not callers:
+                output += "  None found\n"
+            for caller in callers:
+                sites = self.graph.graph.edges[caller, node]['sites']
+                output += f"  {caller} at {', '.join(f'{os.path.join(self.graph.root, path)}:{line}' for path, line in sites)}\n"
+        return {"status": "Success", "output": truncate(output, 3000)}
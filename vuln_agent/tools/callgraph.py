@@ -0,0 +1,398 @@
+from vuln_agent.helpers import *
+import bisect
+import re
+from vuln_agent.tools.index_store import file_digest, load_entry, save_entry, diff_files, git_blobs
+
+JAVA_EXTENSIONS = {'.java'}
+C_EXTENSIONS = {'.c', '.h', '.cc', '.cpp', '.cxx', '.hh', '.hpp', '.hxx'}
+
+KEYWORDS = {
+    'if', 'for', 'while', 'switch', 'catch', 'synchronized', 'return', 'sizeof', 'super', 'this',
+    'try', 'else', 'do', 'new', 'throw', 'assert', 'case', 'defined', 'typeof', 'alignof', 'decltype',
+    '__attribute__', '__declspec', '__typeof__', 'static_assert', '_Static_assert', 'offsetof',
+}
+
+# Comments, string and character literals; blanked out before parsing so their braces do not count
+COMMENT_OR_STRING = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.S)
+PREPROCESSOR_LINE = re.compile(r'^[ \t]*#(?:[^\n]*\\\n)*[^\n]*', re.M)
+STRUCTURE = re.compile(r'[{};]')
+TYPE_DECL = re.compile(r'\b(class|interface|enum|record)\s+(\w+)')
+C_TYPE_DECL = re.compile(r'\b(struct|union|enum|class|namespace)\b')
+PARAMS = r'\((?:[^()]|\([^()]*\))*\)'
+JAVA_METHOD = re.compile(rf'(\w+)\s*{PARAMS}\s*(?:throws\s+[\w\s,.<>]+)?$')
+C_FUNCTION = re.compile(rf'((?:\w+\s*::\s*)*~?\w+)\s*{PARAMS}\s*(?:const\s*)?(?:noexcept\s*)?(?:override\s*)?$')
+ANNOTATION = re.compile(r'@(?!interface\b)\w+(?:\s*\.\s*\w+)*(?:\s*\((?:[^()]|\([^()]*\))*\))?')
+CALL = re.compile(r'(?:\b(new)\s+(?:\w+\s*\.\s*)*)?(?:\b(\w+)\s*(?:\.|->|::)\s*)?\b([A-Za-z_]\w*)\s*(?:<[^(){};=]*>\s*)?\(')
+
+def blank(match):
+    """
+    Replaces a match with spaces, keeping its newlines so that line numbers are unchanged.
+    """
+    return re.sub(r'[^\n]', ' ', match.group())
+
+def simple_name(node):
+    return re.split(r'\.|::', node)[-1]
+
+class CallGraph:
+    """
+    Static symbol and call-graph index over the Java and C/C++ sources of a working directory.
+
+    Sources are parsed with a lightweight brace-matching scanner rather than a full parser:
+    Java methods are named Class.method (constructors Class.<init>, static initializers
+    Class.<clinit>) after their innermost enclosing class, C functions by their (qualified) name.
+    Overloads share a node. Calls are resolved by name: to the caller's own class or an
+    explicitly named class where possible, otherwise to every method with that name, unless
+    the name is too common to be informative. The graph therefore over-approximates some
+    calls (e.g. through interfaces) and misses others (reflection, function pointers).
+
+    `graph` is a networkx DiGraph with an edge from caller to callee. Node attribute
+    `definitions` lists (relative path, first line, last line); edge attribute `sites` lists
+    (relative path, line) of the calls.
+
+    The parsed files are persisted with the index store (see index_store.py); later runs of
+    the same project tree only re-parse the files that differ from the stored ones.
+    """
+
+    SKIP_DIRS = {'.git'}
+    MAX_FILE_SIZE = 2 * 1024 * 1024
+    MAX_CANDIDATES = 8 # Calls resolved by name alone to more methods than this are dropped
+    VERSION = 1 # Of the stored index format
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.files = {} # relative path -> ((mtime_ns, size), digest, definitions, calls)
+        if not self.load():
+            for rel_path, stat in self.walk():
+                self.files[rel_path] = ((stat.st_mtime_ns, stat.st_size), *self.parse_file(rel_path))
+            self.link()
+            self.save()
+
+    def save(self):
+        """
+        Stores the parsed files, and the linked graph as (node, definitions) and (caller, callee, sites) lists.
+        """
+        blobs = {rel_path: blob for rel_path, blob in git_blobs(self.root).items() if rel_path in self.files}
+        meta = {"version": self.VERSION, "files": self.files, "blobs": blobs,
+                "nodes": [[node, data['definitions']] for node, data in self.graph.nodes(data=True)],
+                "edges": [[caller, callee, data['sites']] for caller, callee, data in self.graph.edges(data=True)]}
+        save_entry(self.root, "callgraph", meta)
+
+    def load(self):
+        """
+        Loads the stored parsed files of this tree, if any, and re-parses the files that changed since.
+        The stored graph is reused if nothing changed; otherwise the graph is relinked.
+        Returns False if there is nothing stored.
+        """
+        entry = load_entry(self.root, "callgraph")
+        if entry is None or entry[0].get("version") != self.VERSION:
+            return False
+        meta = entry[0]
+        stored = meta["files"]
+        current = {rel_path: (stat.st_mtime_ns, stat.st_size) for rel_path, stat in self.walk()}
+        changed, removed = diff_files(self.root, {rel_path: info[0] for rel_path, info in stored.items()},
+                                      {rel_path: info[1] for rel_path, info in stored.items()}, meta["blobs"], current)
+        for rel_path, (_, digest, definitions, calls) in stored.items():
+            if rel_path in current and rel_path not in changed:
+                self.files[rel_path] = (current[rel_path], digest, definitions, calls)
+        for rel_path in changed:
+            self.files[rel_path] = (current[rel_path], *self.parse_file(rel_path))
+        if changed or removed:
+            self.link()
+            return True
+        graph = nx.DiGraph()
+        graph.add_nodes_from((node, {'definitions': definitions}) for node, definitions in meta["nodes"])
+        graph.add_edges_from((caller, callee, {'sites': sites}) for caller, callee, sites in meta["edges"])
+        self.graph = graph
+        self.by_name = {}
+        for node in graph:
+            self.by_name.setdefault(simple_name(node), []).append(node)
+        return True
+
+    def walk(self, rel_dir=""):
+        """
+        Yields (relative path, stat) for every Java and C/C++ source file.
+        """
+        try:
+            entries = list(os.scandir(os.path.join(self.root, rel_dir)))
+        except OSError:
+            return
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.SKIP_DIRS:
+                        yield from self.walk(rel_path)
+                elif entry.is_file(follow_symlinks=False) and os.path.splitext(entry.name)[1] in JAVA_EXTENSIONS | C_EXTENSIONS:
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_size <= self.MAX_FILE_SIZE:
+                        yield rel_path, stat
+            except OSError:
+                continue
+
+    def parse_file(self, rel_path):
+        """
+        Returns the content digest, definitions [(node, line, end line)] and calls
+        [(caller, caller class, qualifier, name, is constructor call, line)] of a source file.
+        """
+        try:
+            with open(os.path.join(self.root, rel_path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None, [], []
+        digest = file_digest(data)
+        text = data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        is_java = os.path.splitext(rel_path)[1] in JAVA_EXTENSIONS
+        text = COMMENT_OR_STRING.sub(blank, text)
+        if not is_java:
+            text = PREPROCESSOR_LINE.sub(blank, text)
+        newlines = [m.start() for m in re.finditer('\n', text)]
+        line_of = lambda offset: bisect.bisect_right(newlines, offset) + 1
+
+        definitions = []
+        calls = []
+        stack = [] # [kind, name, first line]; kind is 'class', 'function' or 'block'
+
+        def current_function():
+            for kind, name, _ in reversed(stack):
+                if kind == 'function':
+                    return name
+            return None
+
+        def current_class():
+            for kind, name, _ in reversed(stack):
+                if kind == 'class':
+                    return name
+            return None
+
+        def record_calls(start, end):
+            caller = current_function()
+            if caller is None:
+                return
+            for m in CALL.finditer(text, start, end):
+                is_new, qualifier, name = m.group(1) is not None, m.group(2), m.group(3)
+                if name in KEYWORDS or (qualifier in KEYWORDS and qualifier not in ['this', 'super']):
+                    continue
+                calls.append((caller, current_class(), qualifier, name, is_new, line_of(m.start(3))))
+
+        def classify(start, end):
+            """
+            Returns (kind, name, offset of the name) for the block whose header is text[start:end].
+            """
+            header = text[start:end].strip()
+            start += len(text[start:end]) - len(text[start:end].lstrip())
+            if is_java:
+                header = ANNOTATION.sub(blank, header)
+                m = TYPE_DECL.search(header)
+                if m and '(' not in header[:m.start()] and '=' not in header[:m.start()]:
+                    return 'class', m.group(2), start + m.start(2)
+                if stack and stack[-1][0] == 'class':
+                    if re.fullmatch(r'static', header):
+                        return 'function', f"{stack[-1][1]}.<clinit>", None
+                    m = JAVA_METHOD.search(header)
+                    if m and m.group(1) not in KEYWORDS and '=' not in header and not re.search(r'\bnew\b', header):
+                        name = '<init>' if m.group(1) == stack[-1][1] else m.group(1)
+                        return 'function', f"{stack[-1][1]}.{name}", start + m.start(1)
+                return 'block', None, None
+            if current_function() is None:
+                m = C_FUNCTION.search(header)
+                if m and simple_name(m.group(1)).lstrip('~') not in KEYWORDS and '=' not in header \
+                        and not C_TYPE_DECL.search(header[:m.start()]):
+                    name = re.sub(r'\s+', '', m.group(1))
+                    if current_class() is not None and '::' not in name:
+                        name = f"{current_class()}::{name}"
+                    return 'function', name, start + m.start(1)
+                m = re.search(r'\b(?:class|struct)\s+(\w+)[^(]*$', header)
+                if m and '=' not in header:
+                    return 'class', m.group(1), start + m.start(1)
+            return 'block', None, None
+
+        segment_start = 0
+        for m in STRUCTURE.finditer(text):
+            if m.group() == '{':
+                kind, name, name_offset = classify(segment_start, m.start())
+                if kind != 'function':
+                    record_calls(segment_start, m.start())
+                stack.append([kind, name, line_of(m.start() if name_offset is None else name_offset)])
+            else:
+                record_calls(segment_start, m.start())
+                if m.group() == '}' and stack:
+                    kind, name, first_line = stack.pop()
+                    if kind == 'function':
+                        definitions.append((name, first_line, line_of(m.start())))
+            segment_start = m.end()
+        return digest, definitions, calls
+
+    def link(self):
+        """
+        Builds the graph from the parsed files, resolving calls to definitions.
+        """
+        graph = nx.DiGraph()
+        by_name = {}
+        for rel_path, (_, _, definitions, _) in sorted(self.files.items()):
+            for node, line, end_line in definitions:
+                if node not in graph:
+                    graph.add_node(node, definitions=[])
+                    by_name.setdefault(simple_name(node), []).append(node)
+                graph.nodes[node]['definitions'].append((rel_path, line, end_line))
+
+        for rel_path, (_, _, _, calls) in sorted(self.files.items()):
+            for caller, caller_class, qualifier, name, is_new, line in calls:
+                for callee in self.resolve_call(graph, by_name, caller_class, qualifier, name, is_new):
+                    if not graph.has_edge(caller, callee):
+                        graph.add_edge(caller, callee, sites=[])
+                    graph.edges[caller, callee]['sites'].append((rel_path, line))
+        self.graph = graph
+        self.by_name = by_name
+
+    def resolve_call(self, graph, by_name, caller_class, qualifier, name, is_new):
+        if is_new:
+            return [f"{name}.<init>"] if f"{name}.<init>" in graph else []
+        for scope in [caller_class if qualifier in [None, 'this', 'super'] else None, qualifier]:
+            for separator in ['.', '::']:
+                if scope is not None and f"{scope}{separator}{name}" in graph:
+                    return [f"{scope}{separator}{name}"]
+        candidates = by_name.get(name, [])
+        return candidates if len(candidates) <= self.MAX_CANDIDATES else []
+
+    def update_file(self, rel_path):
+        """
+        Re-parses a single file after it was written, created or deleted, and relinks the graph.
+        """
+        with self.lock:
+            full_path = os.path.join(self.root, rel_path)
+            if os.path.isfile(full_path) and os.path.splitext(rel_path)[1] in JAVA_EXTENSIONS | C_EXTENSIONS:
+                stat = os.stat(full_path)
+                self.files[rel_path] = ((stat.st_mtime_ns, stat.st_size), *self.parse_file(rel_path))
+            else:
+                self.files.pop(rel_path, None)
+            self.link()
+
+    def refresh(self):
+        """
+        Re-parses the files whose mtime or size changed (e.g. after a git stash or checkout).
+        """
+        current = {rel_path: (stat.st_mtime_ns, stat.st_size) for rel_path, stat in self.walk()}
+        with self.lock:
+            changed = [rel_path for rel_path, stat in current.items() if rel_path not in self.files or self.files[rel_path][0] != stat]
+            removed = [rel_path for rel_path in self.files if rel_path not in current]
+            if not changed and not removed:
+                return
+            for rel_path in changed:
+                self.files[rel_path] = (current[rel_path], *self.parse_file(rel_path))
+            for rel_path in removed:
+                self.files.pop(rel_path)
+            self.link()
+
+    def lookup(self, symbol):
+        """
+        Returns the nodes matching a symbol: Class.method, Class,method (as in .method_info.csv),
+        Namespace::function, or a bare method or function name.
+        """
+        symbol = symbol.strip().replace(',', '.').replace('#', '.').replace('()', '')
+        if symbol in self.graph:
+            return [symbol]
+        matches = self.by_name.get(simple_name(symbol), [])
+        if simple_name(symbol) != symbol:
+            matches = [node for node in matches if node.endswith(symbol) or node.endswith(symbol.replace('.', '::'))]
+        return sorted(matches)
+
+    def location(self, node):
+        """
+        Returns 'path:line' for the definitions of a node, with absolute paths.
+        """
+        return ", ".join(f"{os.path.join(self.root, rel_path)}:{line}"
+                         for rel_path, line, _ in self.graph.nodes[node]['definitions'])
+
+    def callers(self, node):
+        return sorted(self.graph.predecessors(node))
+
+    def callees(self, node):
+        return sorted(self.graph.successors(node))
+
+    def paths_to(self, node, max_paths=5, max_depth=12):
+        """
+        Returns up to `max_paths` shortest call paths ending in `node`, each starting from an
+        entry point (a method without callers in the project) within `max_depth` calls. If
+        the node cannot be reached from any entry point (e.g. it is only called from a cycle),
+        paths start from the most distant callers instead.
+        """
+        next_hop = {node: None}
+        depth = {node: 0}
+        frontier = [node]
+        while frontier:
+            new_frontier = []
+            for current in frontier:
+                if depth[current] >= max_depth:
+                    continue
+                for caller in sorted(self.graph.predecessors(current)):
+                    if caller not in next_hop:
+                        next_hop[caller] = current
+                        depth[caller] = depth[current] + 1
+                        new_frontier.append(caller)
+            frontier = new_frontier
+
+        starts = [n for n in next_hop if n != node and self.graph.in_degree(n) == 0]
+        if not starts:
+            deepest = max(depth.values())
+            starts = [n for n in next_hop if n != node and depth[n] == deepest]
+        starts.sort(key=lambda n: (depth[n], n))
+        paths = []
+        for start in starts[:max_paths]:
+            path = [start]
+            while next_hop[path[-1]] is not None:
+                path.append(next_hop[path[-1]])
+            paths.append(path)
+        return paths
+
+    def format_path(self, path):
+        return "\n".join(f"{'  ' * i}{'-> ' if i else ''}{node} ({self.location(node)})" for i, node in enumerate(path))
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_callgraph(root, build=True):
+    """
+    Returns the call graph for `root`, building it on first use (if `build`).
+    """
+    root = os.path.abspath(root)
+    with _graphs_lock:
+        if root not in _graphs and build:
+            _graphs[root] = CallGraph(root)
+        return _graphs.get(root)
+
+def find_callgraph(path):
+    """
+    Returns the call graph whose root contains `path`, if any.
+    """
+    path = os.path.abspath(path)
+    with _graphs_lock:
+        for root, graph in _graphs.items():
+            if path == root or path.startswith(root + os.sep):
+                return graph
+    return None
+
+def notify_source_write(path):
+    """
+    Tells the call graph covering `path` (if any) that the file changed.
+    """
+    if os.path.splitext(path)[1] not in JAVA_EXTENSIONS | C_EXTENSIONS:
+        return
+    graph = find_callgraph(path)
+    if graph is not None:
+        graph.update_file(os.path.relpath(os.path.abspath(path), graph.root))
+
+def refresh_callgraph(root):
+    """
+    Re-syncs the call graph for `root` (if one was built) with the files on disk.
+    """
+    graph = get_callgraph(root, build=False)
+    if graph is not None:
+        graph.refresh()
+
+def drop_callgraph(root):
+    """
+    Forgets the call graph for `root` (e.g. a workdir that is being deleted).
+    """
+    with _graphs_lock:
+        _graphs.pop(os.path.abspath(root), None)
@@ -0,0 +1,46 @@
+from vuln_agent.tools import Tool
+from vuln_agent.helpers import *
+from vuln_agent.tools.callgraph import get_callgraph
+
+class Definition(Tool):
+    """
+    Tool to find where a method or function is defined.
+    """
+    read_only = True
+    def get_name(self):
+        return "definition"
+
+    def get_description(self):
+        return "Finds the file and line range where a method or function is defined."
+
+    def get_usage(self):
+        return ('<TOOL>\n'
+                '{"name": "definition",\n'
+                ' "symbol": "ClassName.methodName"\n}\n'
+                '</TOOL>\n'
+                'The symbol can be ClassName.methodName, a C function name, or just a method name.\n')
+
+    def __init__(self, logger: Logger, workdir: str = None):
+        self.logger = logger
+        self.workdir = workdir
+        self.graph = get_callgraph(workdir or os.getcwd())
+
+    def execute(self, param_dict: str):
+        """
+        Executes the tool with the given LLM output.
+        """
+        symbol = param_dict.get("symbol")
+        if not symbol:
+            return {"status": "Failure", "output": "Missing 'symbol' field"}
+        # Check if there are other keys in the param_dict
+        for key in param_dict.keys():
+            if key not in ["name", "symbol"]:
+                return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        nodes = self.graph.lookup(symbol)
+        if not nodes:
+            return {"status": "Failure", "output": f"No method or function named {symbol} found"}
+        output = ""
+        for node in nodes:
+            for path, line, end_line in self.graph.graph.nodes[node]['definitions']:
+                output += f"{node}: {os.path.join(self.graph.root, path)}, lines {line} to {end_line}\n"
+        return {"status": "Success", "output": truncate(output, 3000)}
@@ -1,10 +1,12 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from vuln_agent.tools.tree_snapshot import get_snapshot, find_snapshot
 
 class Find(Tool):
     """
     Tool to find files or directories with a name containing a search string.
     """
+    read_only = True
     def get_name(self):
         return "find"
 
@@ -19,8 +21,23 @@ class Find(Tool):
                 '</TOOL>\n'
                  'Note that the /path/to/base_directory_or_file should be absolute, not relative.\n')
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
+        if workdir is not None:
+            get_snapshot(workdir)
+
+    def search(self, query, path):
+        """
+        Answers the query from the tree snapshot when it covers the path,
+        falling back to find otherwise. Raises RunException on find errors.
+        """
+        snapshot = find_snapshot(path)
+        if snapshot is not None:
+            output = snapshot.find(path, query)
+            if output is not None:
+                return "".join(f"{line}\n" for line in output)
+        return run(f"find {path} -not -path '*/.*' -name \"*{query}*\"", logger=self.logger, timeout=5)
 
     def execute(self, param_dict: str):
         """
@@ -36,12 +53,13 @@ class Find(Tool):
         for key in param_dict.keys():
             if key not in ["name", "query", "path"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        path = self.resolve_path(path)
         # Check if the path exists
         if not os.path.exists(path):
             return {"status": "Failure", "output": f"Path {path} does not exist"}
         # Search for the query in the specified path
         try:
-            output = run(f"find {path} -not -path '*/.*' -name \"*{query}*\"", logger=self.logger, timeout=5)
+            output = self.search(query, path)
             if not output:
                 return {"status": "Success", "output": "No results found"}
             return {"status": "Success", "output": truncate(output, 2000)}
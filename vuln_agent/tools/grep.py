@@ -1,10 +1,12 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from vuln_agent.tools.trigram_index import get_index, find_index
 
 class Grep(Tool):
     """
     Tool to search for a string in the contents of a single file or all files in a directory.
     """
+    read_only = True
     def get_name(self):
         return "grep"
 
@@ -19,8 +21,22 @@ class Grep(Tool):
                 '</TOOL>\n'
                  'Note that the /path/to/directory_or_file should be absolute, not relative.\n')
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
+        if workdir is not None:
+            get_index(workdir) # Built once per workdir and shared by all Grep instances
+
+    def search(self, query, path):
+        """
+        Answers the query from the trigram index when it covers the path,
+        falling back to grep otherwise. Raises RunException on grep errors.
+        """
+        index = find_index(path)
+        if index is not None and not os.path.islink(path) \
+                and not any(part in index.SKIP_DIRS for part in Path(os.path.relpath(os.path.abspath(path), index.root)).parts):
+            return index.search(query, path)
+        return run(f"grep -nr -F --exclude='.?*' \"{query}\" {path}", logger=self.logger, timeout=5)
 
     def execute(self, param_dict: str):
         """
@@ -36,12 +52,13 @@ class Grep(Tool):
         for key in param_dict.keys():
             if key not in ["name", "query", "path"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        path = self.resolve_path(path)
         # Check if the path exists
         if not os.path.exists(path):
             return {"status": "Failure", "output": f"Path {path} does not exist"}
         # Search for the query in the specified path
         try:
-            output = run(f"grep -nr -F --exclude='.?*' \"{query}\" {path}", logger=self.logger, timeout=5)
+            output = self.search(query, path)
             if not output:
                 return {"status": "Success", "output": "No results found"}
             return {"status": "Success", "output": truncate(output, 2000)}
@@ -0,0 +1,135 @@
+from vuln_agent.helpers import *
+import hashlib
+import numpy as np
+
+MAX_TREES = 4 # Cached trees kept per project
+
+def file_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def entry_dir(root, kind):
+    """
+    Returns the cache directory of index `kind` for the project workdir `root`, or None if it
+    cannot be cached. Indexes are stored under data/<dataset>/index_cache/<project>/<tree>/<kind>,
+    next to the dataset's workdirs, so that runs with a different workdir suffix (ablations)
+    share them. <tree> is the git tree hash of the workdir's HEAD.
+    """
+    root = Path(root).absolute()
+    if root.parent.name != 'project-sources':
+        return None
+    cache_root = Path(os.environ.get("VULN_AGENT_INDEX_CACHE", root.parents[2] / "index_cache"))
+    try:
+        tree = subprocess.run(["git", "rev-parse", "HEAD^{tree}"], cwd=root, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True, text=True).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    return cache_root / root.name / tree / kind
+
+def load_entry(root, kind):
+    """
+    Returns (meta, arrays) of a cached index, with the arrays memory-mapped read-only,
+    or None if there is none.
+    """
+    path = entry_dir(root, kind)
+    if path is None or not (path / "meta.json").exists():
+        return None
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r') for name in meta.get("arrays", [])}
+    except (OSError, ValueError):
+        return None
+    os.utime(path.parent) # Marks the tree as recently used
+    return meta, arrays
+
+def save_entry(root, kind, meta, arrays=None):
+    """
+    Stores an index. Entries are written to a temporary directory and renamed into place,
+    so concurrent runs never see a partial entry; if another run stored the same entry
+    first, that one is kept.
+    """
+    path = entry_dir(root, kind)
+    if path is None or path.exists():
+        return
+    arrays = arrays or {}
+    tmp_path = path.with_name(f".{kind}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(tmp_path / f"{name}.npy", np.ascontiguousarray(array))
+        (tmp_path / "meta.json").write_text(json.dumps({**meta, "arrays": list(arrays)}))
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+    evict(path.parent.parent)
+
+def evict(project_dir):
+    """
+    Keeps the MAX_TREES most recently used trees of a project.
+    """
+    try:
+        trees = sorted((tree for tree in Path(project_dir).iterdir() if tree.is_dir()),
+                       key=lambda tree: tree.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for tree in trees[MAX_TREES:]:
+        shutil.rmtree(tree, ignore_errors=True)
+
+def git_blobs(root):
+    """
+    Returns {relative path: blob id} for the tracked files of `root` whose contents match the
+    git index, or {} if `root` is not a git repository. Files that `git status` reports as
+    modified are left out. Stat checks are relaxed to mtime and size, so that a copied tree
+    whose mtimes were preserved is not re-hashed by git either.
+    """
+    git = lambda *args: subprocess.run(["git", "--no-optional-locks", "-c", "core.checkStat=minimal",
+                                        "-c", "core.trustctime=false", *args], cwd=root,
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+    try:
+        staged = git("ls-files", "-s", "-z")
+        status = git("status", "--porcelain", "-z", "--untracked-files=no", "--no-renames")
+    except (subprocess.CalledProcessError, OSError):
+        return {}
+    dirty = {entry[3:] for entry in status.decode('utf-8', errors='surrogateescape').split('\0') if len(entry) > 3}
+    blobs = {}
+    for entry in staged.decode('utf-8', errors='surrogateescape').split('\0'):
+        if not entry:
+            continue
+        info, rel_path = entry.split('\t', 1)
+        _, blob, stage = info.split()
+        if stage == '0' and rel_path not in dirty:
+            blobs[rel_path] = blob
+    return blobs
+
+def diff_files(root, stats, digests, blobs, current):
+    """
+    Compares the files of a cached index with the files on disk.
+    `stats`, `digests` and `blobs` map relative paths to the cached (mtime_ns, size), content
+    digest and git blob id (see git_blobs), `current` to the (mtime_ns, size) on disk.
+    A file whose stat matches is assumed unchanged, and so is a file whose current blob id
+    matches the cached one (a fresh checkout or copy has new mtimes, but git knows its files).
+    Only the remaining files (modified, untracked, or outside git) are hashed.
+    Returns (changed, removed): the files to re-index, and the cached files no longer on disk.
+    """
+    changed = []
+    current_blobs = None
+    for rel_path, stat in current.items():
+        if rel_path not in stats:
+            changed.append(rel_path)
+            continue
+        if tuple(stats[rel_path]) == tuple(stat):
+            continue
+        if rel_path in blobs:
+            if current_blobs is None:
+                current_blobs = git_blobs(root)
+            if current_blobs.get(rel_path) == blobs[rel_path]:
+                continue
+        try:
+            with open(os.path.join(root, rel_path), 'rb') as f:
+                digest = file_digest(f.read())
+        except OSError:
+            digest = None
+        if digest is None or digest != digests.get(rel_path):
+            changed.append(rel_path)
+    removed = [rel_path for rel_path in stats if rel_path not in current]
+    return changed, removed
@@ -1,10 +1,12 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from vuln_agent.tools.tree_snapshot import get_snapshot, find_snapshot
 
 class ListDir(Tool):
     """
     Tool to list the contents of a directory.
     """
+    read_only = True
     def get_name(self):
         return "listdir"
 
@@ -18,8 +20,11 @@ class ListDir(Tool):
                 '</TOOL>\n'
                  'Note that the /path/to/directory should be absolute, not relative.\n')
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
+        if workdir is not None:
+            get_snapshot(workdir)
 
     def execute(self, param_dict: str):
         """
@@ -32,12 +37,16 @@ class ListDir(Tool):
         for key in param_dict.keys():
             if key not in ["name", "directory"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        directory = self.resolve_path(directory)
         # Check if the directory exists
         if not os.path.isdir(directory):
             return {"status": "Failure", "output": f"Directory {directory} does not exist"}
         # List the contents of the directory
         try:
-            listing = [f for f in os.listdir(directory) if not f.startswith('.')]
+            snapshot = find_snapshot(directory)
+            listing = snapshot.listdir(directory) if snapshot is not None else None
+            if listing is None:
+                listing = [f for f in os.listdir(directory) if not f.startswith('.')]
             output = '\n'.join(listing)
             return {"status": "Success", "output": truncate(output, 10000)}
         except Exception as e:
@@ -1,5 +1,6 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from vuln_agent.tools.tree_snapshot import notify_created
 
 class Mkdir(Tool):
     """
@@ -20,8 +21,9 @@ class Mkdir(Tool):
                 "Note that the /path/to/directory should be absolute, not relative.\n"
                 )
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
     
     def execute(self, param_dict: str):
         """
@@ -35,12 +37,13 @@ class Mkdir(Tool):
             if key not in ["name", "path"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
         # Check if the parent directory exists
-        dirpath = Path(dirpath)
+        dirpath = Path(self.resolve_path(dirpath))
         if not dirpath.parent.exists():
             return {"status": "Failure", "output": f"Directory {dirpath.parent.absolute()} does not exist"}
         # Create the directory
         try:
             dirpath.mkdir(parents=True, exist_ok=True)
+            notify_created(dirpath, is_dir=True)
             self.logger.log_status(f"Directory {dirpath.absolute()} created successfully.")
             return {"status": "Success", "output": "Directory created successfully"}
         except Exception as e:
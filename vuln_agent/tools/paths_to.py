@@ -0,0 +1,52 @@
+from vuln_agent.tools import Tool
+from vuln_agent.helpers import *
+from vuln_agent.tools.callgraph import get_callgraph
+
+class PathsTo(Tool):
+    """
+    Tool to list call paths from entry points of the project to a given method or function.
+    """
+    read_only = True
+    MAX_PATHS = 5
+
+    def get_name(self):
+        return "paths_to"
+
+    def get_description(self):
+        return ("Lists the shortest call paths reaching a method or function from entry points of the project "
+                "(methods with no callers in the project). The call graph is computed statically, so verify the paths by reading the code.")
+
+    def get_usage(self):
+        return ('<TOOL>\n'
+                '{"name": "paths_to",\n'
+                ' "symbol": "ClassName.methodName"\n}\n'
+                '</TOOL>\n'
+                'The symbol can be ClassName.methodName, a C function name, or just a method name.\n')
+
+    def __init__(self, logger: Logger, workdir: str = None):
+        self.logger = logger
+        self.workdir = workdir
+        self.graph = get_callgraph(workdir or os.getcwd())
+
+    def execute(self, param_dict: str):
+        """
+        Executes the tool with the given LLM output.
+        """
+        symbol = param_dict.get("symbol")
+        if not symbol:
+            return {"status": "Failure", "output": "Missing 'symbol' field"}
+        # Check if there are other keys in the param_dict
+        for key in param_dict.keys():
+            if key not in ["name", "symbol"]:
+                return {"status": "Failure", "output": f"Unknown field '{key}'"}
+        nodes = self.graph.lookup(symbol)
+        if not nodes:
+            return {"status": "Failure", "output": f"No method or function named {symbol} found"}
+        output = ""
+        for node in nodes:
+            paths = self.graph.paths_to(node, max_paths=self.MAX_PATHS)
+            if not paths:
+                output += f"No callers of {node} ({self.graph.location(node)}) found\n"
+            for path in paths:
+                output += f"{self.graph.format_path(path)}\n\n"
+        return {"status": "Success", "output": truncate(output, 4000)}
@@ -1,10 +1,37 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from collections import OrderedDict
+import mmap
+import numpy as np
+
+def line_starts(buffer) -> np.ndarray:
+    """
+    Returns the byte offset at which each line of the (UTF-8) buffer starts, followed by
+    the buffer length. Lines break where str.splitlines() would break them after
+    universal-newline decoding: \\n, \\r\\n, \\r, \\v, \\f, \\x1c-\\x1e, U+0085, U+2028 and U+2029.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.isin(data, [0x0a, 0x0b, 0x0c, 0x1c, 0x1d, 0x1e])
+    ends[:-1] |= (data[:-1] == 0x0d) & (data[1:] != 0x0a)
+    ends[-1:] |= data[-1:] == 0x0d
+    ends[1:] |= (data[1:] == 0x85) & (data[:-1] == 0xc2)
+    ends[2:] |= np.isin(data[2:], [0xa8, 0xa9]) & (data[1:-1] == 0x80) & (data[:-2] == 0xe2)
+    starts = np.flatnonzero(ends) + 1
+    del data
+    starts = starts[starts < len(buffer)]
+    return np.concatenate(([0], starts, [len(buffer)])).astype(np.int64)
 
 class Read(Tool):
     """
     Tool to read the contents of a file.
+    Line ranges are served from an mmap of the file, using a line-offset index
+    cached per (path, mtime, size).
     """
+    read_only = True
+
+    MAX_CACHED_FILES = 64
+    line_index_cache = OrderedDict() # path -> (mtime_ns, size, line starts); shared by all Read tools
+    line_index_lock = threading.Lock()
     def get_name(self):
         return "read"
 
@@ -22,8 +49,40 @@ class Read(Tool):
                 'Note that the /path/to/file should be absolute, not relative.\n'
                 '`start_line` (optional) is the line number to start reading from. Defaults to 1.\n')
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
+
+    def get_line_starts(self, fpath, stat, buffer):
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.line_index_lock:
+            cached = self.line_index_cache.get(fpath)
+            if cached is not None and cached[:2] == key:
+                self.line_index_cache.move_to_end(fpath)
+                return cached[2]
+        starts = line_starts(buffer)
+        with self.line_index_lock:
+            self.line_index_cache[fpath] = (*key, starts)
+            if len(self.line_index_cache) > self.MAX_CACHED_FILES:
+                self.line_index_cache.popitem(last=False)
+        return starts
+
+    def read_lines(self, fpath, start_line, end_line):
+        """
+        Returns lines start_line..end_line (1-based, inclusive) of the file, with newlines normalized
+        as open(fpath, "r").read() would.
+        """
+        with open(fpath, "rb") as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size == 0:
+                return ""
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                starts = self.get_line_starts(fpath, stat, buffer)
+                num_lines = len(starts) - 1
+                begin = starts[min(start_line - 1, num_lines)]
+                end = starts[min(end_line, num_lines)]
+                content = buffer[begin:end].decode("utf-8")
+        return content.replace("\r\n", "\n").replace("\r", "\n")
 
     def execute(self, param_dict: str):
         """
@@ -47,15 +106,13 @@ class Read(Tool):
             return {"status": "Failure", "output": f"File {fpath} is a hidden file and cannot be read"}
         # Read the contents of the file
         try:
-            with open(fpath, "r") as file:
-                content = file.read()
             start_line = int(param_dict.get("start_line", 1))
             if start_line < 1:
                 return {"status": "Failure", "output": "start_line must be >= 1"}
             end_line = int(param_dict.get("end_line", 1e6))
             if end_line < start_line:
                 return {"status": "Failure", "output": "end_line must be >= start_line"}
-            content = ''.join(content.splitlines(keepends=True)[start_line - 1:end_line])
+            content = self.read_lines(fpath, start_line, end_line)
             if len(content) == 0:
                 return {"status": "Failure", "output": f"File is empty or start_line is too high"}
             return {"status": "Success", "output": truncate(content, 3000, start_line)}
@@ -0,0 +1,168 @@
+from vuln_agent.helpers import *
+from fnmatch import fnmatchcase
+
+class TreeSnapshot:
+    """
+    In-memory snapshot of a working directory tree, used by the Find and ListDir tools.
+
+    `children` maps each directory (relative to the root, "" for the root) to its
+    non-hidden entries as (name, is_dir) pairs, in the order os.scandir returned them,
+    which is the order os.listdir and find would see. Hidden entries are left out,
+    since neither tool ever reports them, and symlinked directories are not descended
+    into (find does not follow them either).
+
+    The snapshot is built lazily by a single walk; Write and Mkdir add entries to it,
+    and anything that rewrites the tree wholesale (git stash/checkout) invalidates it.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.children = None
+
+    def build(self):
+        children = {}
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            entries = []
+            try:
+                with os.scandir(os.path.join(self.root, rel_dir)) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            is_dir = False
+                        entries.append((entry.name, is_dir))
+                        if is_dir:
+                            stack.append(os.path.join(rel_dir, entry.name))
+            except OSError:
+                pass
+            children[rel_dir] = entries
+        self.children = children
+
+    def get_children(self):
+        with self.lock:
+            if self.children is None:
+                self.build()
+            return self.children
+
+    def invalidate(self):
+        with self.lock:
+            self.children = None
+
+    def relative(self, path):
+        """
+        Returns the path relative to the root, or None if it is outside the root or hidden.
+        """
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        if rel == '.':
+            return ""
+        if rel.startswith('..') or any(part.startswith('.') for part in Path(rel).parts):
+            return None
+        return rel
+
+    def add(self, path, is_dir):
+        """
+        Records a newly created file or directory (and any missing parent directories).
+        """
+        rel = self.relative(path)
+        if not rel:
+            return
+        with self.lock:
+            if self.children is None:
+                return
+            parent, name = os.path.split(rel)
+            if parent not in self.children:
+                self.children = None # Parent created outside the tools; rebuild on next use
+                return
+            if not any(entry_name == name for entry_name, _ in self.children[parent]):
+                self.children[parent].append((name, is_dir))
+            if is_dir and rel not in self.children:
+                self.children[rel] = []
+
+    def listdir(self, directory):
+        """
+        Returns the non-hidden entry names of the directory, or None if it is not in the snapshot.
+        """
+        rel = self.relative(directory)
+        if rel is None or os.path.islink(directory):
+            return None
+        entries = self.get_children().get(rel)
+        if entries is None:
+            return None
+        return [name for name, _ in entries]
+
+    def find(self, path, query):
+        """
+        Returns the lines `find path -not -path '*/.*' -name "*query*"` would print,
+        or None if the path is not covered by the snapshot.
+        """
+        rel = self.relative(path)
+        if rel is None or os.path.islink(path):
+            return None
+        children = self.get_children()
+        pattern = f"*{query}*"
+        output = []
+        if rel not in children:
+            # A file (or an entry the snapshot does not know about)
+            parent, name = os.path.split(rel)
+            if not any(entry_name == name for entry_name, _ in children.get(parent, [])):
+                return None
+            if '/.' not in path and fnmatchcase(os.path.basename(path.rstrip('/')), pattern):
+                output.append(path)
+            return output
+
+        def visit(rel_dir, display_dir):
+            for name, is_dir in children.get(rel_dir, []):
+                display = display_dir + name if display_dir.endswith('/') else f"{display_dir}/{name}"
+                if fnmatchcase(name, pattern):
+                    output.append(display)
+                if is_dir:
+                    visit(os.path.join(rel_dir, name), display)
+
+        if '/.' in path:
+            return output # find descends, but every path it would print contains '/.'
+        if fnmatchcase(os.path.basename(path.rstrip('/')) or path, pattern):
+            output.append(path)
+        visit(rel, path)
+        return output
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(root):
+    root = os.path.abspath(root)
+    with _snapshots_lock:
+        if root not in _snapshots:
+            _snapshots[root] = TreeSnapshot(root)
+        return _snapshots[root]
+
+def find_snapshot(path):
+    """
+    Returns the snapshot whose root contains `path`, if any.
+    """
+    path = os.path.abspath(path)
+    with _snapshots_lock:
+        for root, snapshot in _snapshots.items():
+            if path == root or path.startswith(root + os.sep):
+                return snapshot
+    return None
+
+def notify_created(path, is_dir=False):
+    snapshot = find_snapshot(path)
+    if snapshot is not None:
+        snapshot.add(path, is_dir)
+
+def invalidate_snapshot(root):
+    root = os.path.abspath(root)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(root)
+    if snapshot is not None:
+        snapshot.invalidate()
+
+def drop_snapshot(root):
+    with _snapshots_lock:
+        _snapshots.pop(os.path.abspath(root), None)
@@ -0,0 +1,300 @@
+from vuln_agent.helpers import *
+import bisect
+import numpy as np
+from vuln_agent.tools.index_store import file_digest, load_entry, save_entry, diff_files, git_blobs
+
+class TrigramIndex:
+    """
+    In-memory trigram index over the text files of a working directory, used to answer
+    `grep -nr -F --exclude='.?*'` queries without shelling out.
+
+    The base index is a CSR layout: `keys` holds the sorted distinct trigrams, and
+    `postings[offsets[i]:offsets[i+1]]` the ids of the files containing `keys[i]`.
+    Files changed after the build are marked in `stale` and re-indexed into `overlay`
+    (relative path -> sorted trigram array) until the overlay grows large enough to
+    warrant a rebuild.
+
+    Like grep, hidden files are skipped but hidden directories are searched, except
+    for .git. Binary files (containing NUL bytes) are not indexed; grep only reports
+    them on stderr.
+
+    The base index is persisted with the index store (see index_store.py) and memory-mapped
+    on later runs of the same project tree; only the files that differ from the stored
+    index are re-indexed, into the overlay.
+    """
+
+    SKIP_DIRS = {'.git'}
+    MAX_OVERLAY = 2000 # Rebuild the base index once this many files have changed
+    VERSION = 1 # Of the stored index format
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        if not self.load():
+            self.build()
+            self.save()
+
+    @staticmethod
+    def trigrams(data: bytes) -> np.ndarray:
+        """
+        Returns the sorted distinct trigrams of `data`, each packed into a uint32.
+        """
+        if len(data) < 3:
+            return np.empty(0, dtype=np.uint32)
+        d = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+        return np.unique((d[:-2] << 16) | (d[1:-1] << 8) | d[2:])
+
+    @staticmethod
+    def is_hidden_file(rel_path):
+        return os.path.basename(rel_path).startswith('.') and len(os.path.basename(rel_path)) > 1
+
+    def walk(self, rel_dir=""):
+        """
+        Yields (relative path, stat) for every regular file grep -r would visit.
+        """
+        try:
+            entries = list(os.scandir(os.path.join(self.root, rel_dir)))
+        except OSError:
+            return
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.SKIP_DIRS:
+                        yield from self.walk(rel_path)
+                elif entry.is_file(follow_symlinks=False) and not self.is_hidden_file(rel_path):
+                    yield rel_path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+    def read(self, rel_path, digests=None):
+        """
+        Returns the contents of a text file, or None if it is binary or unreadable.
+        If `digests` is given, the digest of the file is recorded in it.
+        """
+        try:
+            with open(os.path.join(self.root, rel_path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if digests is not None:
+            digests[rel_path] = file_digest(data)
+        if b'\0' in data:
+            return None
+        return data
+
+    def build(self):
+        files = sorted(self.walk())
+        self.files = [rel_path for rel_path, _ in files]
+        self.file_ids = {rel_path: i for i, rel_path in enumerate(self.files)}
+        self.stats = {rel_path: (stat.st_mtime_ns, stat.st_size) for rel_path, stat in files}
+        self.stale = np.zeros(len(self.files), dtype=bool)
+        self.overlay = {}
+        self.digests = {}
+
+        chunks = []
+        for file_id, rel_path in enumerate(self.files):
+            data = self.read(rel_path, self.digests)
+            if data is None:
+                self.stale[file_id] = True # Binary: never a candidate
+                continue
+            tris = self.trigrams(data).astype(np.uint64)
+            chunks.append((tris << np.uint64(32)) | np.uint64(file_id))
+        if chunks:
+            entries = np.concatenate(chunks)
+            entries.sort()
+        else:
+            entries = np.empty(0, dtype=np.uint64)
+        tris = (entries >> np.uint64(32)).astype(np.uint32)
+        self.postings = (entries & np.uint64(0xffffffff)).astype(np.uint32)
+        self.keys, starts = np.unique(tris, return_index=True)
+        self.offsets = np.append(starts, len(tris)).astype(np.int64)
+
+    def save(self):
+        """
+        Stores the base index (just built, so without overlay).
+        """
+        blobs = {rel_path: blob for rel_path, blob in git_blobs(self.root).items() if rel_path in self.stats}
+        meta = {"version": self.VERSION, "files": self.files, "stats": self.stats, "digests": self.digests, "blobs": blobs}
+        arrays = {"keys": self.keys, "postings": self.postings, "offsets": self.offsets, "stale": self.stale}
+        save_entry(self.root, "trigram", meta, arrays)
+
+    def load(self):
+        """
+        Loads the stored index of this tree, if any, and re-indexes the files that changed since.
+        Returns False if there is none, or if so many files changed that a rebuild is cheaper.
+        """
+        entry = load_entry(self.root, "trigram")
+        if entry is None:
+            return False
+        meta, arrays = entry
+        if meta.get("version") != self.VERSION:
+            return False
+        current = {rel_path: (stat.st_mtime_ns, stat.st_size) for rel_path, stat in self.walk()}
+        changed, removed = diff_files(self.root, meta["stats"], meta["digests"], meta["blobs"], current)
+        if len(changed) + len(removed) > self.MAX_OVERLAY:
+            return False
+
+        self.files = meta["files"]
+        self.file_ids = {rel_path: i for i, rel_path in enumerate(self.files)}
+        self.stats = {rel_path: tuple(stat) for rel_path, stat in meta["stats"].items()}
+        self.stats.update({rel_path: stat for rel_path, stat in current.items() if rel_path in self.stats})
+        self.stale = np.array(arrays["stale"]) # Writable copy; the other arrays stay mapped
+        self.keys, self.postings, self.offsets = arrays["keys"], arrays["postings"], arrays["offsets"]
+        self.overlay = {}
+        self.digests = meta["digests"]
+        for rel_path in changed + removed:
+            self.update_file(rel_path)
+        return True
+
+    def update_file(self, rel_path):
+        """
+        Re-indexes a single file after it was written, created or deleted.
+        """
+        with self.lock:
+            if rel_path in self.file_ids:
+                self.stale[self.file_ids[rel_path]] = True
+            self.overlay.pop(rel_path, None)
+            full_path = os.path.join(self.root, rel_path)
+            if os.path.isfile(full_path) and not os.path.islink(full_path) and not self.is_hidden_file(rel_path) \
+                    and not any(part in self.SKIP_DIRS for part in Path(rel_path).parts):
+                stat = os.stat(full_path)
+                self.stats[rel_path] = (stat.st_mtime_ns, stat.st_size)
+                data = self.read(rel_path)
+                if data is not None:
+                    self.overlay[rel_path] = self.trigrams(data)
+            else:
+                self.stats.pop(rel_path, None)
+
+    def refresh(self):
+        """
+        Re-indexes files whose mtime or size changed (e.g. after a git stash or checkout).
+        """
+        current = {rel_path: (stat.st_mtime_ns, stat.st_size) for rel_path, stat in self.walk()}
+        changed = [rel_path for rel_path, stat in current.items() if self.stats.get(rel_path) != stat]
+        removed = [rel_path for rel_path in self.stats if rel_path not in current]
+        if len(self.overlay) + len(changed) + len(removed) > self.MAX_OVERLAY:
+            with self.lock:
+                self.build()
+            return
+        for rel_path in changed + removed:
+            self.update_file(rel_path)
+
+    def candidates(self, patterns, rel_dir):
+        """
+        Returns the sorted relative paths under rel_dir that may contain any of the patterns.
+        """
+        if rel_dir:
+            lo = bisect.bisect_left(self.files, rel_dir + '/')
+            hi = bisect.bisect_left(self.files, rel_dir + '0') # '0' sorts right after '/'
+        else:
+            lo, hi = 0, len(self.files)
+        selected = np.zeros(hi - lo, dtype=bool)
+        overlay = [rel_path for rel_path in self.overlay if not rel_dir or rel_path.startswith(rel_dir + '/')]
+        overlay_selected = set()
+        for pattern in patterns:
+            tris = self.trigrams(pattern)
+            if len(tris) == 0:
+                selected[:] = True
+                overlay_selected.update(overlay)
+                continue
+            ids = None
+            for tri in tris:
+                i = np.searchsorted(self.keys, tri)
+                if i == len(self.keys) or self.keys[i] != tri:
+                    ids = np.empty(0, dtype=np.uint32)
+                    break
+                posting = self.postings[self.offsets[i]:self.offsets[i + 1]]
+                ids = posting if ids is None else np.intersect1d(ids, posting, assume_unique=True)
+                if len(ids) == 0:
+                    break
+            ids = ids[(ids >= lo) & (ids < hi)]
+            selected[ids.astype(np.int64) - lo] = True
+            overlay_selected.update(rel_path for rel_path in overlay
+                                    if np.isin(tris, self.overlay[rel_path], assume_unique=True).all())
+        selected &= ~self.stale[lo:hi]
+        result = [self.files[lo + i] for i in np.flatnonzero(selected)]
+        return sorted(result + list(overlay_selected))
+
+    def search(self, query: str, path: str) -> str:
+        """
+        Returns the lines `grep -nr -F --exclude='.?*' query path` would print on stdout,
+        in the same format. The order differs: files come in sorted path order, whereas
+        grep follows directory read order, so the Grep tool's truncated output may show a
+        different subset of the matches. `path` must be inside the indexed root.
+        """
+        patterns = [pattern.encode('utf-8') for pattern in query.split('\n')]
+        abs_path = os.path.abspath(path)
+        rel = os.path.relpath(abs_path, self.root)
+        rel = "" if rel == '.' else rel
+        with self.lock:
+            if os.path.isfile(abs_path):
+                single_file = True
+                rel_paths = [rel] if rel in self.file_ids and not self.stale[self.file_ids[rel]] or rel in self.overlay else []
+            else:
+                single_file = False
+                rel_paths = self.candidates(patterns, rel)
+
+        display_root = path.rstrip('/') if path.rstrip('/') else '/'
+        output = []
+        for rel_path in rel_paths:
+            data = self.read(rel_path)
+            if data is None:
+                continue
+            if not any(pattern in data for pattern in patterns):
+                continue
+            lines = data.split(b'\n')
+            if data.endswith(b'\n'):
+                lines.pop()
+            prefix = "" if single_file else os.path.join(display_root, os.path.relpath(rel_path, rel or '.')) + ":"
+            for lineno, line in enumerate(lines, start=1):
+                if any(pattern in line for pattern in patterns):
+                    output.append(f"{prefix}{lineno}:{line.decode('utf-8', errors='ignore')}")
+        return "".join(f"{line}\n" for line in output)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root, build=True):
+    """
+    Returns the index for `root`, building it on first use (if `build`).
+    """
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes and build:
+            _indexes[root] = TrigramIndex(root)
+        return _indexes.get(root)
+
+def find_index(path):
+    """
+    Returns the index whose root contains `path`, if any.
+    """
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        for root, index in _indexes.items():
+            if path == root or path.startswith(root + os.sep):
+                return index
+    return None
+
+def notify_write(path):
+    """
+    Tells the index covering `path` (if any) that the file changed.
+    """
+    index = find_index(path)
+    if index is not None:
+        index.update_file(os.path.relpath(os.path.abspath(path), index.root))
+
+def refresh_index(root):
+    """
+    Re-syncs the index for `root` (if one was built) with the files on disk.
+    """
+    index = get_index(root, build=False)
+    if index is not None:
+        index.refresh()
+
+def drop_index(root):
+    """
+    Forgets the index for `root` (e.g. a workdir that is being deleted).
+    """
+    with _indexes_lock:
+        _indexes.pop(os.path.abspath(root), None)
@@ -1,5 +1,8 @@
 from vuln_agent.tools import Tool
 from vuln_agent.helpers import *
+from vuln_agent.tools.trigram_index import notify_write
+from vuln_agent.tools.tree_snapshot import notify_created
+from vuln_agent.tools.callgraph import notify_source_write
 
 class Write(Tool):
     """
@@ -21,8 +24,9 @@ class Write(Tool):
                 "Note that the /path/to/file should be absolute, not relative.\n"
                 )
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, workdir: str = None):
         self.logger = logger
+        self.workdir = workdir
     
     def execute(self, param_dict: str):
         """
@@ -39,13 +43,16 @@ class Write(Tool):
             if key not in ["name", "file", "content"]:
                 return {"status": "Failure", "output": f"Unknown field '{key}'"}
         # Check if the parent directory exists
-        fpath = Path(fpath)
+        fpath = Path(self.resolve_path(fpath))
         if not fpath.parent.exists():
             return {"status": "Failure", "output": f"Directory {fpath.parent.absolute()} does not exist"}
         # Write the content to the file
         try:
             with open(fpath, "w") as file:
                 file.write(content)
+            notify_write(fpath)
+            notify_created(fpath)
+            notify_source_write(fpath)
             self.logger.log_status(content)
             return {"status": "Success", "output": "File written successfully"}
         except Exception as e:
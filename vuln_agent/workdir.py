@@ -0,0 +1,94 @@
+from vuln_agent.helpers import *
+import shlex
+
+WORKDIR_METHODS = ['auto', 'reflink', 'worktree', 'copy']
+
+def is_git_repo(path):
+    return (Path(path) / ".git").exists()
+
+def copy_reflink(source, dest, always=True):
+    """
+    Copies a tree with `cp -a`. With always=True the copy must be copy-on-write (btrfs, XFS, ...)
+    and fails otherwise; with always=False cp falls back to a regular copy when it cannot reflink.
+    """
+    run(f"cp -a --reflink={'always' if always else 'auto'} {shlex.quote(str(source))} {shlex.quote(str(dest))}",
+        timeout=3600)
+
+def add_worktree(source, dest):
+    """
+    Checks out the source repository's HEAD into `dest` as a detached git worktree, then
+    carries over its uncommitted changes and its untracked and ignored files (Dockerfile.vuln,
+    .build_diff.patch, build outputs, ...), so that the tree matches a full copy.
+
+    The worktree shares the object store and refs (including refs/stash) with the source
+    repository, so nothing that runs in it may use `git stash`. Its .git is a file pointing
+    back to the source, so it only resolves where the source is mounted next to it; in
+    particular not inside a docker build of the worktree.
+    """
+    source, dest = Path(source).absolute(), Path(dest).absolute()
+    run("git worktree prune", cwd=source) # Forget worktrees whose directory was deleted
+    run(f"git worktree add --detach {shlex.quote(str(dest))} HEAD", timeout=600, cwd=source)
+    # Point .git at the source relatively, so the worktree also resolves when data/ is mounted elsewhere
+    git_file = dest / ".git"
+    gitdir = git_file.read_text().split("gitdir:", 1)[1].strip()
+    git_file.write_text(f"gitdir: {os.path.relpath(gitdir, dest)}\n")
+
+    diff = subprocess.run(["git", "diff", "HEAD", "--binary"], cwd=source, stdout=subprocess.PIPE, check=True).stdout
+    if diff.strip():
+        subprocess.run(["git", "apply", "--binary", "--allow-empty", "-"], cwd=dest, input=diff, check=True)
+
+    # Untracked and ignored files, without descending into nested repositories
+    others = subprocess.run(["git", "ls-files", "--others", "--directory", "-z"], cwd=source,
+                            stdout=subprocess.PIPE, check=True).stdout
+    for rel_path in others.decode('utf-8', errors='surrogateescape').split('\0'):
+        if not rel_path:
+            continue
+        src, dst = source / rel_path, dest / rel_path
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if src.is_dir() and not src.is_symlink():
+            shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+        elif src.exists() or src.is_symlink():
+            shutil.copy2(src, dst, follow_symlinks=False)
+
+def provision_workdir(source, dest, method='auto'):
+    """
+    Creates `dest` as a working copy of the project tree at `source`, and returns the method used.
+
+    method: 'reflink'  - copy-on-write copy; near-instant and shares blocks until files change,
+                         but needs a filesystem with reflink support
+            'worktree' - git worktree of the source repository (falls back to 'copy' if the
+                         source is not a git repository); only the checked-out files take space,
+                         but see add_worktree() for what it shares with the source, so it is
+                         only used when asked for
+            'copy'     - full copy (copy-on-write where cp can do it)
+            'auto'     - 'reflink' if supported, else 'copy'
+    """
+    if method not in WORKDIR_METHODS:
+        raise ValueError(f"Invalid workdir method {method}. Supported methods are: {WORKDIR_METHODS}")
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    if method in ['auto', 'reflink']:
+        try:
+            copy_reflink(source, dest, always=True)
+            return 'reflink'
+        except RunException:
+            if dest.exists():
+                shutil.rmtree(dest)
+            if method == 'reflink':
+                raise
+    if method == 'worktree' and is_git_repo(source):
+        try:
+            add_worktree(source, dest)
+            return 'worktree'
+        except (RunException, subprocess.CalledProcessError, OSError):
+            if dest.exists():
+                shutil.rmtree(dest)
+            run("git worktree prune", cwd=source)
+    try:
+        copy_reflink(source, dest, always=False)
+    except RunException:
+        if dest.exists():
+            shutil.rmtree(dest)
+        shutil.copytree(source, dest, symlinks=True)
+    return 'copy'